@@ -0,0 +1,101 @@
+"""朗读音频的磁盘缓存
+
+每段合成的 wav 文件以 (诗词 id, 行号, 文字, 音色, 语速, 音量) 的哈希命名，
+保存在 audio_cache 目录中；同一首诗词用相同的音色和语速再次朗读时直接
+播放缓存的文件，不再合成。键中包括文字，诗词修改后不会播放旧的音频。
+
+文件的修改时间记录最近一次使用的时间，总大小超过上限时删除最久未用的
+文件。合成时先写入临时文件，完成后才改名，中途退出不会留下不完整的
+缓存。缓存只由朗读线程访问。
+"""
+import hashlib
+import os
+from collections import OrderedDict
+
+# 缓存目录
+AUDIO_CACHE_DIR = 'audio_cache'
+
+# 缓存总大小的上限（字节）
+AUDIO_CACHE_BYTES = 1024 * 1024 * 1024
+
+# 合成中的临时文件的后缀
+TEMP_SUFFIX = '.tmp.wav'
+
+
+def cache_key(poem_id, line, text, voice, rate, volume):
+    raw = '\n'.join(str(value) for value in (poem_id, line, text, voice, rate, volume))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    """按最近使用顺序淘汰的 wav 文件缓存"""
+
+    def __init__(self, folder=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # 文件名 -> 大小，最久未用的在前
+        self.total = 0
+
+    def load(self):
+        """读取目录中已有的文件，按修改时间排出使用顺序"""
+        os.makedirs(self.folder, exist_ok=True)
+        files = []
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.name.endswith(TEMP_SUFFIX):
+                    # 上次合成到一半的文件
+                    self._remove(entry.name)
+                elif entry.name.endswith('.wav') and entry.is_file():
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, entry.name, stat.st_size))
+        files.sort()
+        for _, name, size in files:
+            self.entries[name] = size
+            self.total += size
+        self._evict()
+        return self
+
+    def get(self, key):
+        """缓存的文件路径，并记为最近使用；没有时返回 None"""
+        name = key + '.wav'
+        if name not in self.entries:
+            return None
+        path = os.path.join(self.folder, name)
+        try:
+            os.utime(path)
+        except OSError:
+            # 文件已被删除
+            self.total -= self.entries.pop(name)
+            return None
+        self.entries.move_to_end(name)
+        return path
+
+    def temp_path(self, key):
+        """合成时写入的临时文件"""
+        return os.path.join(self.folder, key + TEMP_SUFFIX)
+
+    def put(self, key):
+        """把合成好的临时文件放入缓存，返回缓存的文件路径"""
+        name = key + '.wav'
+        path = os.path.join(self.folder, name)
+        os.replace(self.temp_path(key), path)
+        size = os.path.getsize(path)
+        self.total += size - self.entries.pop(name, 0)
+        self.entries[name] = size
+        self._evict(keep=name)
+        return path
+
+    def _evict(self, keep=None):
+        """总大小超过上限时删除最久未用的文件，刚放入的文件保留"""
+        while self.total > self.max_bytes and self.entries:
+            name = next(iter(self.entries))
+            if name == keep:
+                break
+            self.total -= self.entries.pop(name)
+            self._remove(name)
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.folder, name))
+        except OSError:
+            pass
@@ -0,0 +1,147 @@
+"""诗词详情的显示
+
+原文框的标题、拼音、汉字样式在创建时配置一次。每首诗词先排成一份
+"排版"：原文框一次 insert 调用所需的 (文本, 标签, 文本, 标签, ...) 参数，
+以及译文、注释、赏析、作者介绍四个文本框的内容。最近显示过的诗词的排版
+保存在 LRU 缓存中；列表中与当前诗词相邻的几首在界面空闲时预先排版（包括
+读取详情），用方向键逐首浏览时只需替换文本框的内容。
+
+编辑时由 EditBuffer 记录原文框中改动过的段，保存时只合并这些段。
+"""
+from collections import OrderedDict
+
+from edit_buffer import EditBuffer, apply_edits, segments
+
+# 缓存排版的诗词数
+LAYOUT_CACHE_SIZE = 64
+
+# 预先排版当前诗词前后各几首
+PREFETCH_ROWS = 2
+
+# 原文框的样式
+TAG_STYLES = {
+    'title': {'font': ('SimSun', 18, 'bold'), 'justify': 'center', 'spacing1': 5, 'spacing3': 5},
+    'pinyin': {'font': ('SimSun', 12), 'justify': 'center', 'spacing1': 2, 'spacing3': 2, 'spacing2': 5},
+    'hanzi': {'font': ('SimSun', 16, 'bold'), 'justify': 'center', 'spacing1': 2, 'spacing3': 5, 'spacing2': 5},
+}
+
+# 四个文本框依次显示的字段
+NOTE_FIELDS = ('translation', 'note', 'appreciation', 'author_intro')
+
+
+def layout(poem):
+    """返回 (原文框 insert 的参数, 四个文本框的内容, 原文框中各段的 (键, 起始行号))"""
+    chunks = []
+    # 插入标题和拼音
+    if 'title_pinyin' in poem:
+        chunks += [poem.get('title_pinyin', '') + '\n', 'pinyin']
+    chunks += [poem['title'] + '\n\n', 'title']
+
+    content_lines = poem.get('content', [])
+    pinyin_lines = poem.get('content_pinyin', [])
+    if isinstance(content_lines, list) and isinstance(pinyin_lines, list) and len(content_lines) == len(pinyin_lines):
+        # 将拼音显示在汉字上方
+        for content_line, pinyin_line in zip(content_lines, pinyin_lines):
+            chunks += [pinyin_line + '\n', 'pinyin', content_line + '\n', 'hanzi']
+    elif isinstance(content_lines, list):
+        # 如果没有拼音或格式不匹配，只显示内容
+        for line in content_lines:
+            chunks += [line + '\n', 'hanzi']
+    else:
+        chunks += [str(content_lines), 'hanzi']
+
+    notes = tuple(poem.get(field, '') for field in NOTE_FIELDS)
+    return tuple(chunks), notes, segments(chunks)
+
+
+class DetailView:
+    """原文框和四个文本框的显示，带排版缓存和预先排版"""
+
+    def __init__(self, content, note_widgets, loader, cache_size=LAYOUT_CACHE_SIZE):
+        self.content = content
+        self.note_widgets = note_widgets
+        self.loader = loader  # id -> 完整的诗词
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.pending = []  # 等待预先排版的 id
+        self.prefetch_job = None
+        self.buffer = EditBuffer(content)
+        for tag, style in TAG_STYLES.items():
+            self.content.tag_configure(tag, **style)
+
+    def layout(self, poem_id):
+        """返回诗词的排版，没有缓存时读取诗词并排版；诗词不存在时返回 None"""
+        cached = self.cache.get(poem_id)
+        if cached is not None:
+            self.cache.move_to_end(poem_id)
+            return cached
+        poem = self.loader(poem_id)
+        if not poem:
+            return None
+        cached = layout(poem)
+        self.cache[poem_id] = cached
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return cached
+
+    def show(self, poem_id, editable=False):
+        """显示诗词；editable 为真时直接进入编辑，否则文本框都设为只读"""
+        cached = self.layout(poem_id)
+        if cached is None:
+            return False
+        chunks, notes, _ = cached
+
+        self.buffer.end()
+        self.content.config(state='normal')
+        self.content.delete('1.0', 'end')
+        self.content.insert('end', *chunks)
+        if not editable:
+            self.content.config(state='disabled')
+
+        for widget, text in zip(self.note_widgets, notes):
+            widget.config(state='normal')
+            widget.delete('1.0', 'end')
+            widget.insert('1.0', text)
+            widget.edit_modified(False)
+            if not editable:
+                widget.config(state='disabled')
+
+        if editable:
+            self.begin_edit(poem_id)
+        return True
+
+    def begin_edit(self, poem_id):
+        """开始编辑当前显示的诗词，从这里起记录改动"""
+        cached = self.layout(poem_id)
+        if cached is None:
+            return
+        self.buffer.begin(cached[2])
+        for widget in self.note_widgets:
+            widget.edit_modified(False)
+
+    def edits(self, poem, annotate):
+        """编辑后改动的字段；原文框只读取改动过的段，四个文本框只读取改动过的"""
+        fields = apply_edits(poem, self.buffer.changes(), annotate)
+        for field, widget in zip(NOTE_FIELDS, self.note_widgets):
+            if widget.edit_modified():
+                fields[field] = widget.get('1.0', 'end-1c')
+        return fields
+
+    def forget(self, poem_id):
+        """诗词修改或删除后丢弃它的排版"""
+        self.cache.pop(poem_id, None)
+
+    def prefetch(self, poem_ids):
+        """在界面空闲时逐首预先排版，之前尚未完成的预排版取消"""
+        self.pending = [poem_id for poem_id in poem_ids if poem_id not in self.cache]
+        if self.pending and self.prefetch_job is None:
+            self.prefetch_job = self.content.after_idle(self._prefetch_next)
+
+    def _prefetch_next(self):
+        self.prefetch_job = None
+        if not self.pending:
+            return
+        self.layout(self.pending.pop(0))
+        if self.pending:
+            # 每次只排一首，中间可以处理键盘事件
+            self.prefetch_job = self.content.after_idle(self._prefetch_next)
@@ -0,0 +1,163 @@
+"""原文框的结构化编辑
+
+原文框中依次是标题拼音、标题、逐行的拼音和汉字。开始编辑时在每一段
+（标题拼音、标题、每行拼音、每行汉字）的起始行放一个 mark，向左吸附，
+在段首输入的文字仍属于这一段。原文框的 Tcl 命令被替换为一个转发命令，
+所有 insert/delete/replace（键盘输入、粘贴、剪切、撤销都经过这里）先
+记下涉及的段，再交给原来的命令执行。
+
+保存时只读取改动过的段，未改动的段直接使用原来的值，不需要从整个
+文本框重新解析；只改了汉字、没有改拼音的行重新注音。
+"""
+
+
+def _lines(text):
+    """段中的非空行，已去除首尾空白"""
+    return [line.strip() for line in text.split('\n') if line.strip()]
+
+
+def segments(chunks):
+    """由原文框的 insert 参数 (文本, 标签, ...) 算出各段的 (键, 起始行号)
+
+    键为 'title_pinyin'、'title'、('pinyin', 行号) 或 ('hanzi', 行号)。
+    """
+    result = []
+    line = 1
+    content_line = 0
+    for text, tag in zip(chunks[0::2], chunks[1::2]):
+        if tag == 'title':
+            key = 'title'
+        elif not result:
+            key = 'title_pinyin'
+        elif tag == 'pinyin':
+            key = ('pinyin', content_line)
+        else:
+            key = ('hanzi', content_line)
+            content_line += 1
+        result.append((key, line))
+        line += text.count('\n')
+    return result
+
+
+def apply_edits(poem, changes, annotate):
+    """把改动过的段合并到诗词上，返回改动的字段
+
+    changes 为 {键: 段中的文本}。只改了汉字的行（以及只改了标题时的标题）
+    交给 annotate(文字列表) 重新注音，它返回 {文字: 拼音}。
+    """
+    fields = {}
+    need = []
+    if 'title' in changes:
+        fields['title'] = ''.join(_lines(changes['title']))
+    if 'title_pinyin' in changes:
+        fields['title_pinyin'] = ' '.join(_lines(changes['title_pinyin']))
+    elif 'title' in fields and 'title_pinyin' in poem:
+        need.append(fields['title'])
+
+    content = poem.get('content', [])
+    pinyin = poem.get('content_pinyin', [])
+    # 与显示时相同：内容和拼音行数一致时才逐行显示拼音
+    paired = isinstance(content, list) and isinstance(pinyin, list) and len(content) == len(pinyin)
+    if not isinstance(content, list):
+        content = [str(content)]
+
+    if any(isinstance(key, tuple) for key in changes):
+        new_content = []
+        new_pinyin = []
+        for i, line in enumerate(content):
+            hanzi = _lines(changes[('hanzi', i)]) if ('hanzi', i) in changes else [line]
+            if not paired:
+                new_content += hanzi
+                continue
+            if ('pinyin', i) in changes:
+                typed = _lines(changes[('pinyin', i)])
+                if len(typed) == len(hanzi):
+                    # 汉字和手工输入的拼音行数一致时，以输入的拼音为准
+                    new_content += hanzi
+                    new_pinyin += [' '.join(p.split()) for p in typed]
+                    continue
+            elif ('hanzi', i) not in changes:
+                new_content.append(line)
+                new_pinyin.append(pinyin[i])
+                continue
+            new_content += hanzi
+            new_pinyin += [None] * len(hanzi)
+            need += hanzi
+        fields['content'] = new_content
+        if paired:
+            fields['content_pinyin'] = new_pinyin
+
+    if need:
+        result = annotate(need)
+        if 'title' in fields and 'title_pinyin' not in fields and 'title_pinyin' in poem:
+            fields['title_pinyin'] = result[fields['title']]
+        if 'content_pinyin' in fields:
+            fields['content_pinyin'] = [result[line] if p is None else p
+                                        for line, p in zip(fields['content'], fields['content_pinyin'])]
+    return fields
+
+
+class EditBuffer:
+    """记录原文框中哪些段被改动过"""
+
+    def __init__(self, text):
+        self.text = text
+        self.keys = []  # 各段的键
+        self.marks = []  # 各段起始位置的 mark
+        self.dirty = set()  # 改动过的段的序号
+        self.tracking = False
+        # 替换文本框的 Tcl 命令，修改先经过 _dispatch
+        self.orig = text._w + '_orig'
+        text.tk.call('rename', text._w, self.orig)
+        text.tk.createcommand(text._w, self._dispatch)
+
+    def begin(self, segments):
+        """开始记录；segments 为 [(键, 起始行号)]，须与原文框当前的内容一致"""
+        self.end()
+        for i, (key, line) in enumerate(segments):
+            mark = f'segment{i}'
+            self.text.mark_set(mark, f'{line}.0')
+            self.text.mark_gravity(mark, 'left')
+            self.keys.append(key)
+            self.marks.append(mark)
+        self.tracking = True
+
+    def end(self):
+        self.tracking = False
+        if self.marks:
+            self.text.mark_unset(*self.marks)
+        self.keys = []
+        self.marks = []
+        self.dirty = set()
+
+    def changes(self):
+        """改动过的段，返回 {键: 段中的文本}"""
+        result = {}
+        for i in sorted(self.dirty):
+            end = self.marks[i + 1] if i + 1 < len(self.marks) else 'end-1c'
+            result[self.keys[i]] = self.text.get(self.marks[i], end)
+        return result
+
+    def _segment_at(self, index):
+        """位置所在段的序号，二分查找"""
+        lo, hi = 0, len(self.marks)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.text.compare(index, '<', self.marks[mid]):
+                hi = mid
+            else:
+                lo = mid + 1
+        return max(lo - 1, 0)
+
+    def _dispatch(self, operation, *args):
+        if self.tracking and self.marks and operation in ('insert', 'delete', 'replace') and args:
+            first = self.text.index(args[0])
+            if operation == 'insert':
+                last = first
+            elif operation == 'replace' or len(args) > 1:
+                last = self.text.index(args[1])
+            else:
+                # 只删除一个字符，可能是行尾的换行
+                last = self.text.index(f'{first}+1c')
+            self.dirty.update(range(self._segment_at(first), self._segment_at(last) + 1))
+        return self.text.tk.call((self.orig, operation) + args)
@@ -0,0 +1,69 @@
+"""朝代和作者分类
+
+为每个朝代、每位作者保存诗词 id 集合，并按朝代保存各作者的诗词数。
+添加、修改、删除诗词时只更新这首诗词所在的几个集合，每首常数时间；
+分类中的诗词数就是集合的大小，不需要重新统计。按朝代再按作者细分时
+只求两个集合的交集，不扫描全部诗词。
+"""
+
+FIELDS = ('dynasty', 'author')
+
+# 分类列表中最多显示的项数，其余的可以在搜索框中输入查找
+DISPLAY_LIMIT = 1000
+
+
+class FacetIndex:
+    """朝代和作者的 id 集合及计数"""
+
+    def __init__(self):
+        self.values = {field: {} for field in FIELDS}  # 字段 -> 值 -> id 集合
+        self.authors = {}  # 朝代 -> 作者 -> 诗词数
+        self.entries = {}  # id -> (朝代, 作者)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, poem_id, dynasty, author):
+        """加入或更新一首诗词"""
+        dynasty = (dynasty or '').strip()
+        author = (author or '').strip()
+        if self.entries.get(poem_id) == (dynasty, author):
+            return
+        self.remove(poem_id)
+        self.entries[poem_id] = (dynasty, author)
+        for field, value in zip(FIELDS, (dynasty, author)):
+            self.values[field].setdefault(value, set()).add(poem_id)
+        counts = self.authors.setdefault(dynasty, {})
+        counts[author] = counts.get(author, 0) + 1
+
+    def remove(self, poem_id):
+        entry = self.entries.pop(poem_id, None)
+        if entry is None:
+            return
+        dynasty, author = entry
+        for field, value in zip(FIELDS, entry):
+            ids = self.values[field][value]
+            ids.discard(poem_id)
+            if not ids:
+                del self.values[field][value]
+        counts = self.authors[dynasty]
+        counts[author] -= 1
+        if not counts[author]:
+            del counts[author]
+            if not counts:
+                del self.authors[dynasty]
+
+    def counts(self, field, dynasty=None):
+        """返回 {值: 诗词数}；给出朝代时只统计该朝代的作者"""
+        if field == 'author' and dynasty is not None:
+            return dict(self.authors.get(dynasty, {}))
+        return {value: len(ids) for value, ids in self.values[field].items()}
+
+    def ids(self, dynasty=None, author=None):
+        """同时属于所选朝代和作者的 id 集合，都不选时返回 None 表示全部"""
+        sets = [self.values[field].get(value, set())
+                for field, value in zip(FIELDS, (dynasty, author)) if value is not None]
+        if not sets:
+            return None
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
@@ -0,0 +1,142 @@
+"""收藏夹
+
+收藏以诗词 id 的集合保存，判断是否收藏为常数时间；修改标题或作者后
+收藏不会丢失。favorites.json 保存全部收藏的 id，每次收藏或取消收藏只向
+favorites.log 追加一行（"+id" 或 "-id"）并 fsync。给出 submit_write 时，
+追加和 fsync 交给它（写入线程）按顺序执行，不阻塞界面线程。启动时读取快照、重放
+日志，日志不为空时合并回快照。
+
+旧版本的 favorites.json 是 "标题_作者" 形式的列表，读取时按诗词库换算成
+id，并立即改写为新格式。
+"""
+import json
+import os
+
+from storage import _fsync_dir
+
+
+def _read_log(path):
+    """依次返回日志中的 (是否收藏, id)
+
+    末尾写了一半的行（没有换行符，例如 "+123" 只写出了 "+12"）和之后的
+    内容都丢弃，并把日志截断到最后一条完整的记录。
+    """
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        good = 0
+        for line in f:
+            record = line.rstrip(b'\r\n')
+            if not line.endswith(b'\n') or record[:1] not in (b'+', b'-') or not record[1:].isdigit():
+                print(f"收藏日志在 {good} 字节处损坏，已丢弃之后的记录")
+                break
+            yield record[:1] == b'+', int(record[1:])
+            good += len(line)
+        else:
+            return
+    with open(path, 'r+b') as f:
+        f.truncate(good)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class FavoriteFile:
+    """保存在 favorites.json 和 favorites.log 中的收藏 id 集合"""
+
+    def __init__(self, path='favorites.json', log_path='favorites.log', submit_write=None):
+        self.path = path
+        self.log_path = log_path
+        self.submit_write = submit_write  # submit_write(func, *args)，为 None 时直接写入
+        self.ids = set()
+        self.log = None
+
+    def load(self, summaries):
+        """读取收藏；旧格式的 "标题_作者" 标识按 summaries 中的诗词换算成 id"""
+        data = None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"加载收藏列表失败: {str(e)}")
+
+        migrated = isinstance(data, list)
+        if migrated:
+            keys = set(data)
+            self.ids = {poem['id'] for poem in summaries
+                        if f"{poem['title']}_{poem['author']}" in keys}
+        elif isinstance(data, dict):
+            self.ids = set(data.get('ids', []))
+
+        replayed = False
+        for added, poem_id in _read_log(self.log_path):
+            replayed = True
+            if added:
+                self.ids.add(poem_id)
+            else:
+                self.ids.discard(poem_id)
+        if migrated or replayed:
+            self.compact()
+        return self
+
+    def __contains__(self, poem_id):
+        return poem_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def add(self, poem_id):
+        if poem_id not in self.ids:
+            self.ids.add(poem_id)
+            self._append([f'+{poem_id}'])
+
+    def discard(self, poem_id):
+        self.discard_many([poem_id])
+
+    def discard_many(self, poem_ids):
+        """取消一批收藏（例如删除诗词时），只写一次日志"""
+        removed = [poem_id for poem_id in poem_ids if poem_id in self.ids]
+        self.ids.difference_update(removed)
+        if removed:
+            self._append([f'-{poem_id}' for poem_id in removed])
+
+    def _append(self, lines):
+        record = ''.join(line + '\n' for line in lines).encode('ascii')
+        if self.submit_write is None:
+            self.append(record)
+        else:
+            self.submit_write(self.append, record)
+
+    def append(self, record):
+        """把编码好的日志行写入日志并 fsync，可在写入线程中执行"""
+        if self.log is None:
+            self.log = open(self.log_path, 'ab')
+        self.log.write(record)
+        self.log.flush()
+        os.fsync(self.log.fileno())
+
+    def compact(self):
+        """把全部收藏写入快照（先写临时文件再替换），然后清空日志"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'ids': sorted(self.ids)}, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        _fsync_dir(self.path)
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
@@ -0,0 +1,398 @@
+"""诗词全文检索
+
+对诗词的全部文本字段建立倒排索引（汉字按二字组切分，记录词位），
+按 BM25 排序，支持用双引号包围的短语查询。索引保存为紧凑的二进制
+文件，打开时用 mmap 映射，不需要整体解析。
+"""
+import bisect
+import json
+import math
+import mmap
+import os
+import re
+from array import array
+
+# 参与全文检索的字段
+FULLTEXT_FIELDS = ('title', 'author', 'dynasty', 'content', 'translation',
+                   'note', 'appreciation', 'author_intro')
+
+MAGIC = b'PFTI'
+VERSION = 1
+
+# BM25 参数
+K1 = 1.2
+B = 0.75
+
+_TOKEN_RE = re.compile(r'[㐀-䶿一-鿿豈-﫿]+|[0-9a-zA-ZÀ-ɏ]+')
+
+
+def _is_cjk(text):
+    return '㐀' <= text[0] <= '鿿' or '豈' <= text[0] <= '﫿'
+
+
+def tokenize(text, for_query=False):
+    """切分文本，返回 (词, 词位) 列表
+
+    汉字连续片段切成相邻二字组，并在片段末尾补一个单字，
+    这样任意单字都能通过"以该字开头的词"找到。查询时不补单字。
+    字母数字按整词小写处理。不同片段之间空出一个词位，避免跨标点拼成短语。
+    """
+    tokens = []
+    pos = 0
+    for match in _TOKEN_RE.finditer(text):
+        run = match.group()
+        if _is_cjk(run):
+            for i in range(len(run) - 1):
+                tokens.append((run[i:i + 2], pos + i))
+            if not for_query or len(run) == 1:
+                tokens.append((run[-1], pos + len(run) - 1))
+            pos += len(run) + 1
+        else:
+            tokens.append((run.lower(), pos))
+            pos += 2
+    return tokens
+
+
+def poem_text(poem):
+    """把诗词的各个文本字段拼成一段，字段之间用换行分隔"""
+    parts = []
+    for field in FULLTEXT_FIELDS:
+        value = poem.get(field) or ''
+        if isinstance(value, list):
+            value = '\n'.join(str(v) for v in value)
+        parts.append(str(value))
+    return '\n'.join(parts)
+
+
+def parse_query(query):
+    """把查询拆成子句，双引号内为短语，返回 [(文本, 是否短语)]"""
+    clauses = []
+    for match in re.finditer(r'"([^"]+)"|(\S+)', query):
+        if match.group(1):
+            clauses.append((match.group(1), True))
+        else:
+            clauses.append((match.group(2), False))
+    return clauses
+
+
+class _MemorySegment:
+    """内存中的索引段，用于新增和修改过的诗词"""
+
+    def __init__(self):
+        self.postings = {}  # 词 -> {文档编号: [词位]}
+        self.lengths = {}   # 文档编号 -> 词数
+        self.doc_terms = {}  # 文档编号 -> 出现过的词
+
+    def add(self, key, poem):
+        tokens = tokenize(poem_text(poem))
+        for term, pos in tokens:
+            self.postings.setdefault(term, {}).setdefault(key, []).append(pos)
+        self.lengths[key] = len(tokens)
+        self.doc_terms[key] = {term for term, _ in tokens}
+
+    def remove(self, key):
+        if self.lengths.pop(key, None) is None:
+            return
+        for term in self.doc_terms.pop(key):
+            docs = self.postings[term]
+            del docs[key]
+            if not docs:
+                del self.postings[term]
+
+    def terms(self, term, prefix):
+        if not prefix:
+            if term in self.postings:
+                yield self.postings[term]
+            return
+        for candidate, docs in self.postings.items():
+            if candidate.startswith(term):
+                yield docs
+
+
+class _DiskSegment:
+    """mmap 映射的只读索引段"""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:4] != MAGIC:
+            raise ValueError('无效的索引文件')
+        meta_len = int.from_bytes(self.map[4:8], 'little')
+        self.meta = json.loads(self.map[8:8 + meta_len].decode('utf-8'))
+        if self.meta.get('version') != VERSION:
+            raise ValueError('索引文件版本不匹配')
+
+        self.view = view = memoryview(self.map)
+        sections = self.meta['sections']
+
+        def section(name, typecode):
+            start, end = sections[name]
+            return view[start:end].cast(typecode)
+
+        self.doc_keys = section('doc_keys', 'Q')
+        self.doc_lengths = section('doc_lengths', 'I')
+        self.term_offsets = section('term_offsets', 'Q')
+        self.post_offsets = section('post_offsets', 'Q')
+        self.dfs = section('dfs', 'I')
+        self.postings = section('postings', 'I')
+        start, end = sections['term_blob']
+        self.term_blob = view[start:end]
+        self.term_count = len(self.dfs)
+        self.total_length = self.meta['total_length']
+
+    def close(self):
+        for name in ('doc_keys', 'doc_lengths', 'term_offsets', 'post_offsets',
+                     'dfs', 'postings', 'term_blob'):
+            getattr(self, name).release()
+        self.view.release()
+        self.map.close()
+        self.file.close()
+
+    def term_at(self, i):
+        return bytes(self.term_blob[self.term_offsets[i]:self.term_offsets[i + 1]]).decode('utf-8')
+
+    def _lower_bound(self, term):
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term_at(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def doc_length(self, key):
+        i = bisect.bisect_left(self.doc_keys, key)
+        if i < len(self.doc_keys) and self.doc_keys[i] == key:
+            return self.doc_lengths[i]
+        return None
+
+    def _read(self, i, deleted):
+        """读出第 i 个词的倒排表，返回 {文档编号: [词位]}"""
+        offset = self.post_offsets[i]
+        df = self.dfs[i]
+        docnos = self.postings[offset:offset + df]
+        tfs = self.postings[offset + df:offset + 2 * df]
+        pos = offset + 2 * df
+        docs = {}
+        for docno, tf in zip(docnos, tfs):
+            key = self.doc_keys[docno]
+            if key not in deleted:
+                docs[key] = self.postings[pos:pos + tf].tolist()
+            pos += tf
+        return docs
+
+    def terms(self, term, prefix, deleted):
+        i = self._lower_bound(term)
+        while i < self.term_count:
+            candidate = self.term_at(i)
+            if candidate == term or (prefix and candidate.startswith(term)):
+                yield self._read(i, deleted)
+            else:
+                break
+            i += 1
+
+
+def write_segment(path, items, meta=None):
+    """把 (文档编号, 诗词) 序列写成索引文件，先写临时文件再替换"""
+    postings = {}
+    keys = []
+    lengths = array('I')
+    total_length = 0
+    for docno, (key, poem) in enumerate(sorted(items, key=lambda item: item[0])):
+        tokens = tokenize(poem_text(poem))
+        for term, pos in tokens:
+            postings.setdefault(term, {}).setdefault(docno, []).append(pos)
+        keys.append(key)
+        lengths.append(len(tokens))
+        total_length += len(tokens)
+
+    doc_keys = array('Q', keys)
+    terms = sorted(postings)
+    term_blob = bytearray()
+    term_offsets = array('Q', [0])
+    post_offsets = array('Q')
+    dfs = array('I')
+    data = array('I')
+    for term in terms:
+        term_blob += term.encode('utf-8')
+        term_offsets.append(len(term_blob))
+        docs = postings[term]
+        post_offsets.append(len(data))
+        dfs.append(len(docs))
+        docnos = sorted(docs)
+        data.extend(docnos)
+        data.extend(len(docs[d]) for d in docnos)
+        for d in docnos:
+            data.extend(docs[d])
+
+    blobs = [('doc_keys', doc_keys.tobytes()), ('doc_lengths', lengths.tobytes()),
+             ('term_offsets', term_offsets.tobytes()), ('post_offsets', post_offsets.tobytes()),
+             ('dfs', dfs.tobytes()), ('postings', data.tobytes()), ('term_blob', bytes(term_blob))]
+
+    header = dict(meta or {})
+    header.update({'version': VERSION, 'total_length': total_length})
+    # 先估算头部长度，再按 8 字节对齐排布各段
+    header['sections'] = {name: [0, 0] for name, _ in blobs}
+    while True:
+        encoded = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        offset = 8 + len(encoded)
+        sections = {}
+        for name, blob in blobs:
+            offset = (offset + 7) // 8 * 8
+            sections[name] = [offset, offset + len(blob)]
+            offset += len(blob)
+        if sections == header['sections']:
+            break
+        header['sections'] = sections
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(encoded).to_bytes(4, 'little'))
+        f.write(encoded)
+        for name, blob in blobs:
+            f.write(b'\0' * (sections[name][0] - f.tell()))
+            f.write(blob)
+    os.replace(tmp_path, path)
+
+
+class FullTextIndex:
+    """全文索引：磁盘段 + 内存段，删除和修改通过墓碑集合屏蔽磁盘段中的旧记录"""
+
+    def __init__(self, disk=None):
+        self.disk = disk
+        self.memory = _MemorySegment()
+        self.deleted = set()
+        self.doc_count = len(disk.doc_keys) if disk else 0
+        self.total_length = disk.total_length if disk else 0
+
+    @classmethod
+    def open(cls, path, signature=None):
+        """打开索引文件，文件不存在、损坏或与数据不匹配时返回 None"""
+        try:
+            disk = _DiskSegment(path)
+        except (OSError, ValueError):
+            return None
+        if signature is not None and disk.meta.get('signature') != signature:
+            disk.close()
+            return None
+        return cls(disk)
+
+    @classmethod
+    def build(cls, items, path=None, signature=None):
+        """由 (文档编号, 诗词) 序列建立索引，给出路径时同时保存到磁盘"""
+        items = list(items)
+        if path:
+            write_segment(path, items, {'signature': signature})
+            index = cls.open(path)
+            if index is not None:
+                return index
+        index = cls()
+        for key, poem in items:
+            index.add(key, poem)
+        return index
+
+    def close(self):
+        if self.disk:
+            self.disk.close()
+            self.disk = None
+
+    def _disk_length(self, key):
+        if self.disk is None or key in self.deleted:
+            return None
+        return self.disk.doc_length(key)
+
+    def add(self, key, poem):
+        """加入或更新一首诗词"""
+        self.remove(key)
+        self.memory.add(key, poem)
+        self.doc_count += 1
+        self.total_length += self.memory.lengths[key]
+
+    def remove(self, key):
+        length = self.memory.lengths.get(key)
+        if length is not None:
+            self.memory.remove(key)
+        else:
+            length = self._disk_length(key)
+            if length is None:
+                return
+            self.deleted.add(key)
+        self.doc_count -= 1
+        self.total_length -= length
+
+    def _lookup(self, term, prefix=False):
+        """合并各段中的倒排表，返回 {文档编号: [词位]}"""
+        merged = {}
+        sources = list(self.memory.terms(term, prefix))
+        if self.disk is not None:
+            sources.extend(self.disk.terms(term, prefix, self.deleted))
+        for docs in sources:
+            for key, positions in docs.items():
+                if key in merged:
+                    merged[key] = sorted(merged[key] + positions)
+                else:
+                    merged[key] = positions
+        return merged
+
+    def _length(self, key):
+        length = self.memory.lengths.get(key)
+        if length is None:
+            length = self._disk_length(key) or 0
+        return length
+
+    def search(self, query, limit=None):
+        """按 BM25 排序检索，返回 [(文档编号, 得分)]，得分高的在前
+
+        每个子句都必须命中；短语子句还要求各词位相邻。
+        """
+        clauses = parse_query(query)
+        if not clauses or not self.doc_count:
+            return []
+
+        scores = None
+        avg_length = self.total_length / self.doc_count
+        for text, is_phrase in clauses:
+            tokens = tokenize(text, for_query=True)
+            if not tokens:
+                continue
+            # 单个汉字按"以该字开头的词"查找
+            term_postings = [self._lookup(term, prefix=len(term) == 1 and _is_cjk(term))
+                             for term, _ in tokens]
+            matched = set(term_postings[0])
+            for docs in term_postings[1:]:
+                matched &= docs.keys()
+            if is_phrase and len(tokens) > 1:
+                matched = {key for key in matched if self._has_phrase(key, tokens, term_postings)}
+            if scores is not None:
+                matched &= scores.keys()
+            if not matched:
+                return []
+
+            clause_scores = dict.fromkeys(matched, 0.0)
+            for docs in term_postings:
+                idf = math.log(1 + (self.doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for key in matched:
+                    tf = len(docs[key])
+                    norm = K1 * (1 - B + B * self._length(key) / avg_length)
+                    clause_scores[key] += idf * tf * (K1 + 1) / (tf + norm)
+            if scores is None:
+                scores = clause_scores
+            else:
+                scores = {key: scores[key] + clause_scores[key] for key in matched}
+
+        if not scores:
+            return []
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        return ranked[:limit] if limit else ranked
+
+    @staticmethod
+    def _has_phrase(key, tokens, term_postings):
+        base = tokens[0][1]
+        offsets = [pos - base for _, pos in tokens]
+        rest = [set(docs[key]) for docs in term_postings[1:]]
+        for start in term_postings[0][key]:
+            if all(start + offset in positions for offset, positions in zip(offsets[1:], rest)):
+                return True
+        return False
@@ -0,0 +1,149 @@
+"""导入计划
+
+导入前先把文件中的诗词与诗词库按 (标题, 作者) 一次性比对，分为新增、
+与已有诗词相同、与已有诗词不同三类，再按用户选定的统一策略处理所有冲突，
+不必逐首询问。是否相同按内容哈希判断，不需要读取已有诗词的详情。
+"""
+from poem_store import content_hash, normalize_field, same_content
+
+# 冲突处理策略
+OVERWRITE = 'overwrite'  # 全部覆盖
+SKIP = 'skip'  # 全部跳过
+NEWER = 'newer'  # 保留较新的版本（按修改时间）
+MERGE = 'merge'  # 合并字段：导入文件中非空的字段覆盖，空字段保留原有内容
+
+POLICIES = (
+    (OVERWRITE, '全部覆盖'),
+    (SKIP, '全部跳过'),
+    (NEWER, '保留较新的版本（按修改时间）'),
+    (MERGE, '合并字段（只用导入文件中非空的字段覆盖）'),
+)
+
+
+def _is_empty(value):
+    if isinstance(value, (list, tuple)):
+        return not any(str(v).strip() for v in value)
+    return not normalize_field(value)
+
+
+def has_pinyin(poem):
+    """导入的诗词是否带有拼音；不带拼音时只比较文字"""
+    return not (_is_empty(poem.get('title_pinyin')) and _is_empty(poem.get('content_pinyin')))
+
+
+class ImportPlan:
+    """一次导入的分类结果
+
+    计划中只保存分类：新增的 (标题, 作者) 和不同的已有诗词 id 各对应文件中
+    的第几首，不保存诗词本身，导入大文件时内存不随文件增大。写入时重新
+    逐批读取文件，用 select 取出要写入的诗词。
+    """
+
+    def __init__(self, store, default_time=''):
+        self.store = store
+        self.default_time = default_time  # 导入的诗词没有修改时间时使用
+        self.new = {}  # (标题, 作者) -> 新增的诗词在文件中的序号
+        self.changed = {}  # 已有诗词 id -> (不同的诗词在文件中的序号, (标题, 作者), 分类时已有诗词的内容哈希)
+        self.identical = 0
+        self.repeated = 0  # 文件内重复出现、被后出现的覆盖的诗词
+        self.rows = 0  # 已分类的诗词数
+        self.selected = None  # 序号 -> (已有诗词 id，新增为 None；(标题, 作者))
+        self.added = 0  # 写入时统计：新增的诗词数
+        self.updated = 0  # 写入时统计：覆盖的诗词数
+        self.stale = 0  # 写入时统计：分类之后诗词库中已被删除、修改或新增，因而跳过的诗词数
+        self.error = None  # 写入时出现的错误
+
+    def classify(self, poems, store=None):
+        """逐首分类，按 (标题, 作者) 的哈希索引查找，每首常数时间
+
+        在后台线程中分类时传入该线程可用的 store（见 SQLitePoemStore.reader）。
+        """
+        store = store or self.store
+        for poem in poems:
+            row = self.rows
+            self.rows += 1
+            key = (poem.get('title', ''), poem.get('author', ''))
+            poem_id = store.find_id(*key)
+            if poem_id is None:
+                if key in self.new:
+                    self.repeated += 1
+                self.new[key] = row
+                continue
+            if poem_id in self.changed:
+                self.repeated += 1
+                del self.changed[poem_id]
+            digest = store.content_hash(poem_id)
+            if same_content(digest, content_hash(poem), has_pinyin(poem)):
+                self.identical += 1
+            else:
+                self.changed[poem_id] = (row, key, digest)
+
+    def select(self, poems, start, policy, store=None):
+        """从重新读取的一批诗词（第一首是文件中的第 start 首）中取出要写入的诗词
+
+        返回 ([(已有诗词 id，新增为 None；要写入的完整诗词)], 跳过的诗词数)，已有诗词
+        按策略合并。与分类时 (标题, 作者) 不一致的行（文件在两遍之间被修改）不写入；
+        分类之后诗词库中已被删除、修改或新增的诗词（见 current）也不写入，计入跳过数。
+        """
+        if self.selected is None:
+            self.selected = {row: (None, key) for key, row in self.new.items()}
+            if policy != SKIP:
+                self.selected.update((row, (poem_id, key)) for poem_id, (row, key, _) in self.changed.items())
+        store = store or self.store
+        items = []
+        stale = 0
+        for row, poem in enumerate(poems, start):
+            if row not in self.selected:
+                continue
+            poem_id, key = self.selected[row]
+            if (poem.get('title', ''), poem.get('author', '')) != key:
+                continue
+            if not self.current(poem_id, key, store):
+                stale += 1
+                continue
+            poem.pop('id', None)
+            if poem_id is None:
+                if not poem.get('updated_at'):
+                    poem['updated_at'] = self.default_time
+                items.append((None, poem))
+                continue
+            merged = self._resolve(poem_id, poem, policy, store)
+            if merged is not None:
+                items.append((poem_id, merged))
+        return items, stale
+
+    def current(self, poem_id, key, store=None):
+        """分类之后诗词库中的这首诗词是否没有变化，写入前再次确认
+
+        已有诗词须仍然存在且内容哈希与分类时相同，否则会覆盖用户在导入期间的
+        修改；新增的诗词须仍然没有同标题同作者的诗词。
+        """
+        store = store or self.store
+        if poem_id is None:
+            return store.find_id(*key) is None
+        return poem_id in store and store.content_hash(poem_id) == self.changed[poem_id][2]
+
+    def _resolve(self, poem_id, poem, policy, store):
+        """按策略算出覆盖后的完整诗词，不需要覆盖时返回 None"""
+        existing = store.get(poem_id)
+        if policy == NEWER:
+            incoming_time = str(poem.get('updated_at') or self.default_time)
+            if incoming_time <= str(existing.get('updated_at') or ''):
+                return None
+        if policy == MERGE:
+            fields = {k: v for k, v in poem.items() if not _is_empty(v)}
+        else:
+            fields = dict(poem)
+        # 内容变了但没有提供新拼音时，清空旧拼音以便重新生成
+        if 'title' in fields and _is_empty(fields.get('title_pinyin')) and \
+                normalize_field(fields['title']) != normalize_field(existing.get('title')):
+            fields['title_pinyin'] = ''
+        if 'content' in fields and _is_empty(fields.get('content_pinyin')) and \
+                normalize_field(fields['content']) != normalize_field(existing.get('content')):
+            fields['content_pinyin'] = []
+        if not fields.get('updated_at'):
+            fields['updated_at'] = self.default_time
+        merged = dict(existing)
+        merged.update(fields)
+        merged['id'] = poem_id
+        return merged
@@ -0,0 +1,77 @@
+"""边输入边搜索
+
+输入停止一小段时间后才开始搜索，之前安排的搜索取消。候选按显示顺序
+分批校验，每批之间让出界面线程，第一批结果立即显示；新的搜索开始时
+正在分批进行的旧搜索中止。
+"""
+
+# 输入停止后多久开始搜索（毫秒）
+SEARCH_DELAY = 200
+
+# 每批校验的候选数
+SEARCH_CHUNK = 2000
+
+
+def narrows(previous, terms):
+    """新条件是否只会缩小上次的结果：每个条件都是在上次的条件后面接着输入的
+
+    拼音条件按前缀匹配，所以要求以上次的条件开头，而不只是包含。
+    """
+    return all(new.startswith(old) for old, new in zip(previous, terms))
+
+
+class LiveSearch:
+    """防抖和分批执行搜索，只保留最新的一次"""
+
+    def __init__(self, root, delay=SEARCH_DELAY, chunk_size=SEARCH_CHUNK):
+        self.root = root
+        self.delay = delay
+        self.chunk_size = chunk_size
+        self.pending = None  # 已安排、尚未开始的搜索
+        self.serial = 0  # 每开始或取消一次搜索加一，旧的分批任务据此中止
+        self.active = False  # 是否有搜索正在分批进行
+
+    def schedule(self, callback):
+        """输入停止 delay 毫秒后调用 callback，之前安排的调用取消"""
+        if self.pending is not None:
+            self.root.after_cancel(self.pending)
+        self.pending = self.root.after(self.delay, self._fire, callback)
+
+    def _fire(self, callback):
+        self.pending = None
+        callback()
+
+    def cancel(self):
+        """取消已安排的搜索和正在分批进行的搜索"""
+        if self.pending is not None:
+            self.root.after_cancel(self.pending)
+            self.pending = None
+        self.serial += 1
+        self.active = False
+
+    def stream(self, candidates, match, on_chunk, on_done):
+        """按顺序分批筛选候选
+
+        每批匹配的编号交给 on_chunk，第一批在本次调用中直接处理；
+        全部完成后调用 on_done(全部匹配的编号)。被新的搜索取代时不再调用。
+        """
+        self.cancel()
+        serial = self.serial
+        self.active = True
+        matches = []
+
+        def step(start):
+            if serial != self.serial:
+                return
+            chunk = [doc_id for doc_id in candidates[start:start + self.chunk_size] if match(doc_id)]
+            matches.extend(chunk)
+            on_chunk(chunk)
+            start += self.chunk_size
+            if start < len(candidates):
+                # 让界面先显示这一批，再处理下一批
+                self.root.after(1, step, start)
+            else:
+                self.active = False
+                on_done(matches)
+
+        step(0)
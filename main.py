@@ -1,9 +1,39 @@
+# 最先导入，启动计时从这里开始
+from startup import StartupTimer, REPORT_FLAG, available, load
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import json
 import csv
+import os
+import sys
+import threading
 from datetime import datetime
-from pypinyin import pinyin, Style
+from search_index import SearchIndex
+from facets import FacetIndex, DISPLAY_LIMIT
+from pinyin_index import PinyinIndex, is_pinyin_query, normalize_query
+from fulltext import FullTextIndex
+from storage import PoemStorage
+from sqlite_store import SQLitePoemStore, SQLiteFavorites, migrate_from_json
+from favorites import FavoriteFile
+from virtual_tree import VirtualTree
+from detail_view import DetailView, PREFETCH_ROWS
+from live_search import LiveSearch, narrows
+from pinyin_pipeline import (annotate_lines, annotate_poems, pinyin_sort_key, pinyin_search_keys,
+                             pinyin_pool, open_cache, close_cache)
+from poem_files import (open_poem_file, batched, write_excel_poems, write_csv_poems,
+                        write_json_poems, IMPORT_BATCH_SIZE, PROGRESS_INTERVAL)
+from progress_dialog import ProgressDialog
+from task_runner import TaskRunner, TaskCancelled
+from speech import SpeechWorker, split_segments, PLAYS_FILES
+from audio_cache import AudioCache
+from import_planner import ImportPlan, POLICIES, OVERWRITE
+from poem_store import content_hash, same_content
+
+# 批量删除时确认对话框中最多列出的诗词数
+DELETE_PREVIEW_ROWS = 20
+
+# 导入时后台最多领先界面线程准备好的批数，写入跟不上时后台等待
+IMPORT_PENDING_BATCHES = 2
 
 # 定义帮助文本
 help_text = """使用说明：
@@ -11,15 +41,18 @@ help_text = """使用说明：
 1. 搜索功能：
    - 在左上方输入框可以按标题、作者或朝代搜索诗词
    - 支持模糊搜索，输入部分内容即可
+   - 标题和作者可以输入拼音或拼音首字母，如输入 jingyesi 或 jys 查找《静夜思》
    - 按回车键或点击搜索按钮进行搜索
 
 2. 诗词列表：
    - 左侧显示所有诗词的列表
    - 点击任意诗词可在右侧查看详细内容
+   - 列表下方按朝代和作者分类，显示各分类的诗词数，点击分类即可浏览
 
 3. 诗词详情：
    - 右侧上方显示诗词原文和拼音
    - 下方标签页包含译文、注释、赏析和作者介绍
+   - 朗读过的诗词会缓存音频，再次朗读直接播放；在"数据"菜单中可为当前列表（如某个朝代或收藏夹）预先合成朗读音频
 
 4. 编辑功能：
    - 点击"编辑"按钮可以修改诗词内容
@@ -53,8 +86,9 @@ about_text = """少儿古诗词学习 v1.0
 版权所有 © 2025"""
 
 class PoemApp:
-    def __init__(self, root):
+    def __init__(self, root, startup_timer=None):
         self.root = root
+        self.startup_timer = startup_timer or StartupTimer()
         self.root.title('少儿古诗词学习')
         self.root.iconbitmap('logo.ico')
         self.editing = False
@@ -108,12 +142,52 @@ class PoemApp:
         help_menu.add_command(label="帮助", command=lambda: self.show_help_dialog())
         help_menu.add_command(label="关于", command=lambda: self.show_about_dialog())
         
+        # 创建数据菜单
+        data_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="数据", menu=data_menu)
+        data_menu.add_command(label="迁移到SQLite数据库", command=self.migrate_to_sqlite)
+        data_menu.add_command(label="预先合成当前列表的朗读音频", command=self.prerender_poems)
+        
         # 标题居中显示
         self.title_label.pack(side=tk.TOP, pady=10, expand=True)
 
-        # 加载诗词数据
-        with open('poems.json', 'r', encoding='utf-8') as f:
-            self.poems_data = json.load(f)['poems']
+        self.startup_timer.mark('创建窗口')
+
+        # 打开跨会话保存的拼音缓存，注音和排序键都先查缓存
+        open_cache('pinyin.cache')
+
+        # 导入、导出和写入磁盘在后台线程中执行
+        self.tasks = TaskRunner(self.root)
+
+        # 加载诗词数据：存在 poems.db 时使用 SQLite 数据库，
+        # 否则读取 poems.json 的摘要索引（详情按需读取）并重放变更日志
+        self.use_sqlite = os.path.exists('poems.db')
+        if self.use_sqlite:
+            self.store = SQLitePoemStore('poems.db', sort_key=pinyin_sort_key)
+            self.storage = self.store
+        else:
+            self.storage = PoemStorage('poems.json', sort_key=pinyin_sort_key)
+            self.store = self.storage.load()
+        self.startup_timer.mark('读取诗词库')
+
+        # 建立搜索索引，以诗词 id 为编号（SQLite 模式下由数据库负责）
+        self.search_index = SearchIndex()
+        self.fulltext = None
+        self.fulltext_pending = None  # 后台建立全文索引期间有变化的诗词 id
+        self.pinyin_index = None  # 标题和作者的拼音索引，首次按拼音搜索时建立
+        self.facets = FacetIndex()  # 朝代和作者分类的 id 集合及计数
+        self.facet_refresh_pending = False
+        if self.use_sqlite:
+            for poem_id, title, author, dynasty in self.store.search():
+                self.facets.add(poem_id, dynasty, author)
+            self.schedule_facet_refresh()
+        else:
+            for poem in self.store.summaries():
+                self.index_poem(poem)
+
+            # 打开全文索引，索引文件与数据不匹配时在首次全文搜索时在后台重建
+            self.fulltext = FullTextIndex.open('poems.fts', self.storage.signature())
+        self.startup_timer.mark('建立索引')
 
         # 创建主框架
         self.main_frame = ttk.Frame(root, padding="10")
@@ -139,16 +213,25 @@ class PoemApp:
         self.title_search = ttk.Entry(self.search_frame, width=8)
         self.title_search.grid(row=0, column=1, padx=5)
         self.title_search.bind('<Return>', lambda e: self.search_poems())
+        self.title_search.bind('<KeyRelease>', self.on_search_typed)
 
         ttk.Label(self.search_frame, text="作者:").grid(row=0, column=2, padx=5)
         self.author_search = ttk.Entry(self.search_frame, width=5)
         self.author_search.grid(row=0, column=3, padx=5)
         self.author_search.bind('<Return>', lambda e: self.search_poems())
+        self.author_search.bind('<KeyRelease>', self.on_search_typed)
 
         ttk.Label(self.search_frame, text="朝代:").grid(row=0, column=4, padx=5)
         self.dynasty_search = ttk.Entry(self.search_frame, width=3)
         self.dynasty_search.grid(row=0, column=5, padx=5)
         self.dynasty_search.bind('<Return>', lambda e: self.search_poems())
+        self.dynasty_search.bind('<KeyRelease>', self.on_search_typed)
+
+        # 全文搜索输入框，可搜索诗句、译文、注释、赏析等，双引号内为短语
+        ttk.Label(self.search_frame, text="全文:").grid(row=1, column=0, padx=5, pady=(5, 0))
+        self.fulltext_search = ttk.Entry(self.search_frame)
+        self.fulltext_search.grid(row=1, column=1, columnspan=6, sticky=(tk.W, tk.E), padx=5, pady=(5, 0))
+        self.fulltext_search.bind('<Return>', lambda e: self.search_poems())
 
         self.search_btn = ttk.Button(self.search_frame, text="搜索", command=self.search_poems, width=4)
         self.search_btn.grid(row=0, column=6, padx=5)
@@ -185,6 +268,13 @@ class PoemApp:
         self.sort_column = None  # 当前排序的列
         self.sort_reverse = False  # 是否逆序
         self.sort_count = 0  # 添加点击次数记录
+        self.result_ids = []  # 当前结果集的原始顺序
+        self.sorted_results = {}  # 列 -> 当前结果集按该列升序排列的 id
+        
+        # 边输入边搜索：live_query 是最近开始的条件，live_terms 是最近完整显示的条件
+        self.live_search = LiveSearch(self.root)
+        self.live_query = None
+        self.live_terms = None
         
         # 配置left_frame的网格权重，使poem_tree能够自动扩展
         self.left_frame.grid_columnconfigure(0, weight=1)
@@ -195,14 +285,39 @@ class PoemApp:
         self.poem_tree.column('author', width=100)
         self.poem_tree.column('dynasty', width=40)
 
-        # 绑定选择事件
-        self.poem_tree.bind('<<TreeviewSelect>>', self.show_poem_details)
-
         # 添加滚动条
         tree_scroll = ttk.Scrollbar(self.left_frame, orient=tk.VERTICAL, command=self.poem_tree.yview)
         tree_scroll.grid(row=1, column=1, sticky=(tk.N, tk.S))
         self.poem_tree.configure(yscrollcommand=tree_scroll.set)
 
+        # 虚拟列表：结果集只保存 id，树形视图中只放可见的几行
+        self.poem_list = VirtualTree(self.poem_tree, tree_scroll, self.poem_row)
+
+        # 绑定选择事件（排在虚拟列表同步选中状态之后）
+        self.poem_tree.bind('<<TreeviewSelect>>', self.show_poem_details, add='+')
+
+        # 朝代和作者分类，显示各分类的诗词数，点击即可浏览；选了朝代后作者列表只显示该朝代的作者
+        self.facet_frame = ttk.Frame(self.left_frame)
+        self.facet_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
+        self.facet_frame.grid_columnconfigure(0, weight=1)
+        self.facet_frame.grid_columnconfigure(2, weight=2)
+        self.facet_trees = {}
+        for column, (field, text) in enumerate((('dynasty', '朝代'), ('author', '作者'))):
+            tree = ttk.Treeview(self.facet_frame, columns=('name', 'count'), show='headings',
+                                height=6, selectmode='browse')
+            tree.heading('name', text=text)
+            tree.heading('count', text='诗词数')
+            tree.column('name', width=80)
+            tree.column('count', width=50, anchor=tk.E)
+            tree.grid(row=0, column=column * 2, sticky=(tk.W, tk.E))
+            scroll = ttk.Scrollbar(self.facet_frame, orient=tk.VERTICAL, command=tree.yview)
+            scroll.grid(row=0, column=column * 2 + 1, sticky=(tk.N, tk.S))
+            tree.configure(yscrollcommand=scroll.set)
+            tree.bind('<<TreeviewSelect>>', lambda e, field=field: self.on_facet_select(field))
+            self.facet_trees[field] = tree
+        self.facet_dynasty = None  # 选中的朝代，None 表示全部
+        self.facet_author = None  # 选中的作者，None 表示全部
+
         # 创建右侧内容框架
         self.content_frame = ttk.Frame(self.right_frame)
         self.content_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -256,6 +371,7 @@ class PoemApp:
         self.voice_var = tk.StringVar()
         self.voice_combo = ttk.Combobox(self.read_control_frame, textvariable=self.voice_var, state='readonly')
         self.voice_combo.pack(fill=tk.X, pady=1)
+        self.voice_combo.bind('<<ComboboxSelected>>', self.on_voice_selected)
         
         # 添加朗读按钮，减小间距
         self.read_btn = ttk.Button(self.read_control_frame, text='朗读', command=self.read_poem)
@@ -273,12 +389,14 @@ class PoemApp:
         ttk.Label(self.read_control_frame, text='语速:').pack(pady=(5,0))
         self.rate_scale = ttk.Scale(self.read_control_frame, from_=50, to=300, orient=tk.HORIZONTAL)
         self.rate_scale.set(150)
+        self.rate_scale.config(command=self.on_rate_changed)
         self.rate_scale.pack(fill=tk.X, pady=1)
         
         # 添加音量控制
         ttk.Label(self.read_control_frame, text='音量:').pack(pady=(5,0))
         self.volume_scale = ttk.Scale(self.read_control_frame, from_=0, to=1, orient=tk.HORIZONTAL)
         self.volume_scale.set(1.0)
+        self.volume_scale.config(command=self.on_volume_changed)
         self.volume_scale.pack(fill=tk.X, pady=1)
         
         # 添加退出按钮到朗读控制区域下方
@@ -346,6 +464,11 @@ class PoemApp:
         for text_widget in [self.translation_text, self.note_text, self.appreciation_text, self.author_text]:
             text_widget.config(state='disabled')
 
+        # 详情显示：样式只配置一次，排版按诗词缓存
+        self.detail_view = DetailView(
+            self.poem_content, [self.translation_text, self.note_text, self.appreciation_text, self.author_text],
+            self.store.get)
+
         # 配置网格权重
         translation_frame.grid_columnconfigure(0, weight=1)
         translation_frame.grid_rowconfigure(0, weight=1)
@@ -373,158 +496,457 @@ class PoemApp:
         self.content_frame.grid_rowconfigure(1, weight=2)  # 诗词显示框占2份
         self.content_frame.grid_rowconfigure(2, weight=3)  # 注释内容显示框占3份
 
-        # 初始化朗读引擎和状态
-        self.engine = None
+        # 初始化朗读线程和状态
+        self.speech = None
+        self.voice_ids = None  # 音色名称 -> 音色 id，引擎初始化完成后才有
+        self.reading_serial = None  # 正在进行的朗读的序号
         self.is_reading = False
         self.is_paused = False
         
-        # 初始化音色列表
-        self.init_voice_list()
-        
         self.poem_content.config(state='disabled')
+        self.startup_timer.mark('创建界面')
 
         # 初始化收藏列表
         self.favorites = self.load_favorites()
+        self.startup_timer.mark('读取收藏')
+        
+        # 语音引擎和拼音在首次绘制后再加载
+        self.root.after_idle(self.after_first_paint)
+
+    def after_first_paint(self):
+        """窗口已经可以使用：报告启动耗时，在后台加载语音引擎和拼音"""
+        self.startup_timer.mark('首次绘制')
+        self.startup_timer.report()
+        
+        # 初始化音色列表
+        self.init_voice_list()
+        
+        def load_pinyin(token):
+            load('pypinyin')
+        
+        def pinyin_failed(error):
+            messagebox.showerror('错误', '未找到pypinyin模块，拼音功能将不可用。\n请使用以下命令安装：\npip install pypinyin')
+        
+        self.tasks.submit(load_pinyin, on_done=lambda result: self.startup_timer.loaded('拼音', 'pypinyin'),
+                          on_error=pinyin_failed)
 
     def init_voice_list(self):
-        try:
-            try:
-                import pyttsx3
-            except ImportError:
-                messagebox.showerror('错误', '未找到pyttsx3模块，朗读功能将不可用。\n请使用以下命令安装：\npip install pyttsx3\npip install pywin32')
-                self.voice_combo['values'] = ['未安装语音引擎']
-                self.voice_combo.set('未安装语音引擎')
-                self.read_btn.config(state='disabled')
-                return
+        if not available('pyttsx3'):
+            messagebox.showerror('错误', '未找到pyttsx3模块，朗读功能将不可用。\n请使用以下命令安装：\npip install pyttsx3\npip install pywin32')
+            self.voice_combo['values'] = ['未安装语音引擎']
+            self.voice_combo.set('未安装语音引擎')
+            self.read_btn.config(state='disabled')
+            return
+        
+        # 语音引擎在朗读线程中初始化，完成后填入音色列表
+        self.voice_combo['values'] = ['正在加载...']
+        self.voice_combo.set('正在加载...')
+        self.read_btn.config(state='disabled')
+        self.speech = SpeechWorker(self.tasks.call_soon, on_ready=self.voices_ready,
+                                   on_finished=self.reading_finished, on_error=self.speech_failed,
+                                   cache=AudioCache())
+        self.speech.start()
+
+    def voices_ready(self, voices):
+        self.startup_timer.loaded('语音引擎', 'pyttsx3')
+        
+        # 提取音色名称,去掉Microsoft和其他前缀
+        self.voice_ids = {}
+        for voice_id, name in voices:
+            self.voice_ids[name.replace('Microsoft ', '')] = voice_id
+        voice_names = list(self.voice_ids)
+        
+        if not voice_names:
+            messagebox.showwarning('警告', '未检测到系统语音引擎，朗读功能可能无法正常使用。\n请确保系统安装了语音引擎。')
+            voice_names = ['系统默认']
+        
+        self.voice_combo['values'] = voice_names
+        self.voice_combo.set(voice_names[0])
+        self.read_btn.config(state='normal')
 
-            if not self.engine:
-                self.engine = pyttsx3.init()
-            
-            # 获取可用的音色列表
-            voices = self.engine.getProperty('voices')
-            self.voices = voices
-            
-            # 更新下拉框选项
-            voice_names = []
-            for voice in voices:
-                # 提取音色名称,去掉Microsoft和其他前缀
-                name = voice.name
-                if 'Microsoft' in name:
-                    name = name.replace('Microsoft ', '')
-                voice_names.append(name)
-            
-            if not voice_names:
-                messagebox.showwarning('警告', '未检测到系统语音引擎，朗读功能可能无法正常使用。\n请确保系统安装了语音引擎。')
-                voice_names = ['系统默认']
-            
-            self.voice_combo['values'] = voice_names
-            self.voice_combo.set(voice_names[0])
-                
-        except Exception as e:
-            messagebox.showerror('错误', f'初始化音色列表失败: {str(e)}\n朗读功能将不可用。')
+    def speech_failed(self, error):
+        if self.voice_ids is None:
+            messagebox.showerror('错误', f'初始化音色列表失败: {str(error)}\n朗读功能将不可用。')
             self.voice_combo['values'] = ['初始化失败']
             self.voice_combo.set('初始化失败')
             self.read_btn.config(state='disabled')
+            self.speech = None
+            return
+        messagebox.showerror('错误', f'朗读过程中发生错误: {str(error)}')
+        self.reset_read_buttons()
 
     def search_poems(self):
+        # 取消尚未完成的边输入边搜索
+        self.live_search.cancel()
+        
         # 获取搜索条件
         title = self.title_search.get().strip()
         author = self.author_search.get().strip()
         dynasty = self.dynasty_search.get().strip()
+        query = self.fulltext_search.get().strip()
+        live_key = None
+
+        terms, pinyin_terms = self.split_terms(self.live_key())
+
+        if self.use_sqlite:
+            # 筛选和相关度排序都在数据库中完成，拼音条件再按拼音索引筛选
+            ids = [row[0] for row in self.store.search(terms.get('title', ''), terms.get('author', ''),
+                                                       dynasty, query)]
+            for field, value in pinyin_terms.items():
+                allowed = self.get_pinyin_index().search(field, value)
+                allowed.update(row[0] for row in self.store.search(**{field: value}))
+                ids = [poem_id for poem_id in ids if poem_id in allowed]
+        else:
+            # 根据条件筛选诗词（通过倒排索引和拼音索引求交集）
+            if terms or pinyin_terms:
+                match = self.term_matcher(terms, pinyin_terms)
+                keys = [poem_id for poem_id in self.candidate_ids(terms, pinyin_terms) if match(poem_id)]
+                keys.sort(key=self.search_index.order.__getitem__)
+            else:
+                keys = None
 
-        # 根据条件筛选诗词
-        filtered_poems = self.poems_data
-        if title:
-            filtered_poems = [poem for poem in filtered_poems if title.lower() in poem['title'].lower()]
-        if author:
-            filtered_poems = [poem for poem in filtered_poems if author.lower() in poem['author'].lower()]
-        if dynasty:
-            filtered_poems = [poem for poem in filtered_poems if dynasty.lower() in poem['dynasty'].lower()]
+            if query:
+                fulltext = self.get_fulltext_index()
+                if fulltext is None:
+                    # 索引正在后台建立，建好后重新搜索
+                    return
+                # 全文搜索结果按相关度排列，最相关的在前
+                ranked = [key for key, score in fulltext.search(query)]
+                if keys is not None:
+                    allowed = set(keys)
+                    ranked = [key for key in ranked if key in allowed]
+                keys = ranked
+
+            ids = list(self.store.ids()) if keys is None else keys
+            if not query:
+                # 下次输入时可以在这次的结果中继续筛选
+                live_key = self.live_key()
+
+        # 显示搜索结果，只填充可见的行
+        self.show_results(ids, live_key)
+
+    def live_key(self):
+        """标题、作者、朝代条件，已去除空白并转为小写"""
+        terms = self.search_index.terms(self.title_search.get(), self.author_search.get(),
+                                        self.dynasty_search.get())
+        return tuple(terms.get(field, '') for field in self.search_index.FIELDS)
+
+    def split_terms(self, key):
+        """把 (标题, 作者, 朝代) 条件分为汉字条件和拼音条件，都是 {字段: 查询词}
+
+        标题和作者只由字母组成时按拼音查找，同时也按原文子串匹配。
+        """
+        terms = {}
+        pinyin_terms = {}
+        for field, value in zip(self.search_index.FIELDS, key):
+            if not value:
+                continue
+            if field in ('title', 'author') and is_pinyin_query(value):
+                pinyin_terms[field] = normalize_query(value)
+            else:
+                terms[field] = value
+        return terms, pinyin_terms
+
+    def candidate_ids(self, terms, pinyin_terms):
+        """候选 id 集合，还需要用 term_matcher 校验"""
+        if terms or not pinyin_terms:
+            return self.search_index.candidates(terms)
+        # 只有拼音条件时，用第一个拼音条件的匹配作为候选
+        field, value = next(iter(pinyin_terms.items()))
+        return self.get_pinyin_index().search(field, value) | self.search_index.candidates({field: value})
+
+    def term_matcher(self, terms, pinyin_terms):
+        """返回判断一首诗词是否满足全部条件的函数"""
+        search_index = self.search_index
+        if not pinyin_terms:
+            return lambda poem_id: search_index.matches(poem_id, terms)
+        pinyin_index = self.get_pinyin_index()
+        
+        def match(poem_id):
+            if not search_index.matches(poem_id, terms):
+                return False
+            return all(pinyin_index.matches(poem_id, field, value) or
+                       search_index.matches(poem_id, {field: value})
+                       for field, value in pinyin_terms.items())
+        return match
+
+    def get_pinyin_index(self):
+        """返回拼音索引，尚未建立时现在建立；标题和作者的拼音取自拼音缓存"""
+        if self.pinyin_index is None:
+            rows = ((s['id'], s.get('title'), s.get('author')) for s in self.store.summaries())
+            self.pinyin_index = PinyinIndex.build(rows, pinyin_search_keys)
+        return self.pinyin_index
+
+    def on_search_typed(self, event):
+        """在标题、作者、朝代框中输入时，停止输入片刻后自动搜索"""
+        if event.keysym in ('Return', 'KP_Enter'):
+            return
+        self.live_search.schedule(self.live_search_poems)
 
-        # 清空现有搜索结果
-        for item in self.poem_tree.get_children():
-            self.poem_tree.delete(item)
+    def live_search_poems(self):
+        """边输入边搜索
 
-        # 显示搜索结果
-        for poem in filtered_poems:
-            self.poem_tree.insert('', 'end', values=(poem['title'], poem['author'], poem['dynasty']))
-        
-        # 如果之前有排序，保持相同的排序
+        条件在上次完整显示的结果基础上加长时，只在上次的结果中筛选，
+        不再查倒排索引。候选按显示顺序分批校验，第一批结果立即显示。
+        """
+        if self.use_sqlite or self.fulltext_search.get().strip():
+            # 数据库查询和全文相关度排序一次完成
+            self.search_poems()
+            return
+        key = self.live_key()
+        if key == self.live_query:
+            # 条件没有变化（例如只移动了光标）
+            return
+        previous = self.live_terms
+        self.live_query = key
+        self.live_terms = None
+        terms, pinyin_terms = self.split_terms(key)
+        match = self.term_matcher(terms, pinyin_terms)
+        if previous is not None and narrows(previous, key):
+            # 列表中的就是上次的完整结果，已按当前的排序排列
+            candidates = self.poem_list.ids
+        else:
+            found = self.candidate_ids(terms, pinyin_terms)
+            if self.sort_column:
+                candidates = self.store.sort_ids(found, self.sort_column, self.sort_reverse)
+            else:
+                candidates = sorted(found, key=self.search_index.order.__getitem__)
+        
+        def finished(ids):
+            self.live_terms = key
+            self.sorted_results = {}
+            if self.sort_column:
+                # 分批显示的是排序后的顺序，原始顺序按加入索引的顺序恢复
+                self.result_ids = sorted(ids, key=self.search_index.order.__getitem__)
+                self.sorted_results[self.sort_column] = ids[::-1] if self.sort_reverse else ids
+            else:
+                self.result_ids = ids
+        
+        self.poem_list.set_ids([])
+        self.live_search.stream(candidates, match, self.poem_list.extend, finished)
+
+    def index_poem(self, poem):
+        """把诗词加入搜索索引，修改过的诗词重新调用即可更新"""
+        self.facets.add(poem['id'], poem.get('dynasty'), poem.get('author'))
+        self.schedule_facet_refresh()
+        if self.pinyin_index is not None:
+            self.pinyin_index.add(poem['id'], poem.get('title'), poem.get('author'))
+        if self.use_sqlite:
+            return
+        # 诗词有变化，不能再在上次的结果中筛选
+        self.live_query = self.live_terms = None
+        self.search_index.add(poem['id'], poem)
+        if self.fulltext is not None:
+            self.fulltext.add(poem['id'], poem)
+        elif self.fulltext_pending is not None:
+            self.fulltext_pending.add(poem['id'])
+
+    def unindex_poems(self, poem_ids):
+        """从各索引中移除一批诗词，每首只更新它自己的倒排项和分类"""
+        for poem_id in poem_ids:
+            self.facets.remove(poem_id)
+            self.detail_view.forget(poem_id)
+        self.schedule_facet_refresh()
+        if self.pinyin_index is not None:
+            # 有序数组一次过滤，不逐个删除
+            self.pinyin_index.remove_many(poem_ids)
+        if self.use_sqlite:
+            return
+        self.live_query = self.live_terms = None
+        for poem_id in poem_ids:
+            self.search_index.remove(poem_id)
+            if self.fulltext is not None:
+                self.fulltext.remove(poem_id)
+            elif self.fulltext_pending is not None:
+                self.fulltext_pending.add(poem_id)
+
+    def schedule_facet_refresh(self):
+        """分类计数有变化时，等界面空闲时刷新一次分类列表，连续的修改只刷新一次"""
+        if not self.facet_refresh_pending:
+            self.facet_refresh_pending = True
+            self.root.after_idle(self.refresh_facets)
+
+    def refresh_facets(self):
+        """按分类计数重新填充朝代和作者列表，保留当前的选择"""
+        self.facet_refresh_pending = False
+        dynasties = self.facets.counts('dynasty')
+        if self.facet_dynasty not in dynasties:
+            self.facet_dynasty = None
+        self.fill_facet('dynasty', dynasties, self.facet_dynasty)
+        authors = self.facets.counts('author', self.facet_dynasty)
+        if self.facet_author not in authors:
+            self.facet_author = None
+        self.fill_facet('author', authors, self.facet_author)
+
+    def fill_facet(self, field, counts, selected):
+        """填充一个分类列表，按诗词数从多到少排列；列表项的 iid 为 '=' 加分类值"""
+        tree = self.facet_trees[field]
+        tree.delete(*tree.get_children())
+        tree.insert('', 'end', iid='*', values=('全部', sum(counts.values())))
+        items = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        for value, count in items[:DISPLAY_LIMIT]:
+            tree.insert('', 'end', iid='=' + value, values=(value or '（未知）', count))
+        if len(items) > DISPLAY_LIMIT:
+            tree.insert('', 'end', iid='+', values=(f'其余{len(items) - DISPLAY_LIMIT}项', ''))
+        iid = '*' if selected is None else '=' + selected
+        if tree.exists(iid):
+            tree.selection_set(iid)
+
+    def on_facet_select(self, field):
+        """点击分类：求所选朝代和作者的 id 集合的交集并显示"""
+        selection = self.facet_trees[field].selection()
+        if not selection or selection[0] == '+':
+            return
+        value = None if selection[0] == '*' else selection[0][1:]
+        if field == 'dynasty':
+            # 刷新列表时重新选中原来的项，选择没有变化时不重新显示
+            if value == self.facet_dynasty:
+                return
+            self.facet_dynasty = value
+            self.facet_author = None
+            self.fill_facet('author', self.facets.counts('author', value), None)
+        else:
+            if value == self.facet_author:
+                return
+            self.facet_author = value
+        self.show_facet_results()
+
+    def show_facet_results(self):
+        """显示所选分类中的诗词，按原始顺序排列"""
+        ids = self.facets.ids(self.facet_dynasty, self.facet_author)
+        if ids is None:
+            ids = list(self.store.ids())
+        elif self.use_sqlite:
+            ids = sorted(ids)
+        else:
+            ids = sorted(ids, key=self.search_index.order.__getitem__)
+        self.show_results(ids)
+
+    def get_fulltext_index(self):
+        """返回全文索引；尚未建立时在后台开始建立并返回 None，建好后重新搜索"""
+        if self.fulltext is None and self.fulltext_pending is None:
+            self.build_fulltext_index()
+        return self.fulltext
+
+    def build_fulltext_index(self):
+        """在后台读取全部诗词的详情建立全文索引，可以取消
+
+        建立期间修改或删除的诗词记在 fulltext_pending 中，建好后按当前的
+        诗词库补上。签名取自开始建立时，期间有修改时下次启动会重建。
+        """
+        ids = list(self.store.ids())
+        # 每次修改都会写入日志，签名对应当前数据，可以保存索引供下次直接映射
+        signature = self.storage.signature()
+        self.fulltext_pending = set()
+        
+        def build(token):
+            def items():
+                for count, poem_id in enumerate(ids, 1):
+                    if count % PROGRESS_INTERVAL == 0:
+                        token.check()
+                        token.progress(count)
+                    poem = self.store.get(poem_id)
+                    if poem is not None:
+                        yield poem_id, poem
+            return FullTextIndex.build(items(), 'poems.fts', signature)
+        
+        def finished(fulltext):
+            progress.close()
+            for poem_id in self.fulltext_pending:
+                if poem_id in self.store:
+                    fulltext.add(poem_id, self.store.get(poem_id))
+                else:
+                    fulltext.remove(poem_id)
+            self.fulltext = fulltext
+            self.fulltext_pending = None
+            if self.fulltext_search.get().strip():
+                self.search_poems()
+        
+        def failed(error):
+            progress.close()
+            self.fulltext_pending = None
+            if not isinstance(error, TaskCancelled):
+                messagebox.showerror('错误', f'建立全文索引失败：{str(error)}')
+        
+        progress = ProgressDialog(self.root, '全文搜索', '正在建立全文索引...', maximum=len(ids))
+        token = self.tasks.submit(build, on_progress=progress.update, on_done=finished, on_error=failed)
+        progress.on_cancel = token.cancel
+
+    def commit_poems(self, puts=(), deletes=()):
+        """只把改动的诗词写入变更日志，日志过大时合并回 poems.json
+
+        日志记录在界面线程中编码，写入、fsync 和合并快照在写入线程中按提交顺序执行。
+        """
+        if self.use_sqlite:
+            # SQLite 连接只能在创建它的线程中使用，事务提交本身很快
+            self.storage.commit(puts, deletes)
+            return
+        record = self.storage.encode(puts, deletes)
+        if record is not None:
+            self.tasks.submit_write(self.storage.append, record, on_error=self.write_failed)
+        if self.storage.needs_compaction():
+            entries = self.storage.prepare_compaction(self.store)
+            self.tasks.submit_write(self.storage.write_compaction, self.store, entries,
+                                    on_error=self.write_failed)
+
+    def write_failed(self, error):
+        messagebox.showerror('错误', f'保存失败：{str(error)}')
+
+    def show_results(self, ids, live_key=None):
+        """显示一个新的结果集，如果之前有排序，保持相同的排序
+
+        尚未完成的边输入边搜索一并取消，不会再替换或追加到这个结果集。
+        live_key 是这个结果集对应的 (标题, 作者, 朝代) 条件，下次输入时
+        只有在它的基础上加长才在这个结果中继续筛选；其他结果集为 None。
+        """
+        self.live_search.cancel()
+        self.live_query = self.live_terms = live_key
+        self.result_ids = ids
+        self.sorted_results = {}
         if self.sort_column:
-            self.sort_tree(self.sort_column)
+            self.poem_list.set_ids(self.sorted_result_ids())
+        else:
+            self.poem_list.set_ids(ids)
+
+    def sorted_result_ids(self):
+        """当前结果集按当前列和方向排序后的 id"""
+        ascending = self.sorted_results.get(self.sort_column)
+        if ascending is None:
+            # 排序键在载入或修改诗词时已算好，这里不调用拼音转换
+            ascending = self.store.sort_ids(self.result_ids, self.sort_column)
+            self.sorted_results[self.sort_column] = ascending
+        return ascending[::-1] if self.sort_reverse else ascending
+
+    def poem_row(self, poem_id):
+        """列表中一行的值，只读取诗词摘要"""
+        poem = self.store.summary(poem_id)
+        if not poem:
+            return ('', '', '')
+        return (poem['title'], poem['author'], poem['dynasty'])
+
+    def get_selected_poem(self):
+        """返回列表中选中的第一首诗词，列表项的 iid 就是诗词 id"""
+        selection = self.poem_list.selection_ids()
+        if not selection:
+            return None
+        return self.store.get(selection[0])
 
     def show_poem_details(self, event):
-        # 获取选中的诗词
-        selection = self.poem_tree.selection()
+        """显示选中的诗词；排版有缓存，并预先排版列表中相邻的几首"""
+        selection = self.poem_list.selection_ids()
         if not selection:
             return
-            
-        item = selection[0]
-        values = self.poem_tree.item(item)['values']
-        title = values[0]
-        
-        # 查找诗词数据
-        poem = None
-        for p in self.poems_data:
-            if p['title'] == title:
-                poem = p
-                break
-                
-        if not poem:
+        poem_id = selection[0]
+        if not self.detail_view.show(poem_id, editable=self.editing):
             return
-            
-        # 处理诗词内容和拼音
-        self.poem_content.config(state='normal')
-        self.poem_content.delete('1.0', 'end')
-        
-        # 配置标题、拼音和汉字的样式
-        self.poem_content.tag_configure('title', font=('SimSun', 18, 'bold'), justify='center', spacing1=5, spacing3=5)
-        self.poem_content.tag_configure('pinyin', font=('SimSun', 12), justify='center', spacing1=2, spacing3=2, spacing2=5)
-        self.poem_content.tag_configure('hanzi', font=('SimSun', 16, 'bold'), justify='center', spacing1=2, spacing3=5, spacing2=5)
-        
-        # 插入标题和拼音
-        if 'title_pinyin' in poem:
-            self.poem_content.insert('end', poem.get('title_pinyin', '') + '\n', 'pinyin')
-        self.poem_content.insert('end', poem['title'] + '\n\n', 'title')
-        
-        # 获取诗词内容和拼音
-        content_lines = poem.get('content', [])
-        pinyin_lines = poem.get('content_pinyin', [])
-        
-        # 将拼音显示在汉字上方
-        if isinstance(content_lines, list) and isinstance(pinyin_lines, list) and len(content_lines) == len(pinyin_lines):
-            for content_line, pinyin_line in zip(content_lines, pinyin_lines):
-                # 插入拼音行
-                self.poem_content.insert('end', pinyin_line + '\n', 'pinyin')
-                # 插入汉字行
-                self.poem_content.insert('end', content_line + '\n', 'hanzi')
-        else:
-            # 如果没有拼音或格式不匹配，只显示内容
-            if isinstance(content_lines, list):
-                for line in content_lines:
-                    self.poem_content.insert('end', line + '\n', 'hanzi')
-            else:
-                self.poem_content.insert('end', str(content_lines), 'hanzi')
-        
-        self.poem_content.config(state='disabled')
         
-        # 显示诗词内容
-        for text_widget in [self.translation_text, self.note_text, self.appreciation_text, self.author_text]:
-            text_widget.config(state='normal')
-            text_widget.delete('1.0', 'end')
-            
-        self.translation_text.insert('1.0', poem.get('translation', ''))
-        self.note_text.insert('1.0', poem.get('note', ''))
-        self.appreciation_text.insert('1.0', poem.get('appreciation', ''))
-        self.author_text.insert('1.0', poem.get('author_intro', ''))
-        
-        # 如果不在编辑模式，禁用文本框
-        if not self.editing:
-            for text_widget in [self.translation_text, self.note_text, self.appreciation_text, self.author_text]:
-                text_widget.config(state='disabled')
+        i = self.poem_list.index(poem_id)
+        if i is not None:
+            ids = self.poem_list.ids
+            self.detail_view.prefetch(ids[i + 1:i + 1 + PREFETCH_ROWS].tolist() +
+                                      ids[max(0, i - PREFETCH_ROWS):i].tolist())
 
         # 更新收藏按钮状态
-        poem_id = f"{poem['title']}_{poem['author']}"
         if poem_id in self.favorites:
             self.favorite_btn.config(text='取消收藏')
         else:
@@ -541,76 +963,48 @@ class PoemApp:
         self.poem_content.config(state='normal')
         for text_widget in [self.translation_text, self.note_text, self.appreciation_text, self.author_text]:
             text_widget.config(state='normal')
+        
+        # 从这里起记录原文框中改动过的段
+        selection = self.poem_list.selection_ids()
+        if selection:
+            self.detail_view.begin_edit(selection[0])
 
     def save_poem(self):
         # 获取当前选中的诗词
-        selection = self.poem_tree.selection()
+        selection = self.poem_list.selection_ids()
         if not selection:
             return
             
-        item = selection[0]
-        values = self.poem_tree.item(item)['values']
-        title = values[0]
-        
-        # 获取诗词内容
-        content_text = self.poem_content.get('1.0', 'end-1c')
-        lines = content_text.split('\n')
-        
-        # 解析标题、拼音和内容
-        title_pinyin = ''
-        new_title = ''
-        content_lines = []
-        content_pinyin_lines = []
-        
-        # 处理标题部分
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            if not line:  # 跳过空行
-                i += 1
-                continue
-            if not title_pinyin and not new_title:  # 第一个非空行是标题拼音
-                title_pinyin = line
-                i += 1
-            elif not new_title:  # 第二个非空行是标题
-                new_title = line
-                i += 2  # 跳过标题后的空行
-                break
-            else:
-                break
-        
-        # 处理内容部分
-        while i < len(lines):
-            line = lines[i].strip()
-            if line:  # 非空行
-                if len(content_lines) == len(content_pinyin_lines):  # 当前是拼音行
-                    content_pinyin_lines.append(line)
-                else:  # 当前是汉字行
-                    content_lines.append(line)
-            i += 1
+        poem_id = selection[0]
+        if poem_id not in self.store:
+            return
+        
+        # 只合并改动过的段和文本框，只改了汉字的行重新注音
+        poem = self.store.get(poem_id)
+        fields = self.detail_view.edits(poem, annotate_lines)
+        
+        # 内容哈希没有变化时不写入
+        edited = dict(poem, **fields)
+        if not fields or same_content(self.store.content_hash(poem_id), content_hash(edited)):
+            self.cancel_edit()
+            messagebox.showinfo('提示', '内容没有变化，无需保存')
+            return
         
         # 更新诗词数据
-        for poem in self.poems_data:
-            if poem['title'] == title:
-                poem['title'] = new_title
-                poem['title_pinyin'] = title_pinyin
-                poem['content'] = content_lines
-                poem['content_pinyin'] = content_pinyin_lines
-                poem['translation'] = self.translation_text.get('1.0', 'end-1c')
-                poem['note'] = self.note_text.get('1.0', 'end-1c')
-                poem['appreciation'] = self.appreciation_text.get('1.0', 'end-1c')
-                poem['author_intro'] = self.author_text.get('1.0', 'end-1c')
-                break
+        fields['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        poem = self.store.update(poem_id, fields)
+        self.index_poem(poem)
+        self.detail_view.forget(poem_id)
                 
         # 保存到文件
-        with open('poems.json', 'w', encoding='utf-8') as f:
-            json.dump({'poems': self.poems_data}, f, ensure_ascii=False, indent=4)
+        self.commit_poems(puts=[poem])
             
         # 禁用编辑模式
         self.cancel_edit()
         
-        # 更新树形视图中的标题
-        self.poem_tree.item(item, values=(new_title, values[1], values[2]))
+        # 更新列表中可见行的标题，标题作者可能已改变，下次排序重新取序
+        self.poem_list.refresh()
+        self.sorted_results = {}
         
         messagebox.showinfo('成功', '保存成功！')
 
@@ -629,125 +1023,117 @@ class PoemApp:
         self.show_poem_details(None)
 
     def read_poem(self):
-        # 检查是否已安装pyttsx3
-        try:
-            import pyttsx3
-        except ImportError:
-            messagebox.showerror('错误', '未找到pyttsx3模块，无法使用朗读功能。\n请使用以下命令安装：\npip install pyttsx3\npip install pywin32')
+        if not self.speech or self.voice_ids is None:
             return
         
-        # 获取当前选中的诗词内容
-        selection = self.poem_tree.selection()
+        # 获取当前选中的诗词
+        selection = self.poem_list.selection_ids()
         if not selection:
             messagebox.showinfo('提示', '请先选择一首诗词')
             return
             
-        # 获取诗词内容
-        content = ''
-        for line in self.poem_content.get('1.0', 'end-1c').split('\n'):
-            if line.strip() and not any(char.isascii() for char in line):  # 只读取汉字行
-                content += line.strip() + '，'
+        # 诗词内容按标点分段
+        poem = self.store.get(selection[0])
+        content = poem.get('content', []) if poem else []
+        if not isinstance(content, list):
+            content = [str(content)]
+        segments = split_segments(content)
                 
-        if not content:
+        if not segments:
             messagebox.showinfo('提示', '无法获取诗词内容')
             return
-            
-        try:
-            import threading
-            
-            # 初始化引擎
-            if not self.engine:
-                self.engine = pyttsx3.init()
-            
-            # 设置选中的音色
-            try:
-                voice_name = self.voice_var.get()
-                if hasattr(self, 'voices'):
-                    for voice in self.voices:
-                        if voice.name.replace('Microsoft ', '') == voice_name:
-                            self.engine.setProperty('voice', voice.id)
-                            break
-            except Exception as e:
-                print(f"设置音色失败: {str(e)}")  # 仅打印错误，继续使用默认音色
-            
-            # 更新引擎属性
-            self.engine.setProperty('rate', self.rate_scale.get())  # 设置语速
-            self.engine.setProperty('volume', self.volume_scale.get())  # 设置音量
-            
-            # 启用控制按钮
-            self.read_btn.config(state='disabled')
-            self.pause_btn.config(state='normal')
-            self.stop_btn.config(state='normal')
-            
-            # 开始朗读
-            self.is_reading = True
-            self.is_paused = False
-            
-            def read_thread():
-                try:
-                    # 将内容按句号、逗号等标点符号分段
-                    segments = [s.strip() for s in content.replace('，', '。').split('。') if s.strip()]
-                    
-                    for segment in segments:
-                        if not self.is_reading:
-                            break
-                            
-                        while self.is_paused:
-                            if not self.is_reading:
-                                break
-                            import time
-                            time.sleep(0.1)
-                        
-                        if not self.is_reading:
-                            break
-                            
-                        # 更新引擎属性
-                        self.engine.setProperty('rate', self.rate_scale.get())
-                        self.engine.setProperty('volume', self.volume_scale.get())
-                        
-                        self.engine.say(segment)
-                        self.engine.runAndWait()
-                    
-                    # 朗读完成后恢复按钮状态
-                    if self.is_reading:  # 只有在非手动停止的情况下才执行
-                        self.root.after(0, self.reset_read_buttons)
-                        
-                except Exception as e:
-                    self.root.after(0, lambda: messagebox.showerror('错误', f'朗读过程中发生错误: {str(e)}'))
-                    self.root.after(0, self.reset_read_buttons)
-            
-            # 在新线程中执行朗读
-            threading.Thread(target=read_thread, daemon=True).start()
-            
-        except Exception as e:
-            messagebox.showerror('错误', f'启动朗读失败: {str(e)}')
+        
+        # 启用控制按钮
+        self.read_btn.config(state='disabled')
+        self.pause_btn.config(state='normal')
+        self.stop_btn.config(state='normal')
+        
+        # 开始朗读，音色、语速、音量随命令一起交给朗读线程
+        self.is_reading = True
+        self.is_paused = False
+        self.reading_serial = self.speech.speak(segments, poem_id=selection[0], voice=self.voice_ids.get(self.voice_var.get()),
+                                                rate=int(self.rate_scale.get()),
+                                                volume=self.volume_scale.get())
+    
+    def prerender_poems(self):
+        """为当前列表中的诗词（例如某个朝代或收藏夹）预先合成朗读音频，存入缓存"""
+        if not self.speech or self.voice_ids is None:
+            messagebox.showinfo('提示', '朗读功能不可用')
+            return
+        if not PLAYS_FILES:
+            messagebox.showinfo('提示', '当前系统不支持播放缓存的音频')
+            return
+        
+        ids = list(self.result_ids)
+        if not ids:
+            messagebox.showinfo('提示', '当前列表中没有诗词')
+            return
+        if not messagebox.askyesno('确认', f'确定为当前列表中的 {len(ids)} 首诗词预先合成朗读音频吗？\n'
+                                          '将使用当前的音色和语速，朗读时暂停合成。'):
+            return
+        
+        items = []
+        for poem_id in ids:
+            poem = self.store.get(poem_id)
+            content = poem.get('content', []) if poem else []
+            if not isinstance(content, list):
+                content = [str(content)]
+            items.append((poem_id, split_segments(content)))
+        total = sum(len(segments) for _, segments in items)
+        
+        def finished(completed):
+            progress.close()
+            if completed:
+                messagebox.showinfo('成功', f'已合成 {len(ids)} 首诗词的朗读音频')
+        
+        progress = ProgressDialog(self.root, '预先合成', '正在合成朗读音频', maximum=total,
+                                  on_cancel=self.speech.cancel_prerender)
+        self.speech.prerender(items, voice=self.voice_ids.get(self.voice_var.get()),
+                              rate=int(self.rate_scale.get()), volume=self.volume_scale.get(),
+                              on_progress=progress.update, on_done=finished)
+    
+    def reading_finished(self, serial):
+        # 停止后又开始的朗读不受之前朗读结束的影响
+        if serial == self.reading_serial:
             self.reset_read_buttons()
     
+    def on_voice_selected(self, event):
+        if self.speech and self.voice_ids:
+            voice_id = self.voice_ids.get(self.voice_var.get())
+            if voice_id:
+                self.speech.set_voice(voice_id)
+    
+    def on_rate_changed(self, value):
+        if self.speech and self.is_reading:
+            self.speech.set_rate(int(float(value)))
+    
+    def on_volume_changed(self, value):
+        if self.speech and self.is_reading:
+            self.speech.set_volume(float(value))
+    
     def pause_resume_reading(self):
-        if not self.engine or not self.is_reading:
+        if not self.speech or not self.is_reading:
             return
             
         if self.is_paused:
             # 继续朗读
             self.is_paused = False
+            self.speech.resume()
             self.pause_btn.config(text='暂停')
         else:
             # 暂停朗读
             self.is_paused = True
+            self.speech.pause()
             self.pause_btn.config(text='继续')
     
     def stop_reading(self):
-        if not self.engine:
+        if not self.speech:
             return
             
-        # 停止朗读
-        self.is_reading = False
-        self.is_paused = False
-        self.engine.stop()
+        # 停止朗读，引擎保留给下次朗读
+        self.speech.stop()
+        self.reading_serial = None
         self.reset_read_buttons()
-        
-        # 重新初始化引擎，以便下次朗读
-        self.engine = None
     
     def reset_read_buttons(self):
         # 重置按钮状态
@@ -763,18 +1149,22 @@ class PoemApp:
         # 弹出确认对话框
         if messagebox.askyesno('确认退出', '确定要退出程序吗？'):
             try:
-                # 停止朗读并清理引擎资源
-                if self.engine:
-                    self.stop_reading()
-                    self.engine = None
+                # 停止朗读并结束朗读线程
+                if self.speech:
+                    self.speech.close()
                 
                 # 确保所有子窗口都被关闭
                 for widget in self.root.winfo_children():
                     if isinstance(widget, tk.Toplevel):
                         widget.destroy()
                 
+                # 等待后台写入完成后关闭诗词日志，保存拼音缓存
+                self.tasks.shutdown()
+                self.storage.close()
+                self.favorites.close()
+                close_cache()
+                
                 # 直接退出程序
-                import sys
                 sys.exit(0)
                 
             except Exception as e:
@@ -875,13 +1265,23 @@ class PoemApp:
                 messagebox.showerror('错误', '标题、作者、朝代和内容为必填项！')
                 return
             
-            # 生成拼音
-            title_pinyin = ' '.join([' '.join(p) for p in pinyin(title, style=Style.TONE)])
-            content_pinyin = []
-            for line in content:
-                if line.strip():  # 跳过空行
-                    py = pinyin(line, style=Style.TONE)
-                    content_pinyin.append(' '.join([' '.join(p) for p in py]))
+            # 已有同标题同作者、内容也相同的诗词时不再注音和写入
+            existing_id = self.store.find_id(title, author)
+            if existing_id is not None:
+                text = {'title': title, 'author': author, 'dynasty': dynasty, 'content': content,
+                        'translation': translation, 'note': note, 'appreciation': appreciation,
+                        'author_intro': author_intro}
+                if same_content(self.store.content_hash(existing_id), content_hash(text),
+                                compare_pinyin=False):
+                    dialog.destroy()
+                    messagebox.showinfo('提示', '诗词库中已有这首诗词，内容相同，无需添加')
+                    return
+            
+            # 生成拼音（跳过空行）
+            lines = [line for line in content if line.strip()]
+            pinyins = annotate_lines([title] + lines)
+            title_pinyin = pinyins[title]
+            content_pinyin = [pinyins[line] for line in lines]
             
             # 创建新诗词
             new_poem = {
@@ -894,15 +1294,16 @@ class PoemApp:
                 'appreciation': appreciation,
                 'author_intro': author_intro,
                 'title_pinyin': title_pinyin,
-                'content_pinyin': content_pinyin
+                'content_pinyin': content_pinyin,
+                'updated_at': datetime.now().isoformat(timespec='seconds')
             }
             
             # 添加到数据中
-            self.poems_data.append(new_poem)
+            self.store.add(new_poem)
+            self.index_poem(new_poem)
             
             # 保存到文件
-            with open('poems.json', 'w', encoding='utf-8') as f:
-                json.dump({'poems': self.poems_data}, f, ensure_ascii=False, indent=4)
+            self.commit_poems(puts=[new_poem])
             
             # 刷新显示
             self.search_poems()
@@ -919,230 +1320,261 @@ class PoemApp:
         cancel_btn.pack(side=tk.LEFT, padx=10)
 
     def import_poems(self):
-        try:
-            # 打开文件选择对话框
-            file_path = filedialog.askopenfilename(
-                title='选择要导入的文件',
-                filetypes=[
-                    ('Excel files', '*.xlsx'),
-                    ('JSON files', '*.json'),
-                    ('CSV files', '*.csv')
-                ]
-            )
+        # 打开文件选择对话框
+        file_path = filedialog.askopenfilename(
+            title='选择要导入的文件',
+            filetypes=[
+                ('Excel files', '*.xlsx'),
+                ('JSON files', '*.json'),
+                ('CSV files', '*.csv')
+            ]
+        )
+        
+        if not file_path:
+            return
             
-            if not file_path:
+        if file_path.lower().endswith('.xlsx'):
+            if not available('openpyxl'):
+                messagebox.showerror('错误', '未找到openpyxl模块，无法导入Excel文件。\n请使用以下命令安装：\npip install openpyxl')
                 return
-                
-            if file_path.lower().endswith('.json'):
-                # 读取JSON文件
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    imported_data = json.load(f)
-                    
-                if 'poems' not in imported_data:
-                    raise ValueError('无效的JSON格式')
-                    
-                new_poems = imported_data['poems']
-                
-            elif file_path.lower().endswith('.xlsx'):
-                try:
-                    import openpyxl
-                except ImportError:
-                    messagebox.showerror('错误', '未找到openpyxl模块，无法导入Excel文件。\n请使用以下命令安装：\npip install openpyxl')
-                    return
-                    
-                # 读取Excel文件
-                wb = openpyxl.load_workbook(file_path)
-                ws = wb.active
-                
-                # 获取表头
-                headers = [cell.value for cell in ws[1]]
-                
-                # 读取数据
-                new_poems = []
-                for row in ws.iter_rows(min_row=2):
-                    poem = {}
-                    for header, cell in zip(headers, row):
-                        if header in ['content', 'content_pinyin']:
-                            # 将字符串转换为列表
-                            value = cell.value or ''
-                            poem[header] = value.split('|') if value else []
-                        else:
-                            poem[header] = cell.value or ''
-                    if poem.get('title'):  # 只添加有标题的诗词
-                        new_poems.append(poem)
-                    
-            else:  # CSV文件
-                new_poems = []
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        reader = csv.DictReader(f)
-                        for row in reader:
-                            # 处理content和content_pinyin字段，将字符串转换为列表
-                            content = row.get('content', '').split('|')
-                            content_pinyin = row.get('content_pinyin', '').split('|')
-                            
-                            poem = {
-                                'title': row.get('title', ''),
-                                'author': row.get('author', ''),
-                                'dynasty': row.get('dynasty', ''),
-                                'content': content,
-                                'content_pinyin': content_pinyin,
-                                'translation': row.get('translation', ''),
-                                'note': row.get('note', ''),
-                                'appreciation': row.get('appreciation', ''),
-                                'author_intro': row.get('author_intro', ''),
-                                'title_pinyin': row.get('title_pinyin', '')
-                            }
-                            if poem['title']:  # 只添加有标题的诗词
-                                new_poems.append(poem)
-                except Exception as e:
-                    messagebox.showerror('错误', f'导入CSV文件时发生错误：{str(e)}')
-                    return
-            
-            # 为没有拼音的诗词添加拼音
-            for poem in new_poems:
-                if not poem.get('title_pinyin'):
-                    title_py = pinyin(poem['title'], style=Style.TONE)
-                    poem['title_pinyin'] = ' '.join([' '.join(p) for p in title_py])
-                
-                if not any(poem.get('content_pinyin', [])):
-                    content_pinyin = []
-                    for line in poem.get('content', []):
-                        line_py = pinyin(line, style=Style.TONE)
-                        content_pinyin.append(' '.join([' '.join(p) for p in line_py]))
-                    poem['content_pinyin'] = content_pinyin
-                        
-            # 处理重复诗词
-            duplicate_count = 0
-            skip_count = 0
-            for new_poem in new_poems[:]:  # 使用切片创建副本以便在循环中修改
-                for existing_poem in self.poems_data:
-                    if (new_poem['title'] == existing_poem['title'] and 
-                        new_poem['author'] == existing_poem['author']):
-                        # 找到重复诗词
-                        response = messagebox.askyesnocancel(
-                            '发现重复诗词',
-                            f'发现重复诗词：\n标题：{new_poem["title"]}\n作者：{new_poem["author"]}\n\n'
-                            f'是否覆盖已有诗词？\n'
-                            f'是 - 覆盖\n否 - 跳过\n取消 - 停止导入'
-                        )
-                        
-                        if response is None:  # 取消导入
-                            messagebox.showinfo('提示', 
-                                f'导入已取消。\n成功导入：{len(new_poems) - len(new_poems[new_poems.index(new_poem):])}首\n'
-                                f'覆盖：{duplicate_count}首\n跳过：{skip_count}首')
-                            return
-                        elif response:  # 覆盖
-                            existing_poem.update(new_poem)
-                            new_poems.remove(new_poem)
-                            duplicate_count += 1
-                            break
-                        else:  # 跳过
-                            new_poems.remove(new_poem)
-                            skip_count += 1
-                            break
-            
-            # 添加非重复诗词
-            self.poems_data.extend(new_poems)
-            
-            # 保存到文件
-            with open('poems.json', 'w', encoding='utf-8') as f:
-                json.dump({'poems': self.poems_data}, f, ensure_ascii=False, indent=4)
-                
-            # 刷新显示
+        
+        # 没有修改时间的诗词以文件的修改时间为准
+        file_time = datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat(timespec='seconds')
+        plan = ImportPlan(self.store, default_time=file_time)
+        
+        def scan(token):
+            # 第一遍：在后台逐行读取文件（不把整个文件读入内存），按 (标题, 作者) 与诗词库比对分类
+            store = self.open_reader()
+            total, poems = open_poem_file(file_path)
+            try:
+                processed = 0
+                for batch in batched(poems, IMPORT_BATCH_SIZE):
+                    token.check()
+                    plan.classify(batch, store)
+                    processed += len(batch)
+                    token.progress(processed, total)
+            finally:
+                poems.close()
+                self.close_reader(store)
+            return plan
+        
+        progress = ProgressDialog(self.root, '导入诗词', '正在读取诗词...')
+        token = self.tasks.submit(scan, on_progress=progress.update,
+                                  on_done=lambda plan: self.confirm_import(file_path, plan, progress),
+                                  on_error=lambda error: self.import_failed(error, progress))
+        progress.on_cancel = token.cancel
+
+    def open_reader(self):
+        """后台任务读取诗词库用的对象，须在后台线程中调用
+
+        SQLite 的连接只能在创建它的线程中使用，后台任务另开一个只读连接；
+        JSON 诗词库的读取有锁保护，直接共用。用完后交给 close_reader。
+        """
+        return self.store.reader() if self.use_sqlite else self.store
+
+    def close_reader(self, store):
+        if store is not self.store:
+            store.close()
+
+    def import_failed(self, error, progress, plan=None):
+        progress.close()
+        # 写入阶段按批提交，取消或出错前写入的诗词已经保存
+        written = ''
+        if plan is not None and (plan.added or plan.updated):
+            written = f'\n已导入：{plan.added}首，已覆盖：{plan.updated}首'
+        if isinstance(error, TaskCancelled):
+            messagebox.showinfo('提示', '导入已取消' + written)
+        else:
+            messagebox.showerror('错误', f'导入失败：{str(error)}' + written)
+
+    def confirm_import(self, file_path, plan, progress):
+        """一次询问：显示分类结果，选择冲突的统一处理策略，然后写入"""
+        progress.close()
+        if not plan.new and not plan.changed:
+            messagebox.showinfo('提示', f'没有需要导入的诗词。\n与已有诗词相同：{plan.identical}首')
+            return
+        policy = self.ask_import_policy(plan)
+        if policy is None:
+            return
+        self.apply_import(file_path, plan, policy)
+
+    def ask_import_policy(self, plan):
+        """显示导入计划的汇总，返回选定的冲突处理策略，取消时返回 None"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title('导入诗词')
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+        
+        summary = (f'新增：{len(plan.new)}首\n'
+                   f'与已有诗词相同（跳过）：{plan.identical}首\n'
+                   f'与已有诗词不同：{len(plan.changed)}首')
+        if plan.repeated:
+            summary += f'\n文件中重复出现（以最后一次为准）：{plan.repeated}首'
+        ttk.Label(dialog, text=summary, justify=tk.LEFT).pack(anchor=tk.W, padx=20, pady=(15, 10))
+        
+        policy = tk.StringVar(value=OVERWRITE)
+        if plan.changed:
+            ttk.Label(dialog, text='对于与已有诗词不同的诗词：').pack(anchor=tk.W, padx=20)
+            for value, text in POLICIES:
+                ttk.Radiobutton(dialog, text=text, variable=policy, value=value).pack(anchor=tk.W, padx=30)
+        
+        result = []
+        
+        def confirm():
+            result.append(policy.get())
+            dialog.destroy()
+        
+        button_frame = ttk.Frame(dialog)
+        button_frame.pack(pady=15)
+        ttk.Button(button_frame, text='导入', command=confirm).pack(side=tk.LEFT, padx=10)
+        ttk.Button(button_frame, text='取消', command=dialog.destroy).pack(side=tk.LEFT, padx=10)
+        
+        dialog.grab_set()
+        self.root.wait_window(dialog)
+        return result[0] if result else None
+
+    def apply_import(self, file_path, plan, policy):
+        """第二遍：在后台重新逐批读取文件，取出要写入的诗词并生成拼音，交给界面线程逐批写入
+
+        计划中只有序号，不保存诗词，写入时内存只与批大小有关。后台最多领先
+        IMPORT_PENDING_BATCHES 批，写入跟不上时等待。每批单独提交，取消或
+        出错时已写入的批次保留。
+        """
+        slots = threading.Semaphore(IMPORT_PENDING_BATCHES)
+        
+        def prepare(token):
+            store = self.open_reader()
+            total, poems = open_poem_file(file_path)
+            pool = pinyin_pool()
+            try:
+                processed = 0
+                for batch in batched(poems, IMPORT_BATCH_SIZE):
+                    token.check()
+                    items, stale = plan.select(batch, processed, policy, store)
+                    processed += len(batch)
+                    if items or stale:
+                        # 只为需要写入、又缺少拼音的诗词生成拼音（去重后并行生成）
+                        annotate_poems([poem for _, poem in items], pool=pool)
+                        while not slots.acquire(timeout=0.1):
+                            token.check()
+                        self.tasks.call_soon(self.write_import_batch, plan, items, stale, slots, token)
+                    token.progress(processed, total or plan.rows)
+            finally:
+                pool.shutdown()
+                poems.close()
+                self.close_reader(store)
+            return plan
+        
+        def finished(plan):
+            if plan.error is not None:
+                # 最后一批写入出错时后台任务已经结束
+                failed(plan.error)
+                return
+            progress.close()
             self.search_poems()
-            messagebox.showinfo('成功', 
-                f'导入完成！\n成功导入：{len(new_poems)}首\n覆盖：{duplicate_count}首\n跳过：{skip_count}首')
-            
+            messagebox.showinfo('成功',
+                f'导入完成！\n成功导入：{plan.added}首\n覆盖：{plan.updated}首\n'
+                f'跳过：{len(plan.changed) - plan.updated}首\n与已有诗词相同：{plan.identical}首' +
+                (f'\n导入期间已被修改或删除（未写入）：{plan.stale}首' if plan.stale else ''))
+        
+        def failed(error):
+            if plan.added or plan.updated:
+                self.search_poems()
+            # 写入出错时后台任务被取消，报告写入的错误
+            self.import_failed(plan.error or error, progress, plan)
+        
+        progress = ProgressDialog(self.root, '导入诗词', '正在写入诗词...', maximum=plan.rows)
+        token = self.tasks.submit(prepare, on_progress=progress.update,
+                                  on_done=finished, on_error=failed)
+        progress.on_cancel = token.cancel
+
+    def write_import_batch(self, plan, items, stale, slots, token):
+        """在界面线程中写入一批导入的诗词，作为一次提交写入日志
+
+        后台准备这一批时用户仍可编辑或删除诗词，写入前再确认一次，有变化的跳过。
+        写入出错时记下错误并取消后台任务，不再写入后面的批次。
+        """
+        written = []
+        try:
+            if plan.error is not None:
+                return
+            plan.stale += stale
+            try:
+                for poem_id, poem in items:
+                    if not plan.current(poem_id, (poem.get('title', ''), poem.get('author', ''))):
+                        plan.stale += 1
+                        continue
+                    if poem_id is None:
+                        self.store.add(poem)
+                        plan.added += 1
+                    else:
+                        # 覆盖时保留已有诗词的 id
+                        poem = self.store.update(poem_id, poem)
+                        self.detail_view.forget(poem_id)
+                        plan.updated += 1
+                    self.index_poem(poem)
+                    written.append(poem)
+            finally:
+                # 出错前已改入诗词库的诗词也要保存
+                if written:
+                    self.commit_poems(puts=written)
         except Exception as e:
-            messagebox.showerror('错误', f'导入失败：{str(e)}')
+            plan.error = e
+            token.cancel()
+        finally:
+            slots.release()
 
     def export_poems(self):
-        try:
-            # 打开文件保存对话框
-            file_path = filedialog.asksaveasfilename(
-                title='选择导出位置',
-                defaultextension='.xlsx',  # 修改默认扩展名为xlsx
-                filetypes=[
-                    ('Excel files', '*.xlsx'),
-                    ('JSON files', '*.json'),
-                    ('CSV files', '*.csv')
-                ]
-            )
+        # 打开文件保存对话框
+        file_path = filedialog.asksaveasfilename(
+            title='选择导出位置',
+            defaultextension='.xlsx',  # 修改默认扩展名为xlsx
+            filetypes=[
+                ('Excel files', '*.xlsx'),
+                ('JSON files', '*.json'),
+                ('CSV files', '*.csv')
+            ]
+        )
+        
+        if not file_path:
+            return
             
-            if not file_path:
+        if file_path.lower().endswith('.json'):
+            # 保存为JSON文件
+            writer = write_json_poems
+            
+        elif file_path.lower().endswith('.xlsx'):
+            if not available('openpyxl'):
+                messagebox.showerror('错误', '未找到openpyxl模块，无法导出为Excel文件。\n请使用以下命令安装：\npip install openpyxl')
                 return
-                
-            if file_path.lower().endswith('.json'):
-                # 保存为JSON文件
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump({'poems': self.poems_data}, f, ensure_ascii=False, indent=4)
-                
-            elif file_path.lower().endswith('.xlsx'):
-                try:
-                    import openpyxl
-                except ImportError:
-                    messagebox.showerror('错误', '未找到openpyxl模块，无法导出为Excel文件。\n请使用以下命令安装：\npip install openpyxl')
-                    return
-                    
-                # 创建工作簿和工作表
-                wb = openpyxl.Workbook()
-                ws = wb.active
-                
-                # 写入表头
-                headers = ['title', 'author', 'dynasty', 'content', 'content_pinyin',
-                          'translation', 'note', 'appreciation', 'author_intro', 'title_pinyin']
-                ws.append(headers)
-                
-                # 写入数据
-                for poem in self.poems_data:
-                    row = []
-                    for header in headers:
-                        value = poem.get(header, '')
-                        if header in ['content', 'content_pinyin']:
-                            # 将列表转换为字符串
-                            value = '|'.join(value) if isinstance(value, list) else value
-                        row.append(value)
-                    ws.append(row)
-                
-                # 调整列宽
-                for column in ws.columns:
-                    max_length = 0
-                    column = list(column)
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)  # 限制最大宽度
-                    ws.column_dimensions[column[0].column_letter].width = adjusted_width
-                
-                # 保存Excel文件
-                wb.save(file_path)
-                
-            else:  # CSV文件
-                with open(file_path, 'w', encoding='utf-8', newline='') as f:
-                    # 定义CSV文件的字段
-                    fieldnames = ['title', 'author', 'dynasty', 'content', 'content_pinyin',
-                                'translation', 'note', 'appreciation', 'author_intro', 'title_pinyin']
-                    writer = csv.DictWriter(f, fieldnames=fieldnames)
-                    writer.writeheader()
-                    
-                    # 写入诗词数据
-                    for poem in self.poems_data:
-                        row = poem.copy()
-                        # 将列表转换为字符串
-                        if isinstance(row.get('content'), list):
-                            row['content'] = '|'.join(row['content'])
-                        if isinstance(row.get('content_pinyin'), list):
-                            row['content_pinyin'] = '|'.join(row['content_pinyin'])
-                        writer.writerow(row)
-                    
-            messagebox.showinfo('成功', '导出成功！')
+            # 只写模式逐行写出
+            writer = write_excel_poems
             
-        except Exception as e:
-            messagebox.showerror('错误', f'导出失败：{str(e)}')
+        else:  # CSV文件
+            writer = write_csv_poems
+        
+        def export(token):
+            # 在后台逐首取出诗词写出文件
+            store = self.open_reader()
+            try:
+                return writer(file_path, iter(store), token.progress)
+            finally:
+                self.close_reader(store)
+        
+        def finished(completed):
+            progress.close()
+            if completed is False:
+                messagebox.showinfo('提示', '导出已取消')
+            else:
+                messagebox.showinfo('成功', '导出成功！')
+        
+        def failed(error):
+            progress.close()
+            messagebox.showerror('错误', f'导出失败：{str(error)}')
+        
+        progress = ProgressDialog(self.root, '导出诗词', '正在导出诗词...', maximum=len(self.store))
+        token = self.tasks.submit(export, on_progress=progress.update, on_done=finished, on_error=failed)
+        progress.on_cancel = token.cancel
 
     def show_help_dialog(self):
         dialog = tk.Toplevel(self.root)
@@ -1185,125 +1617,152 @@ class PoemApp:
         dialog.grab_set()
 
     def load_favorites(self):
-        try:
-            with open('favorites.json', 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return []
-        except Exception as e:
-            print(f"加载收藏列表失败: {str(e)}")
-            return []
-
-    def save_favorites(self):
-        try:
-            with open('favorites.json', 'w', encoding='utf-8') as f:
-                json.dump(self.favorites, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            messagebox.showerror('错误', f'保存收藏列表失败: {str(e)}')
+        """读取收藏的诗词 id 集合；旧版 "标题_作者" 格式的收藏在这里换算成 id"""
+        if self.use_sqlite:
+            return SQLiteFavorites(self.store)
+        # 日志的追加和 fsync 与诗词日志一样交给写入线程
+        def submit_write(func, *args):
+            self.tasks.submit_write(func, *args, on_error=self.write_failed)
+        
+        return FavoriteFile('favorites.json', 'favorites.log', submit_write).load(self.store.summaries())
 
     def toggle_favorite(self):
-        selection = self.poem_tree.selection()
-        if not selection:
+        poem = self.get_selected_poem()
+        if not poem:
             messagebox.showinfo('提示', '请先选择一首诗词')
             return
+        title = poem['title']
         
-        item = selection[0]
-        values = self.poem_tree.item(item)['values']
-        title = values[0]
-        author = values[1]
-        
-        # 创建唯一标识
-        poem_id = f"{title}_{author}"
+        # 收藏以诗词 id 为标识，修改标题或作者后仍然有效
+        poem_id = poem['id']
         
-        if poem_id in self.favorites:
-            # 取消收藏
-            self.favorites.remove(poem_id)
-            messagebox.showinfo('提示', f'已取消收藏《{title}》')
-            self.favorite_btn.config(text='收藏')
-        else:
-            # 添加收藏
-            self.favorites.append(poem_id)
-            messagebox.showinfo('提示', f'已收藏《{title}》')
-            self.favorite_btn.config(text='取消收藏')
-        
-        self.save_favorites()
+        try:
+            if poem_id in self.favorites:
+                # 取消收藏
+                self.favorites.discard(poem_id)
+                messagebox.showinfo('提示', f'已取消收藏《{title}》')
+                self.favorite_btn.config(text='收藏')
+            else:
+                # 添加收藏
+                self.favorites.add(poem_id)
+                messagebox.showinfo('提示', f'已收藏《{title}》')
+                self.favorite_btn.config(text='取消收藏')
+        except Exception as e:
+            messagebox.showerror('错误', f'保存收藏列表失败: {str(e)}')
 
     def show_favorites(self):
         """显示收藏的诗词"""
-        # 清空现有列表
-        for item in self.poem_tree.get_children():
-            self.poem_tree.delete(item)
-        
         # 显示收藏的诗词
-        favorite_poems = []
-        for poem in self.poems_data:
-            poem_id = f"{poem['title']}_{poem['author']}"
-            if poem_id in self.favorites:
-                favorite_poems.append(poem)
-        
-        # 按标题排序
-        favorite_poems.sort(key=lambda x: x['title'])
+        if self.use_sqlite:
+            # 收藏表与诗词表连接，按标题排序
+            ids = [row[0] for row in self.store.favorite_rows()]
+        else:
+            # 直接按收藏的 id 取摘要，不扫描整个诗词库
+            favorite_poems = [self.store.summary(poem_id) for poem_id in self.favorites]
+            favorite_poems = [poem for poem in favorite_poems if poem]
+            
+            # 按标题排序
+            favorite_poems.sort(key=lambda x: x['title'])
+            ids = [poem['id'] for poem in favorite_poems]
         
         # 显示收藏的诗词
-        for poem in favorite_poems:
-            self.poem_tree.insert('', 'end', values=(poem['title'], poem['author'], poem['dynasty']))
+        self.show_results(ids)
         
         # 仅在收藏夹为空时提示
-        if not favorite_poems:
+        if not ids:
             messagebox.showinfo('提示', '收藏夹为空')
 
+    def migrate_to_sqlite(self):
+        """把当前诗词和收藏一次性迁移到 SQLite 数据库，重新启动后生效"""
+        if self.use_sqlite:
+            messagebox.showinfo('提示', '当前已在使用SQLite数据库')
+            return
+        if not messagebox.askyesno('确认迁移', '将把全部诗词和收藏迁移到 poems.db，\n重新启动程序后改用SQLite数据库。是否继续？'):
+            return
+        try:
+            if os.path.exists('poems.db.tmp'):
+                os.remove('poems.db.tmp')
+            migrate_from_json(self.store, self.favorites, 'poems.db.tmp', pinyin_sort_key)
+            os.replace('poems.db.tmp', 'poems.db')
+            messagebox.showinfo('成功', f'已迁移{len(self.store)}首诗词，请重新启动程序。')
+        except Exception as e:
+            messagebox.showerror('错误', f'迁移失败：{str(e)}')
+
     def show_all_poems(self):
         """显示所有诗词"""
-        # 清空搜索条件
+        # 清空搜索条件和分类选择
         self.title_search.delete(0, tk.END)
         self.author_search.delete(0, tk.END)
         self.dynasty_search.delete(0, tk.END)
+        self.facet_dynasty = self.facet_author = None
+        self.refresh_facets()
         
         # 显示所有诗词
         self.search_poems()
 
     def batch_delete_poems(self):
-        # 获取选中的诗词
-        selected_items = self.poem_tree.selection()
+        # 获取选中的诗词（包括滚出窗口的行）
+        selected_items = self.poem_list.selection_ids()
         if not selected_items:
             messagebox.showinfo('提示', '请先选择要删除的诗词')
             return
             
-        # 获取选中诗词的标题和作者
+        # 获取选中诗词的标题和作者，选中很多时只列出前几首
         poems_to_delete = []
-        for item in selected_items:
-            values = self.poem_tree.item(item)['values']
+        for item in selected_items[:DELETE_PREVIEW_ROWS]:
+            values = self.poem_row(item)
             poems_to_delete.append(f'《{values[0]}》({values[1]})')
+        if len(selected_items) > DELETE_PREVIEW_ROWS:
+            poems_to_delete.append(f'……等{len(selected_items)}首')
             
         # 显示确认对话框
         confirm = messagebox.askyesno('确认删除', 
-            f'确定要删除以下{len(poems_to_delete)}首诗词吗？\n\n' + 
+            f'确定要删除以下{len(selected_items)}首诗词吗？\n\n' + 
             '\n'.join(poems_to_delete))
             
         if confirm:
-            # 执行删除操作
-            for item in selected_items:
-                values = self.poem_tree.item(item)['values']
-                title = values[0]
-                author = values[1]
-                
-                # 从数据中删除
-                self.poems_data = [poem for poem in self.poems_data 
-                    if not (poem['title'] == title and poem['author'] == author)]
-                
-            # 保存到文件
-            with open('poems.json', 'w', encoding='utf-8') as f:
-                json.dump({'poems': self.poems_data}, f, ensure_ascii=False, indent=4)
-                
-            # 刷新显示
-            self.search_poems()
-            messagebox.showinfo('成功', f'已删除{len(selected_items)}首诗词')
+            # 执行删除操作，列表项的 iid 就是诗词 id
+            deleted_ids = self.delete_poems(selected_items)
+            messagebox.showinfo('成功', f'已删除{len(deleted_ids)}首诗词')
         else:
             # 取消选中状态
-            self.poem_tree.selection_remove(*selected_items)
+            self.poem_list.clear_selection()
+
+    def delete_poems(self, poem_ids):
+        """一次删除一批诗词，返回实际删除的 id
+
+        诗词库和各索引都只处理这一批，只提交一次；列表中只移除这些行，
+        其余行的顺序和排序保持不变。
+        """
+        if self.use_sqlite:
+            # 一条语句删除，逐行内容和收藏随外键级联删除
+            deleted_ids = [poem_id for poem_id in poem_ids if poem_id in self.store]
+            self.store.remove_many(deleted_ids)
+        else:
+            # 不读取诗词详情，缓存的排序结果只过滤，不重新排序
+            deleted_ids = [poem['id'] for poem in self.store.remove_many(poem_ids)]
+        self.unindex_poems(deleted_ids)
+        
+        # 删除的诗词同时移出收藏夹
+        self.favorites.discard_many(deleted_ids)
+            
+        # 保存到文件
+        self.commit_poems(deletes=deleted_ids)
+        
+        # 刷新显示
+        deleted = set(deleted_ids)
+        self.result_ids = [poem_id for poem_id in self.result_ids if poem_id not in deleted]
+        self.sorted_results = {column: [poem_id for poem_id in ids if poem_id not in deleted]
+                               for column, ids in self.sorted_results.items()}
+        self.poem_list.remove_ids(deleted)
+        return deleted_ids
 
     def sort_tree(self, col):
         """按列排序树形视图"""
+        if self.live_search.active:
+            # 先完成正在分批显示的搜索，再对完整的结果集排序
+            self.search_poems()
+        
         # 如果是同一列，更新点击次数和排序方向
         if self.sort_column == col:
             self.sort_count += 1
@@ -1312,7 +1771,7 @@ class PoemApp:
                 self.sort_reverse = False
                 self.sort_count = 0
                 # 恢复原始顺序
-                self.search_poems()  # 重新加载数据
+                self.poem_list.reorder(self.result_ids)
                 # 清除所有列标题的箭头
                 for col_name in ('title', 'author', 'dynasty'):
                     text = self.poem_tree.heading(col_name)['text'].rstrip('↑↓')
@@ -1326,24 +1785,8 @@ class PoemApp:
             self.sort_reverse = False
             self.sort_count = 1
         
-        # 获取所有项目
-        items = [(self.poem_tree.set(item, col), item) for item in self.poem_tree.get_children('')]
-        
-        # 使用拼音排序
-        def get_pinyin(text):
-            from pypinyin import pinyin, Style
-            if not text:
-                return ''
-            # 获取拼音，转换为小写用于排序
-            py_list = pinyin(text, style=Style.TONE3)
-            return ''.join(p[0].lower() for p in py_list)
-        
-        # 按拼音排序
-        items.sort(key=lambda x: get_pinyin(x[0]), reverse=self.sort_reverse)
-        
-        # 重新排列项目
-        for index, (val, item) in enumerate(items):
-            self.poem_tree.move(item, '', index)
+        # 对整个结果集排序，而不只是可见的行；升序结果缓存起来，逆序只需反转
+        self.poem_list.reorder(self.sorted_result_ids())
         
         # 更新列标题显示排序方向
         for col_name in ('title', 'author', 'dynasty'):
@@ -1355,168 +1798,9 @@ class PoemApp:
             self.poem_tree.heading(col_name, text=text)
 
 if __name__ == '__main__':
+    # 以 --startup-report 参数启动时打印启动各阶段的耗时
+    startup_timer = StartupTimer(enabled=REPORT_FLAG in sys.argv[1:])
+    startup_timer.mark('导入模块')
     root = tk.Tk()
-    app = PoemApp(root)
+    app = PoemApp(root, startup_timer)
     root.mainloop()
-
-    def batch_delete_poems(self):
-        # 获取选中的诗词
-        selected_items = self.poem_tree.selection()
-        if not selected_items:
-            messagebox.showinfo('提示', '请先选择要删除的诗词')
-            return
-            
-        # 获取选中诗词的标题和作者
-        poems_to_delete = []
-        for item in selected_items:
-            values = self.poem_tree.item(item)['values']
-            poems_to_delete.append(f'《{values[0]}》({values[1]})')
-            
-        # 显示确认对话框
-        confirm = messagebox.askyesno('确认删除', 
-            f'确定要删除以下{len(poems_to_delete)}首诗词吗？\n\n' + 
-            '\n'.join(poems_to_delete))
-            
-        if confirm:
-            # 执行删除操作
-            for item in selected_items:
-                values = self.poem_tree.item(item)['values']
-                title = values[0]
-                author = values[1]
-                
-                # 从数据中删除
-                self.poems_data = [poem for poem in self.poems_data 
-                    if not (poem['title'] == title and poem['author'] == author)]
-                
-            # 保存到文件
-            with open('poems.json', 'w', encoding='utf-8') as f:
-                json.dump({'poems': self.poems_data}, f, ensure_ascii=False, indent=4)
-                
-            # 刷新显示
-            self.search_poems()
-            messagebox.showinfo('成功', f'已删除{len(selected_items)}首诗词')
-        else:
-            # 取消选中状态
-            self.poem_tree.selection_remove(*selected_items)
-        # 设置列标题的样式和背景色
-        style = ttk.Style()
-        style.configure('Treeview.Heading', background='#E8E8E8', relief='flat', font=('SimSun', 10))
-        
-        # 设置列标题
-        self.poem_tree.heading('title', text='标题', command=lambda: self.sort_tree('title'))
-        self.poem_tree.heading('author', text='作者', command=lambda: self.sort_tree('author'))
-        self.poem_tree.heading('dynasty', text='朝代', command=lambda: self.sort_tree('dynasty'))
-        
-        # 修改排序状态记录
-        self.sort_column = None  # 当前排序的列
-        self.sort_reverse = False  # 是否逆序
-        self.sort_count = 0  # 添加点击次数记录
-        
-        # 配置left_frame的网格权重，使poem_tree能够自动扩展
-        self.left_frame.grid_columnconfigure(0, weight=1)
-        self.left_frame.grid_rowconfigure(1, weight=1)
-
-        # 设置列宽
-        self.poem_tree.column('title', width=150)
-        self.poem_tree.column('author', width=100)
-        self.poem_tree.column('dynasty', width=40)
-
-        # 绑定选择事件
-        self.poem_tree.bind('<<TreeviewSelect>>', self.show_poem_details)
-
-        # 添加滚动条
-        tree_scroll = ttk.Scrollbar(self.left_frame, orient=tk.VERTICAL, command=self.poem_tree.yview)
-        tree_scroll.grid(row=1, column=1, sticky=(tk.N, tk.S))
-        self.poem_tree.configure(yscrollcommand=tree_scroll.set)
-
-        # 创建右侧内容框架
-        self.content_frame = ttk.Frame(self.right_frame)
-        self.content_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        self.content_frame.grid_columnconfigure(0, weight=1)
-        self.content_frame.grid_rowconfigure(1, weight=2)  # 诗词显示框占2份
-        self.content_frame.grid_rowconfigure(2, weight=3)  # 注释内容显示框占3份
-
-        # 创建右侧顶部按钮框架
-        self.right_top_frame = ttk.Frame(self.content_frame)
-        self.right_top_frame.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 5))
-        self.right_top_frame.grid_columnconfigure(0, weight=1)
-
-        # 创建一个内部框架来容纳按钮，实现居中效果
-        button_container = ttk.Frame(self.right_top_frame)
-        button_container.grid(row=0, column=0)
-
-        # 添加编辑、保存、取消、关闭、导入导出按钮到按钮容器中
-        self.add_btn = ttk.Button(button_container, text='添加', command=self.add_poem)
-        self.add_btn.pack(side=tk.LEFT, padx=5)
-        self.favorite_btn = ttk.Button(button_container, text='收藏', command=self.toggle_favorite)
-        self.favorite_btn.pack(side=tk.LEFT, padx=5)
-        self.edit_btn = ttk.Button(button_container, text='编辑', command=self.edit_poem)
-        self.edit_btn.pack(side=tk.LEFT, padx=5)
-        self.save_btn = ttk.Button(button_container, text='保存', command=self.save_poem, state='disabled')
-        self.save_btn.pack(side=tk.LEFT, padx=5)
-        self.cancel_btn = ttk.Button(button_container, text='取消', command=self.cancel_edit, state='disabled')
-        self.cancel_btn.pack(side=tk.LEFT, padx=5)
-        self.import_btn = ttk.Button(button_container, text='导入', command=self.import_poems)
-        self.import_btn.pack(side=tk.LEFT, padx=5)
-        self.export_btn = ttk.Button(button_container, text='导出', command=self.export_poems)
-        self.export_btn.pack(side=tk.LEFT, padx=5)
-        self.close_btn = ttk.Button(button_container, text='退出', command=self.close_app)
-        self.close_btn.pack(side=tk.LEFT, padx=5)
-
-        # 修改诗词内容文本框的创建
-        self.poem_content = tk.Text(self.content_frame, wrap=tk.WORD, font=('SimSun', 14), 
-                                   relief=tk.SUNKEN, borderwidth=1)
-        self.poem_content.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(0, 2))
-        
-        # 添加滚动条
-        content_scroll = ttk.Scrollbar(self.content_frame, orient=tk.VERTICAL, command=self.poem_content.yview)
-        content_scroll.grid(row=1, column=1, sticky=(tk.N, tk.S))
-        self.poem_content.configure(yscrollcommand=content_scroll.set)
-        
-        # 创建朗读控制面板
-        self.read_control_frame = ttk.LabelFrame(self.content_frame, text='朗读控制', padding=5)
-        self.read_control_frame.grid(row=1, column=2, sticky=(tk.N, tk.S, tk.E), padx=5, pady=5)
-        
-        # 添加音色选择
-        ttk.Label(self.read_control_frame, text='音色:').pack(pady=(5,0))
-        self.voice_var = tk.StringVar()
-        self.voice_combo = ttk.Combobox(self.read_control_frame, textvariable=self.voice_var, state='readonly')
-        self.voice_combo.pack(fill=tk.X, pady=1)
-        
-        # 添加朗读按钮
-        self.read_btn = ttk.Button(self.read_control_frame, text='朗读', command=self.read_poem)
-        self.read_btn.pack(fill=tk.X, pady=1)
-        
-        # 添加暂停/继续按钮
-        self.pause_btn = ttk.Button(self.read_control_frame, text='暂停', command=self.pause_resume_reading, state='disabled')
-        self.pause_btn.pack(fill=tk.X, pady=1)
-        
-        # 添加停止按钮
-        self.stop_btn = ttk.Button(self.read_control_frame, text='停止', command=self.stop_reading, state='disabled')
-        self.stop_btn.pack(fill=tk.X, pady=1)
-        
-        # 添加语速控制
-        ttk.Label(self.read_control_frame, text='语速:').pack(pady=(10,0))
-        self.rate_scale = ttk.Scale(self.read_control_frame, from_=50, to=300, orient=tk.HORIZONTAL)
-        self.rate_scale.set(150)
-        self.rate_scale.pack(fill=tk.X, pady=1)
-        
-        # 添加音量控制
-        ttk.Label(self.read_control_frame, text='音量:').pack(pady=(10,0))
-        self.volume_scale = ttk.Scale(self.read_control_frame, from_=0, to=1, orient=tk.HORIZONTAL)
-        self.volume_scale.set(1.0)
-        self.volume_scale.pack(fill=tk.X, pady=1)
-        
-        # 添加退出按钮到朗读控制区域下方
-        self.close_btn = ttk.Button(self.read_control_frame, text='退出程序', command=self.close_app, width=8)
-        self.close_btn.pack(fill=tk.X, pady=(10,1))
-        
-        # 创建诗词详情的框架
-        self.detail_frame = ttk.Frame(self.content_frame)
-        self.detail_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=5)
-        self.detail_frame.grid_columnconfigure(0, weight=1)
-        self.detail_frame.grid_rowconfigure(0, weight=1)
-        
-        # 创建诗词详情的文本框和标签
-        info_frame = ttk.Frame(self.detail_frame)
-        info_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
\ No newline at end of file
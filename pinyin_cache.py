@@ -0,0 +1,227 @@
+"""持久化的拼音缓存
+
+把文字（单字、词语、诗句、标题、作者名）到拼音的转换结果保存在
+pinyin.cache 中，下次启动直接复用。每条记录分三种形式：带声调的拼音
+（'tone'，用于显示）、数字声调的排序键（'tone3'，用于排序）和拼音搜索用的
+全拼与首字母（'search'）。
+
+文件按键排序，打开时用 mmap 映射，查找为二分查找，不需要整体解析。
+本次会话新增的记录先放在内存中，关闭时与磁盘上的最新文件合并后重写。
+每条记录带有最近使用的会话编号，超过容量时淘汰最久未用的记录。
+"""
+import json
+import mmap
+import os
+from array import array
+
+MAGIC = b'PPYC'
+VERSION = 1
+
+# 默认最多保存的记录数
+DEFAULT_CAPACITY = 200000
+
+_SECTIONS = (('key_offsets', 'Q'), ('value_offsets', 'Q'), ('stamps', 'I'),
+             ('key_blob', None), ('value_blob', None))
+
+
+class _CacheFile:
+    """mmap 映射的只读缓存文件"""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise
+        if self.map[:4] != MAGIC:
+            self.close()
+            raise ValueError('无效的拼音缓存文件')
+        meta_len = int.from_bytes(self.map[4:8], 'little')
+        self.meta = json.loads(self.map[8:8 + meta_len].decode('utf-8'))
+        if self.meta.get('version') != VERSION:
+            self.close()
+            raise ValueError('拼音缓存文件版本不匹配')
+
+        self.view = memoryview(self.map)
+        for name, typecode in _SECTIONS:
+            start, end = self.meta['sections'][name]
+            section = self.view[start:end]
+            setattr(self, name, section.cast(typecode) if typecode else section)
+        self.count = len(self.stamps)
+        self.generation = self.meta['generation']
+
+    def close(self):
+        if hasattr(self, 'view'):
+            for name, _ in _SECTIONS:
+                getattr(self, name).release()
+            self.view.release()
+        self.map.close()
+        self.file.close()
+
+    def key_at(self, i):
+        return bytes(self.key_blob[self.key_offsets[i]:self.key_offsets[i + 1]]).decode('utf-8')
+
+    def value_at(self, i):
+        return bytes(self.value_blob[self.value_offsets[i]:self.value_offsets[i + 1]]).decode('utf-8')
+
+    def find(self, key):
+        """二分查找，返回记录序号，找不到返回 None"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self.key_at(lo) == key:
+            return lo
+        return None
+
+    def records(self):
+        """依次返回 (键, 值, 最近使用的会话编号)"""
+        for i in range(self.count):
+            yield self.key_at(i), self.value_at(i), self.stamps[i]
+
+
+def _open_file(path):
+    try:
+        return _CacheFile(path)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_file(path, records, generation):
+    """把 {键: (值, 会话编号)} 写成缓存文件，先写临时文件再替换"""
+    key_blob = bytearray()
+    value_blob = bytearray()
+    key_offsets = [0]
+    value_offsets = [0]
+    stamps = []
+    for key in sorted(records):
+        value, stamp = records[key]
+        key_blob += key.encode('utf-8')
+        value_blob += value.encode('utf-8')
+        key_offsets.append(len(key_blob))
+        value_offsets.append(len(value_blob))
+        stamps.append(stamp)
+
+    blobs = [('key_offsets', array('Q', key_offsets).tobytes()),
+             ('value_offsets', array('Q', value_offsets).tobytes()),
+             ('stamps', array('I', stamps).tobytes()),
+             ('key_blob', bytes(key_blob)), ('value_blob', bytes(value_blob))]
+
+    header = {'version': VERSION, 'generation': generation,
+              'sections': {name: [0, 0] for name, _ in blobs}}
+    # 先估算头部长度，再按 8 字节对齐排布各段
+    while True:
+        encoded = json.dumps(header).encode('utf-8')
+        offset = 8 + len(encoded)
+        sections = {}
+        for name, blob in blobs:
+            offset = (offset + 7) // 8 * 8
+            sections[name] = [offset, offset + len(blob)]
+            offset += len(blob)
+        if sections == header['sections']:
+            break
+        header['sections'] = sections
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(encoded).to_bytes(4, 'little'))
+        f.write(encoded)
+        for name, blob in blobs:
+            f.write(b'\0' * (sections[name][0] - f.tell()))
+            f.write(blob)
+    os.replace(tmp_path, path)
+
+
+class PinyinCache:
+    """拼音缓存，path 为 None 时只在内存中缓存"""
+
+    def __init__(self, path='pinyin.cache', capacity=DEFAULT_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.added = {}  # 本次会话新增的 键 -> 值
+        self.used = set()  # 本次会话用到的文件中的记录序号
+        self.disk = _open_file(path) if path else None
+        # 本次会话的编号，比文件中记录的都大
+        self.generation = (self.disk.generation if self.disk else 0) + 1
+
+    def get(self, style, text):
+        """返回缓存的拼音，没有时返回 None"""
+        key = f'{style}\t{text}'
+        value = self.added.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self.disk is not None:
+            i = self.disk.find(key)
+            if i is not None:
+                self.hits += 1
+                self.used.add(i)
+                return self.disk.value_at(i)
+        self.misses += 1
+        return None
+
+    def put(self, style, text, value):
+        self.added[f'{style}\t{text}'] = value
+
+    def lookup(self, style, text, compute):
+        """返回缓存的拼音，没有时调用 compute(text) 计算并缓存"""
+        value = self.get(style, text)
+        if value is None:
+            value = compute(text)
+            self.put(style, text, value)
+        return value
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': rate,
+                'entries': (self.disk.count if self.disk else 0) + len(self.added)}
+
+    def save(self):
+        """与磁盘上的最新文件合并后重写，超过容量时淘汰最久未用的记录"""
+        if not self.path or not (self.added or self.used):
+            return
+        records = {}
+        # 其他会话可能已经重写过文件，以最新的文件为准合并
+        latest = _open_file(self.path)
+        generation = self.generation
+        if latest is not None:
+            try:
+                for key, value, stamp in latest.records():
+                    records[key] = (value, stamp)
+                generation = max(generation, latest.generation)
+            finally:
+                latest.close()
+        if self.disk is not None:
+            for i in self.used:
+                records[self.disk.key_at(i)] = (self.disk.value_at(i), self.generation)
+        for key, value in self.added.items():
+            records[key] = (value, self.generation)
+
+        if len(records) > self.capacity:
+            keep = sorted(records, key=lambda key: records[key][1], reverse=True)[:self.capacity]
+            records = {key: records[key] for key in keep}
+
+        if self.disk is not None:
+            self.disk.close()
+        try:
+            _write_file(self.path, records, generation)
+        except OSError as e:
+            # 其他程序正占用缓存文件时放弃本次保存，不影响使用
+            print(f"保存拼音缓存失败: {str(e)}")
+        self.disk = _open_file(self.path)
+        self.added = {}
+        self.used = set()
+
+    def close(self):
+        self.save()
+        if self.disk is not None:
+            self.disk.close()
+            self.disk = None
@@ -0,0 +1,105 @@
+"""拼音搜索索引
+
+用户常用拼音或拼音首字母查找诗词，例如 "jingyesi" 或 "jys" 都能查到《静夜思》。
+标题和作者的无声调全拼和首字母都按前缀匹配。每个字段的键放在一个有序数组中，
+查询时二分查找前缀所在的区间，时间与诗词总数成对数关系。加入和删除只记下
+改动，下次查询前一次并入有序数组。
+
+全拼和首字母由 search_keys(文字) 给出（见 pinyin_pipeline.pinyin_search_keys），
+按 pypinyin 逐个音节的输出拼接。不能由排序键（如 "jing4ye4si1"）按声调数字
+切分音节：轻声没有数字，会与下一个音节连在一起，"de hao3" 的首字母成了 "d"。
+"""
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from itertools import compress
+
+FIELDS = ('title', 'author')
+
+
+def is_pinyin_query(text):
+    """只由字母和空格组成的查询按拼音查找"""
+    text = text.replace(' ', '')
+    return text.isascii() and text.isalpha()
+
+
+def normalize_query(text):
+    return text.replace(' ', '').lower().replace('ü', 'v')
+
+
+class PinyinIndex:
+    """标题和作者的拼音前缀索引"""
+
+    def __init__(self, search_keys):
+        self.search_keys = search_keys  # 文字 -> (无声调全拼, 首字母)
+        self.keys = {field: [] for field in FIELDS}  # 字段 -> 有序的键
+        self.ids = {field: array('q') for field in FIELDS}  # 与键对应的诗词 id
+        self.entries = {}  # 诗词 id -> {字段: (全拼, 首字母)}
+        self.changed = set()  # 加入、修改或删除后尚未并入有序数组的诗词 id
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def build(cls, rows, search_keys):
+        """由 (id, 标题, 作者) 序列一次性建立索引"""
+        index = cls(search_keys)
+        pairs = {field: [] for field in FIELDS}
+        for row in rows:
+            poem_id = row[0]
+            entry = {field: search_keys(text or '') for field, text in zip(FIELDS, row[1:])}
+            index.entries[poem_id] = entry
+            for field, keys in entry.items():
+                pairs[field].extend((key, poem_id) for key in set(keys) if key)
+        for field in FIELDS:
+            pairs[field].sort()
+            index.keys[field] = [key for key, _ in pairs[field]]
+            index.ids[field] = array('q', (poem_id for _, poem_id in pairs[field]))
+        return index
+
+    def add(self, poem_id, title, author):
+        """加入或更新一首诗词
+
+        只记下改动，有序数组在下次查询时一次合并（见 _merge），连续加入
+        一批诗词（例如导入）时不必每首都在数组中间插入。
+        """
+        self.entries[poem_id] = {field: self.search_keys(text or '')
+                                 for field, text in zip(FIELDS, (title, author))}
+        self.changed.add(poem_id)
+
+    def remove(self, poem_id):
+        self.remove_many([poem_id])
+
+    def remove_many(self, poem_ids):
+        """删除一批诗词，同样在下次查询时一次合并"""
+        for poem_id in poem_ids:
+            if self.entries.pop(poem_id, None) is not None:
+                self.changed.add(poem_id)
+
+    def _merge(self):
+        """把积累的改动并入有序数组：每个字段过滤一遍旧记录，再与排好序的新键归并"""
+        if not self.changed:
+            return
+        for field in FIELDS:
+            keep = [poem_id not in self.changed for poem_id in self.ids[field]]
+            old = zip(compress(self.keys[field], keep), compress(self.ids[field], keep))
+            new = sorted((key, poem_id) for poem_id in self.changed if poem_id in self.entries
+                         for key in set(self.entries[poem_id][field]) if key)
+            pairs = list(merge(old, new))
+            self.keys[field] = [key for key, _ in pairs]
+            self.ids[field] = array('q', (poem_id for _, poem_id in pairs))
+        self.changed = set()
+
+    def search(self, field, query):
+        """全拼或首字母以 query 开头的诗词 id 集合"""
+        self._merge()
+        query = normalize_query(query)
+        keys = self.keys[field]
+        lo = bisect_left(keys, query)
+        hi = bisect_left(keys, query + '\uffff')
+        return set(self.ids[field][lo:hi])
+
+    def matches(self, poem_id, field, query):
+        """诗词的全拼或首字母是否以 query（已经过 normalize_query）开头"""
+        entry = self.entries.get(poem_id)
+        return entry is not None and any(key.startswith(query) for key in entry[field])
@@ -0,0 +1,190 @@
+"""批量生成诗词拼音
+
+导入和添加诗词时需要给标题和每一行内容注音。这里先把所有待注音的行去重，
+已注过音的行直接取拼音缓存（跨会话保存在 pinyin.cache 中），
+其余的分批交给进程池并行处理，每完成一批回报一次进度。
+
+pypinyin 在第一次注音或计算排序键时才导入，只浏览诗词时不加载。
+
+也可以在命令行中离线给诗词文件预先注音：
+
+    python pinyin_pipeline.py 输入.json 输出.json
+"""
+import os
+import sys
+from concurrent.futures import as_completed
+
+from pinyin_cache import PinyinCache
+from startup import load
+
+# 每批交给一个子进程的行数
+BATCH_SIZE = 500
+
+# 共享的拼音缓存，open_cache 之前只在内存中缓存
+_cache = PinyinCache(None)
+
+
+def open_cache(path='pinyin.cache'):
+    """打开持久化的拼音缓存"""
+    global _cache
+    _cache.close()
+    _cache = PinyinCache(path)
+    return _cache
+
+
+def close_cache():
+    """保存并关闭拼音缓存"""
+    _cache.close()
+
+
+def cache_stats():
+    return _cache.stats()
+
+
+def line_pinyin(text):
+    """一行文字的带声调拼音，字与字之间以空格分隔"""
+    pypinyin = load('pypinyin')
+    return ' '.join(' '.join(p) for p in pypinyin.pinyin(text, style=pypinyin.Style.TONE))
+
+
+def _sort_key(text):
+    pypinyin = load('pypinyin')
+    return ''.join(p[0].lower() for p in pypinyin.pinyin(text, style=pypinyin.Style.TONE3))
+
+
+def pinyin_sort_key(text):
+    """取文本的拼音（小写、数字声调）作为排序键"""
+    if not text:
+        return ''
+    return _cache.lookup('tone3', text, _sort_key)
+
+
+def _search_keys(text):
+    pypinyin = load('pypinyin')
+    full = pypinyin.lazy_pinyin(text, style=pypinyin.Style.NORMAL)
+    initials = pypinyin.lazy_pinyin(text, style=pypinyin.Style.FIRST_LETTER)
+    # 非汉字部分原样输出，只保留其中的字母
+    full = ''.join(filter(str.isalpha, ''.join(full).lower().replace('ü', 'v')))
+    initials = ''.join(filter(str.isalpha, ''.join(initials).lower()))
+    return f'{full} {initials}'
+
+
+def pinyin_search_keys(text):
+    """拼音搜索用的 (无声调全拼, 首字母)，ü 写作 v，如《静夜思》为 ('jingyesi', 'jys')"""
+    if not text:
+        return '', ''
+    full, initials = _cache.lookup('search', text, _search_keys).split(' ')
+    return full, initials
+
+
+def _annotate_batch(lines):
+    """子进程中执行：给一批行注音"""
+    return [line_pinyin(line) for line in lines]
+
+
+def pinyin_pool(workers=None):
+    """创建注音用的进程池；子进程在第一次提交任务时才启动"""
+    # multiprocessing 导入较慢，第一次需要进程池时才导入
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def annotate_lines(lines, progress=None, workers=None, batch_size=BATCH_SIZE, pool=None):
+    """给一组行注音，返回 {行: 拼音}
+
+    重复的行只处理一次；只有一批以内的行时直接在本进程处理，
+    不启动进程池。分批导入时可以传入 pool，在多次调用之间复用子进程。
+    progress(已完成行数, 总行数) 在调用线程中执行。
+    """
+    result = {}
+    pending = []
+    for line in dict.fromkeys(lines):
+        cached = _cache.get('tone', line)
+        if cached is not None:
+            result[line] = cached
+        else:
+            pending.append(line)
+
+    total = len(pending)
+    batches = [pending[i:i + batch_size] for i in range(0, total, batch_size)]
+    done = 0
+    if len(batches) <= 1:
+        for batch in batches:
+            _store(result, batch, _annotate_batch(batch))
+            done += len(batch)
+            if progress:
+                progress(done, total)
+        return result
+
+    own_pool = pool is None
+    if own_pool:
+        pool = pinyin_pool(min(workers or os.cpu_count() or 1, len(batches)))
+    try:
+        futures = {pool.submit(_annotate_batch, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            _store(result, batch, future.result())
+            done += len(batch)
+            if progress:
+                progress(done, total)
+    finally:
+        if own_pool:
+            pool.shutdown()
+    return result
+
+
+def _store(result, lines, pinyins):
+    for line, py in zip(lines, pinyins):
+        result[line] = py
+        _cache.put('tone', line, py)
+
+
+def annotate_poems(poems, progress=None, workers=None, pool=None):
+    """给缺少拼音的诗词补上标题拼音和逐行内容拼音，返回注音的诗词数"""
+    missing = []
+    lines = []
+    for poem in poems:
+        need_title = not poem.get('title_pinyin')
+        need_content = not any(poem.get('content_pinyin') or [])
+        if not (need_title or need_content):
+            continue
+        missing.append((poem, need_title, need_content))
+        if need_title:
+            lines.append(poem.get('title') or '')
+        if need_content:
+            lines.extend(poem.get('content') or [])
+
+    pinyins = annotate_lines(lines, progress, workers, pool=pool)
+    for poem, need_title, need_content in missing:
+        if need_title:
+            poem['title_pinyin'] = pinyins[poem.get('title') or '']
+        if need_content:
+            poem['content_pinyin'] = [pinyins[line] for line in poem.get('content') or []]
+    return len(missing)
+
+
+def main(argv):
+    """命令行入口：读取 {'poems': [...]} 格式的文件，注音后写出"""
+    from storage import read_json, write_json
+
+    if len(argv) != 2:
+        print('用法：python pinyin_pipeline.py 输入.json 输出.json')
+        return 2
+    poems = read_json(argv[0])
+    open_cache()
+
+    def report(done, total):
+        print(f'\r注音进度：{done}/{total} 行', end='', flush=True)
+
+    count = annotate_poems(poems, progress=report)
+    print()
+    write_json(argv[1], poems, indent=4)
+    stats = cache_stats()
+    close_cache()
+    print(f'已为 {count} 首诗词注音，写入 {argv[1]}')
+    print(f"拼音缓存命中 {stats['hits']} 次，未命中 {stats['misses']} 次")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,247 @@
+"""诗词文件的导入导出
+
+导入时 Excel 以只读模式打开，逐行生成诗词，不把整个工作簿读入内存；
+CSV 同样逐行读取。导入时按固定大小分批处理。
+
+导出 JSON 时逐首编码写出，不先把所有诗词收集到一个列表中。
+
+导出 Excel 使用只写模式的工作表，诗词从诗词库中逐首取出、逐行写出，
+列宽根据写出的前若干行统计，不再回头扫描每个单元格。
+
+可以在命令行中测试导出速度：
+
+    python poem_files.py 诗词数 输出.xlsx
+"""
+import csv
+import json
+import os
+import sys
+import time
+from itertools import chain, islice
+
+from storage import read_json
+
+# 导入导出文件中的列
+POEM_COLUMNS = ['title', 'author', 'dynasty', 'content', 'content_pinyin',
+                'translation', 'note', 'appreciation', 'author_intro', 'title_pinyin', 'updated_at']
+
+# 以 "|" 连接的多行字段
+LIST_COLUMNS = ('content', 'content_pinyin')
+
+# 导入时每批处理的诗词数
+IMPORT_BATCH_SIZE = 1000
+
+# 导出时每写出多少行回报一次进度
+PROGRESS_INTERVAL = 1000
+
+# 统计列宽时使用的行数（只写模式下列宽必须在写出数据之前设置）
+WIDTH_SAMPLE_ROWS = 1000
+
+# Excel 列宽上限
+MAX_COLUMN_WIDTH = 50
+
+
+def batched(poems, size):
+    """把诗词序列按固定大小分批"""
+    poems = iter(poems)
+    while True:
+        batch = list(islice(poems, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_excel_poems(path):
+    """以只读模式逐行读取 Excel 文件中的诗词，跳过没有标题的行"""
+    import openpyxl
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        headers = next(rows, ())
+        for values in rows:
+            poem = {}
+            for header, value in zip(headers, values):
+                if header in LIST_COLUMNS:
+                    # 将字符串转换为列表
+                    poem[header] = str(value).split('|') if value else []
+                elif header:
+                    poem[header] = value or ''
+            if poem.get('title'):  # 只添加有标题的诗词
+                yield poem
+    finally:
+        wb.close()
+
+
+def excel_row_count(path):
+    """Excel 工作表记录的数据行数（不含表头），没有记录时返回 None"""
+    import openpyxl
+
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        max_row = wb.active.max_row
+        return max_row - 1 if max_row else None
+    finally:
+        wb.close()
+
+
+def iter_csv_poems(path):
+    """逐行读取 CSV 文件中的诗词，跳过没有标题的行"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            # 处理content和content_pinyin字段，将字符串转换为列表
+            poem = {column: row.get(column) or '' for column in POEM_COLUMNS}
+            for column in LIST_COLUMNS:
+                poem[column] = poem[column].split('|')
+            if poem['title']:  # 只添加有标题的诗词
+                yield poem
+
+
+def open_poem_file(path):
+    """按扩展名打开诗词文件，返回 (大约的诗词数或 None, 诗词生成器)"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.json':
+        poems = read_json(path)
+        return len(poems), (poem for poem in poems)
+    if ext == '.xlsx':
+        return excel_row_count(path), iter_excel_poems(path)
+    return None, iter_csv_poems(path)
+
+
+def poem_row(poem):
+    """导出的一行，多行字段以 "|" 连接"""
+    row = []
+    for column in POEM_COLUMNS:
+        value = poem.get(column, '')
+        if column in LIST_COLUMNS and isinstance(value, list):
+            # 将列表转换为字符串
+            value = '|'.join(value)
+        row.append(value)
+    return row
+
+
+def column_widths(rows):
+    """按表头和各行中最长的值计算列宽"""
+    widths = [len(column) for column in POEM_COLUMNS]
+    for row in rows:
+        for i, value in enumerate(row):
+            length = len(str(value))
+            if length > widths[i]:
+                widths[i] = length
+    return [min(width + 2, MAX_COLUMN_WIDTH) for width in widths]
+
+
+def _write_replacing(path, write):
+    """write(临时文件路径) 写出临时文件，返回 True 时才替换目标文件
+
+    取消（返回 False）或出错时删除临时文件，已有的目标文件保持不变。
+    """
+    tmp_path = path + '.tmp'
+    try:
+        completed = write(tmp_path)
+    except BaseException:
+        _remove(tmp_path)
+        raise
+    if completed:
+        os.replace(tmp_path, path)
+    else:
+        _remove(tmp_path)
+    return completed
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def write_excel_poems(path, poems, progress=None):
+    """以只写模式逐行写出 Excel 文件
+
+    progress(已写出行数) 返回 False 时停止导出，函数返回 False；先写临时文件，
+    完成后才替换目标文件，取消或出错时不改动已有的文件。
+    """
+    import openpyxl
+    from openpyxl.utils import get_column_letter
+
+    def write(tmp_path):
+        rows = (poem_row(poem) for poem in poems)
+        sample = list(islice(rows, WIDTH_SAMPLE_ROWS))
+
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet()
+        # 调整列宽
+        for i, width in enumerate(column_widths(sample), 1):
+            ws.column_dimensions[get_column_letter(i)].width = width
+
+        ws.append(POEM_COLUMNS)
+        for count, row in enumerate(chain(sample, rows), 1):
+            ws.append(row)
+            if progress and count % PROGRESS_INTERVAL == 0 and progress(count) is False:
+                wb.close()
+                return False
+        wb.save(tmp_path)
+        return True
+
+    return _write_replacing(path, write)
+
+
+def write_csv_poems(path, poems, progress=None):
+    """逐行写出 CSV 文件；progress 的用法和临时文件的处理与 write_excel_poems 相同"""
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(POEM_COLUMNS)
+            for count, poem in enumerate(poems, 1):
+                writer.writerow(poem_row(poem))
+                if progress and count % PROGRESS_INTERVAL == 0 and progress(count) is False:
+                    return False
+        return True
+
+    return _write_replacing(path, write)
+
+
+def write_json_poems(path, poems, progress=None):
+    """逐首写出 {'poems': [...]} 格式的 JSON 文件，格式与 json.dump(indent=4) 相同
+
+    写完并 fsync 后才替换目标文件；progress 的用法和临时文件的处理与
+    write_excel_poems 相同。
+    """
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('{\n    "poems": [')
+            count = 0
+            for count, poem in enumerate(poems, 1):
+                text = json.dumps(poem, ensure_ascii=False, indent=4)
+                f.write(',\n' if count > 1 else '\n')
+                f.write('\n'.join('        ' + line for line in text.split('\n')))
+                if progress and count % PROGRESS_INTERVAL == 0 and progress(count) is False:
+                    return False
+            f.write('\n    ]\n}' if count else ']\n}')
+            f.flush()
+            os.fsync(f.fileno())
+        return True
+
+    return _write_replacing(path, write)
+
+
+def benchmark_export(count, path):
+    """生成 count 首测试诗词并导出 Excel，返回每秒导出的诗词数"""
+    line = '床前明月光疑是地上霜'
+    poems = ({'title': f'测试诗词{i}', 'author': '测试', 'dynasty': '唐',
+              'content': [line] * 4, 'content_pinyin': ['chuáng qián míng yuè guāng'] * 4,
+              'translation': line * 10, 'note': line * 5, 'appreciation': line * 20,
+              'author_intro': line * 5, 'title_pinyin': 'cè shì shī cí'}
+             for i in range(count))
+    start = time.perf_counter()
+    write_excel_poems(path, poems)
+    return count / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('用法：python poem_files.py 诗词数 输出.xlsx')
+        sys.exit(2)
+    rate = benchmark_export(int(sys.argv[1]), sys.argv[2])
+    print(f'导出速度：每秒 {rate:.0f} 首')
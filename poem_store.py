@@ -0,0 +1,305 @@
+"""诗词数据存储
+
+以诗词的 id 为键保存全部诗词，同时维护 (标题, 作者) 索引，
+按 id 或按标题作者查找都是常数时间。
+
+支持延迟加载：启动时只载入摘要（id、标题、作者、朝代），
+诗词详情在第一次用到时按字节位置从快照文件读取，并放入有界的 LRU 缓存。
+
+标题、作者、朝代的排序键（拼音）每首诗词只计算一次，随摘要索引保存；
+每列按排序键排好的 id 序列缓存起来，排序时不再调用拼音转换。
+
+每首诗词还保存一个内容哈希（同样随摘要索引保存），保存或导入时
+不必读取诗词详情就能判断内容是否有变化。
+
+快照文件在后台线程中重写，详情位置和缓存的读写由锁保护。
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# 可排序的列
+SORT_FIELDS = ('title', 'author', 'dynasty')
+
+# 内容哈希覆盖的字段：文字和拼音分开计算
+TEXT_HASH_FIELDS = ('title', 'author', 'dynasty', 'content', 'translation',
+                    'note', 'appreciation', 'author_intro')
+PINYIN_HASH_FIELDS = ('title_pinyin', 'content_pinyin')
+
+
+def normalize_field(value):
+    """去掉首尾空白，多行字段转为元组，便于比较"""
+    if value is None:
+        return ''
+    if isinstance(value, (list, tuple)):
+        return tuple(str(v).strip() for v in value)
+    return str(value).strip()
+
+
+def _digest(poem, fields):
+    data = json.dumps([normalize_field(poem.get(field)) for field in fields], ensure_ascii=False)
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def content_hash(poem):
+    """诗词的内容哈希：前 16 位是文字字段的哈希，后 16 位是拼音字段的哈希"""
+    return _digest(poem, TEXT_HASH_FIELDS) + _digest(poem, PINYIN_HASH_FIELDS)
+
+
+def same_content(old_hash, new_hash, compare_pinyin=True):
+    """比较两个内容哈希；compare_pinyin 为 False 时只比较文字"""
+    if compare_pinyin:
+        return old_hash == new_hash
+    return old_hash[:16] == new_hash[:16]
+
+# 摘要中保留的字段
+SUMMARY_FIELDS = ('id', 'title', 'author', 'dynasty')
+
+# 详情缓存的默认容量
+DETAIL_CACHE_SIZE = 256
+
+
+class PoemStore:
+    """按 id 保存诗词，保持加入顺序"""
+
+    def __init__(self, poems=(), loader=None, cache_size=DETAIL_CACHE_SIZE, sort_key=None):
+        self.poems = {}  # id -> 诗词；详情在快照文件中的诗词只保存摘要
+        self.locations = {}  # id -> 详情在快照文件中的 (位置, 长度)
+        self.by_title_author = {}  # (标题, 作者) -> [id]
+        self.next_id = 1
+        self.loader = loader
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.sort_key = sort_key or (lambda text: text or '')
+        self.keys = {}  # id -> (标题, 作者, 朝代) 的排序键
+        self.orders = {}  # 列 -> 按排序键升序排列的全部 id
+        self.ranks = {}  # 列 -> {id: 在升序中的位置}
+        self.hashes = {}  # id -> 内容哈希
+        self.lock = threading.RLock()  # 保护 locations 和 cache
+        self.load(poems)
+
+    def load(self, poems):
+        """载入诗词列表，缺少 id 或 id 重复的诗词重新分配 id"""
+        poems = list(poems)
+        for poem in poems:
+            poem_id = poem.get('id')
+            if isinstance(poem_id, int) and poem_id >= self.next_id:
+                self.next_id = poem_id + 1
+        for poem in poems:
+            self.add(poem)
+
+    def load_summaries(self, rows):
+        """载入 (摘要, 位置, 长度, 排序键, 内容哈希) 序列，详情留在快照文件中按需读取"""
+        for summary, offset, length, keys, digest in rows:
+            poem_id = summary['id']
+            self.poems[poem_id] = summary
+            self.locations[poem_id] = (offset, length)
+            self.keys[poem_id] = keys
+            self.hashes[poem_id] = digest
+            self.next_id = max(self.next_id, poem_id + 1)
+            self._link(summary)
+
+    def relocate(self, locations, previous=None):
+        """快照文件重写后更新详情位置
+
+        previous 为重写前记下的位置；重写期间被修改或删除的诗词位置已变，不再更新。
+        """
+        with self.lock:
+            if previous is None:
+                previous = dict(self.locations)
+            for poem_id, location in previous.items():
+                if self.locations.get(poem_id) == location:
+                    self.locations[poem_id] = locations[poem_id]
+
+    def snapshot_entries(self):
+        """记下当前全部诗词，供后台线程写快照
+
+        返回 [(id, 摘要, 排序键, 内容哈希, 详情位置, 常驻内存的诗词副本)]，
+        详情在快照文件中的诗词只记位置，不读取详情。
+        """
+        entries = []
+        with self.lock:
+            for poem_id, poem in self.poems.items():
+                location = self.locations.get(poem_id)
+                summary = {field: poem.get(field) for field in SUMMARY_FIELDS}
+                entries.append((poem_id, summary, self.sort_keys(poem_id), self.content_hash(poem_id),
+                                location, None if location is not None else dict(poem)))
+        return entries
+
+    def __len__(self):
+        return len(self.poems)
+
+    def __iter__(self):
+        """依次返回完整的诗词，必要时从快照文件读取详情"""
+        for poem_id in list(self.poems):
+            poem = self.get(poem_id)
+            if poem is not None:  # 在后台线程遍历时可能已被删除
+                yield poem
+
+    def __contains__(self, poem_id):
+        return poem_id in self.poems
+
+    def ids(self):
+        return self.poems.keys()
+
+    def summary(self, poem_id):
+        """返回诗词摘要（至少包含 id、标题、作者、朝代），不读取详情"""
+        return self.poems.get(poem_id)
+
+    def summaries(self):
+        return iter(self.poems.values())
+
+    def sort_keys(self, poem_id):
+        """返回 (标题, 作者, 朝代) 的排序键，第一次用到时计算"""
+        keys = self.keys.get(poem_id)
+        if keys is None:
+            poem = self.poems[poem_id]
+            keys = tuple(self.sort_key(str(poem.get(field) or '')) for field in SORT_FIELDS)
+            self.keys[poem_id] = keys
+        return keys
+
+    def content_hash(self, poem_id):
+        """返回诗词的内容哈希，没有保存时读取详情计算"""
+        digest = self.hashes.get(poem_id)
+        if digest is None:
+            digest = content_hash(self.get(poem_id))
+            self.hashes[poem_id] = digest
+        return digest
+
+    def sort_ids(self, ids, column, reverse=False):
+        """按排序键对给定的 id 排序，只用缓存的排序结果，不调用拼音转换
+
+        结果集较大时直接从全部诗词的升序序列中筛选，线性时间；
+        较小时按各 id 在升序中的位置排序。逆序就是升序反转。
+        """
+        order = self._order(column)
+        if len(ids) * 4 >= len(order):
+            wanted = set(ids)
+            result = [poem_id for poem_id in order if poem_id in wanted]
+        else:
+            rank = self.ranks[column]
+            result = sorted(ids, key=rank.__getitem__)
+        if reverse:
+            result.reverse()
+        return result
+
+    def _order(self, column):
+        order = self.orders.get(column)
+        if order is None:
+            i = SORT_FIELDS.index(column)
+            order = sorted(self.poems, key=lambda poem_id: (self.sort_keys(poem_id)[i], poem_id))
+            self.orders[column] = order
+            self.ranks[column] = {poem_id: rank for rank, poem_id in enumerate(order)}
+        return order
+
+    def get(self, poem_id):
+        with self.lock:
+            poem = self.poems.get(poem_id)
+            location = self.locations.get(poem_id)
+            if poem is None or location is None:
+                return poem
+            detail = self.cache.get(poem_id)
+            if detail is not None:
+                self.cache.move_to_end(poem_id)
+                return detail
+            detail = self.loader(*location)
+            detail['id'] = poem_id
+            self.cache[poem_id] = detail
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            return detail
+
+    def find_id(self, title, author):
+        """按标题和作者查找，返回第一首匹配的诗词的 id，不读取详情"""
+        ids = self.by_title_author.get((title, author))
+        return ids[0] if ids else None
+
+    def add(self, poem):
+        """加入一首诗词，id 缺失或已被占用时分配新 id，返回 id"""
+        poem_id = poem.get('id')
+        if not isinstance(poem_id, int) or poem_id in self.poems:
+            poem_id = self.next_id
+            poem['id'] = poem_id
+        self.next_id = max(self.next_id, poem_id + 1)
+        self.poems[poem_id] = poem
+        self.hashes[poem_id] = content_hash(poem)
+        self._forget_keys(poem_id)
+        self._link(poem)
+        return poem_id
+
+    def update(self, poem_id, fields):
+        """修改诗词字段，id 保持不变，返回修改后的诗词
+
+        修改过的诗词常驻内存，不再从快照文件读取。
+        """
+        poem = self.get(poem_id)
+        self._unlink(self.poems[poem_id])
+        resort = any(field in fields and fields[field] != poem.get(field) for field in SORT_FIELDS)
+        poem.update(fields)
+        poem['id'] = poem_id
+        with self.lock:
+            self.poems[poem_id] = poem
+            self.locations.pop(poem_id, None)
+            self.cache.pop(poem_id, None)
+        self.hashes[poem_id] = content_hash(poem)
+        if resort:
+            self._forget_keys(poem_id)
+        self._link(poem)
+        return poem
+
+    def remove(self, poem_id):
+        poem = self.get(poem_id)
+        if poem is None:
+            return None
+        with self.lock:
+            self._unlink(self.poems.pop(poem_id))
+            self.locations.pop(poem_id, None)
+            self.cache.pop(poem_id, None)
+        self.hashes.pop(poem_id, None)
+        self._forget_keys(poem_id)
+        return poem
+
+    def remove_many(self, poem_ids):
+        """一次删除一批诗词，返回删除的诗词摘要
+
+        不读取详情；缓存的排序结果过滤掉删除的 id 后仍然有效，不必重新排序。
+        """
+        removed = []
+        with self.lock:
+            for poem_id in poem_ids:
+                poem = self.poems.pop(poem_id, None)
+                if poem is None:
+                    continue
+                self._unlink(poem)
+                self.locations.pop(poem_id, None)
+                self.cache.pop(poem_id, None)
+                self.hashes.pop(poem_id, None)
+                self.keys.pop(poem_id, None)
+                removed.append(poem)
+        if removed:
+            deleted = {poem['id'] for poem in removed}
+            for column, order in self.orders.items():
+                self.orders[column] = [poem_id for poem_id in order if poem_id not in deleted]
+            for rank in self.ranks.values():
+                for poem_id in deleted:
+                    rank.pop(poem_id, None)
+        return removed
+
+    def _forget_keys(self, poem_id):
+        """诗词的排序字段变了，丢弃它的排序键和缓存的排序结果"""
+        self.keys.pop(poem_id, None)
+        self.orders.clear()
+        self.ranks.clear()
+
+    def _link(self, poem):
+        key = (poem.get('title'), poem.get('author'))
+        self.by_title_author.setdefault(key, []).append(poem['id'])
+
+    def _unlink(self, poem):
+        key = (poem.get('title'), poem.get('author'))
+        ids = self.by_title_author.get(key)
+        if ids and poem['id'] in ids:
+            ids.remove(poem['id'])
+            if not ids:
+                del self.by_title_author[key]
@@ -0,0 +1,61 @@
+"""长时间操作的进度对话框"""
+import tkinter as tk
+from tkinter import ttk
+
+
+class ProgressDialog:
+    """显示进度条和取消按钮；总数未知时只显示已处理的数量
+
+    进度由后台任务通过界面线程回报，对话框不阻塞主窗口。
+    """
+
+    def __init__(self, parent, title, text, maximum=None, on_cancel=None):
+        self.cancelled = False
+        self.closed = False
+        self.text = text
+        self.on_cancel = on_cancel
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title(title)
+        self.dialog.transient(parent)
+        self.dialog.resizable(False, False)
+        self.dialog.protocol('WM_DELETE_WINDOW', self.cancel)
+
+        self.label = ttk.Label(self.dialog, text=text)
+        self.label.pack(padx=20, pady=(15, 5))
+        self.bar = ttk.Progressbar(self.dialog, length=300)
+        self.bar.pack(padx=20, pady=5)
+        self.maximum = None
+        self.set_maximum(maximum)
+        self.cancel_btn = ttk.Button(self.dialog, text='取消', command=self.cancel)
+        self.cancel_btn.pack(pady=(5, 15))
+
+    def set_maximum(self, maximum):
+        self.maximum = maximum
+        if maximum:
+            self.bar.config(mode='determinate', maximum=maximum)
+        else:
+            self.bar.config(mode='indeterminate')
+
+    def update(self, done, maximum=None, text=None):
+        """更新进度；对话框关闭后收到的进度忽略"""
+        if self.closed:
+            return
+        if maximum and maximum != self.maximum:
+            self.set_maximum(maximum)
+        if self.maximum:
+            self.bar['value'] = min(done, self.maximum)
+        else:
+            self.bar.step()
+        self.label.config(text=text or f'{self.text}（{done}）')
+
+    def cancel(self):
+        if self.cancelled or self.on_cancel is None:
+            return
+        self.cancelled = True
+        self.label.config(text='正在取消...')
+        self.on_cancel()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.dialog.destroy()
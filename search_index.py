@@ -0,0 +1,112 @@
+"""诗词搜索索引
+
+对标题、作者、朝代建立字符二元组（bigram）倒排索引，
+搜索时只需求倒排表的交集，不必逐首扫描全部诗词。
+"""
+
+
+def make_grams(text):
+    """把文本拆成单字和相邻二字组"""
+    grams = set(text)
+    for i in range(len(text) - 1):
+        grams.add(text[i:i + 2])
+    return grams
+
+
+def query_grams(text):
+    """查询词用于求交集的字组：单字查单字，多字查二字组"""
+    if len(text) == 1:
+        return {text}
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class SearchIndex:
+    """标题/作者/朝代的二元组倒排索引"""
+
+    FIELDS = ('title', 'author', 'dynasty')
+
+    def __init__(self):
+        # 字段 -> 字组 -> 文档编号集合
+        self.postings = {field: {} for field in self.FIELDS}
+        # 文档编号 -> {字段: 小写文本}，用于最终的子串校验
+        self.docs = {}
+        # 文档编号 -> 加入顺序，保证结果按原始顺序显示
+        self.order = {}
+        self.next_order = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.docs
+
+    def add(self, doc_id, poem):
+        """加入或更新一首诗词，更新时保留原来的顺序"""
+        if doc_id in self.docs:
+            self._remove_postings(doc_id)
+        else:
+            self.order[doc_id] = self.next_order
+            self.next_order += 1
+
+        fields = {}
+        for field in self.FIELDS:
+            text = str(poem.get(field) or '').lower()
+            fields[field] = text
+            postings = self.postings[field]
+            for gram in make_grams(text):
+                postings.setdefault(gram, set()).add(doc_id)
+        self.docs[doc_id] = fields
+
+    def remove(self, doc_id):
+        if doc_id not in self.docs:
+            return
+        self._remove_postings(doc_id)
+        del self.docs[doc_id]
+        del self.order[doc_id]
+
+    def _remove_postings(self, doc_id):
+        for field, text in self.docs[doc_id].items():
+            postings = self.postings[field]
+            for gram in make_grams(text):
+                ids = postings.get(gram)
+                if ids is None:
+                    continue
+                ids.discard(doc_id)
+                if not ids:
+                    del postings[gram]
+
+    def terms(self, title='', author='', dynasty=''):
+        """把查询整理成 {字段: 小写查询词}，忽略空条件"""
+        terms = {}
+        for field, value in zip(self.FIELDS, (title, author, dynasty)):
+            value = (value or '').strip().lower()
+            if value:
+                terms[field] = value
+        return terms
+
+    def candidates(self, terms):
+        """按倒排表求交集得到的候选编号，尚未做子串校验；没有条件时返回全部编号"""
+        if not terms:
+            return self.docs.keys()
+
+        # 先按最短的倒排表求交集，尽快缩小候选集
+        lists = []
+        for field, value in terms.items():
+            postings = self.postings[field]
+            for gram in query_grams(value):
+                ids = postings.get(gram)
+                if not ids:
+                    return set()
+                lists.append(ids)
+        lists.sort(key=len)
+        candidates = set(lists[0])
+        for ids in lists[1:]:
+            candidates &= ids
+            if not candidates:
+                break
+        return candidates
+
+    def matches(self, doc_id, terms):
+        """文档是否包含各条件的子串"""
+        fields = self.docs.get(doc_id)
+        return fields is not None and all(value in fields[field] for field, value in terms.items())
@@ -0,0 +1,389 @@
+"""朗读
+
+语音引擎由一个常驻的朗读线程持有，只初始化一次，停止朗读后不再丢弃。
+界面线程通过命令队列控制朗读（speak、pause、resume、stop、rate、volume、
+voice、prerender），朗读线程的事件经 call_soon 回到界面线程，不直接操作
+界面。
+
+有 winsound 时（Windows），每一段先用 engine.save_to_file 合成为 wav
+文件，再异步播放；播放当前段的同时合成后面的几段，段与段之间没有停顿，
+停止只需停止播放。给出 AudioCache 时合成的文件保存在缓存中，再次朗读
+直接播放。没有 winsound 的平台上逐段直接朗读，每读一个词检查一次是否
+要停止。暂停在段的边界生效，继续时从暂停的段开头重读。
+"""
+import os
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
+import wave
+from collections import deque
+
+from audio_cache import cache_key
+from startup import load
+
+try:
+    import winsound
+except ImportError:
+    winsound = None
+
+# 能否播放合成的音频文件；不能时直接朗读，预先合成和缓存不起作用
+PLAYS_FILES = winsound is not None
+
+# 朗读时按这些标点分段
+SEGMENT_PATTERN = re.compile(r'[，。！？；：、,.!?;:\s]+')
+
+# 播放当前段时预先合成的段数
+PRESYNTH_AHEAD = 2
+
+# 语速和音量按这个间隔取整，拖动滑块时缓存的音频不会因为细微的差别失效
+RATE_STEP = 10
+VOLUME_STEP = 0.1
+
+PROPERTIES = ('voice', 'rate', 'volume')
+
+
+def split_segments(lines):
+    """把诗词内容的各行按标点分成朗读的段，返回 [(行号, 文字)]"""
+    result = []
+    for i, line in enumerate(lines):
+        result += [(i, part) for part in SEGMENT_PATTERN.split(line) if part]
+    return result
+
+
+def _duration(path):
+    """wav 文件的时长（秒）"""
+    with wave.open(path, 'rb') as f:
+        return f.getnframes() / float(f.getframerate())
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class SpeechWorker:
+    """持有语音引擎的常驻朗读线程"""
+
+    def __init__(self, call_soon, on_ready, on_finished, on_error, cache=None):
+        self.call_soon = call_soon  # 从朗读线程安排界面线程的回调
+        self.on_ready = on_ready  # 引擎初始化后调用 on_ready([(音色 id, 名称)])
+        self.on_finished = on_finished  # 一次朗读自然结束后调用 on_finished(序号)
+        self.on_error = on_error  # 出错时调用 on_error(异常)
+        self.cache = cache  # 合成音频的磁盘缓存，在朗读线程中读取
+        self.commands = queue.Queue()
+        self.interrupt = threading.Event()  # 有新命令时打断正在进行的合成或朗读
+        self.serial = 0  # 每次 speak 加一，界面据此忽略过时的结束事件
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def speak(self, segments, poem_id=None, voice=None, rate=None, volume=None):
+        """朗读 [(行号, 文字)]，之前的朗读停止；返回本次朗读的序号
+
+        给出诗词 id 时合成的音频放入缓存。
+        """
+        self.serial += 1
+        self._send('speak', self.serial, segments, poem_id, voice, rate, volume)
+        return self.serial
+
+    def prerender(self, items, voice=None, rate=None, volume=None, on_progress=None, on_done=None):
+        """把 [(诗词 id, [(行号, 文字)])] 逐段合成到缓存中，在没有朗读时进行
+
+        每合成一段调用 on_progress(已完成段数, 总段数)；全部完成后调用
+        on_done(True)，被取消或出错时调用 on_done(False)。
+        """
+        self._send('prerender', items, voice, rate, volume, on_progress, on_done)
+
+    def cancel_prerender(self):
+        self._send('cancel_prerender')
+
+    def pause(self):
+        self._send('pause')
+
+    def resume(self):
+        self._send('resume')
+
+    def stop(self):
+        self._send('stop')
+
+    def set_rate(self, rate):
+        self._send('rate', rate)
+
+    def set_volume(self, volume):
+        self._send('volume', volume)
+
+    def set_voice(self, voice):
+        self._send('voice', voice)
+
+    def close(self):
+        """停止朗读并结束线程，删除临时文件"""
+        if self.thread is not None:
+            self._send('quit')
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    def _send(self, command, *args):
+        if command in ('speak', 'pause', 'stop', 'quit', 'cancel_prerender'):
+            self.interrupt.set()
+        self.commands.put((command, args))
+
+    def _run(self):
+        try:
+            try:
+                # 语音引擎使用 COM，在本线程中初始化
+                import pythoncom
+                pythoncom.CoInitialize()
+            except ImportError:
+                pass
+            self.engine = load('pyttsx3').init()
+            voices = [(voice.id, voice.name) for voice in self.engine.getProperty('voices')]
+            self.settings = tuple(self.engine.getProperty(name) for name in PROPERTIES)
+            if self.cache is not None:
+                self.cache.load()
+        except Exception as e:
+            self.call_soon(self.on_error, e)
+            return
+        self.call_soon(self.on_ready, voices)
+        self.engine.connect('started-word', self._check_interrupt)
+
+        self.folder = tempfile.mkdtemp(prefix='poem_speech_') if PLAYS_FILES else None
+        self.batch = deque()  # 等待预先合成的 (诗词 id, 行号, 文字)
+        self.batch_settings = self.settings
+        self.batch_callbacks = (None, None)  # (on_progress, on_done)
+        self.batch_done = self.batch_total = 0
+        self._reset()
+        try:
+            self._loop()
+        finally:
+            self._stop_playing()
+            self._end_batch(False)
+            if self.folder:
+                shutil.rmtree(self.folder, ignore_errors=True)
+
+    def _reset(self):
+        """清空待读的段"""
+        self._stop_playing()
+        for index in list(getattr(self, 'rendered', ())):
+            self._discard(index)
+        self.segments = []
+        self.poem_id = None
+        self.position = 0  # 正在读或下一个要读的段
+        self.rendered = {}  # 段序号 -> (wav 文件, 是否为临时文件)
+        self.playing_until = None  # 当前段播放结束的时间
+        self.paused = False
+        self.current = 0  # 当前朗读的序号
+
+    def _loop(self):
+        while True:
+            try:
+                command, args = self.commands.get(timeout=self._timeout())
+                # 命令已取出，之后的合成和朗读不再被它打断
+                self.interrupt.clear()
+            except queue.Empty:
+                command = None
+            if command == 'quit':
+                return
+            try:
+                if command is not None:
+                    self._handle(command, args)
+                else:
+                    self._step()
+            except Exception as e:
+                self._reset()
+                self._end_batch(False)
+                self.call_soon(self.on_error, e)
+
+    def _reading(self):
+        return not self.paused and self.position < len(self.segments)
+
+    def _timeout(self):
+        """没有命令时等待多久再推进；None 表示一直等命令"""
+        if self._reading():
+            if self.playing_until is None or self._next_to_render() is not None:
+                return 0
+            return max(self.playing_until - time.monotonic(), 0)
+        if self.batch:
+            return 0
+        return None
+
+    def _handle(self, command, args):
+        if command == 'speak':
+            self._reset()
+            self.current, self.segments, self.poem_id, voice, rate, volume = args
+            self._configure(voice=voice, rate=rate, volume=volume)
+            if not self.segments:
+                self.call_soon(self.on_finished, self.current)
+        elif command == 'pause':
+            self._stop_playing()
+            self.paused = True
+        elif command == 'resume':
+            self.paused = False
+        elif command == 'stop':
+            self._reset()
+        elif command == 'rate':
+            self._configure(rate=args[0])
+        elif command == 'volume':
+            self._configure(volume=args[0])
+        elif command == 'voice':
+            self._configure(voice=args[0])
+        elif command == 'prerender':
+            items, voice, rate, volume, on_progress, on_done = args
+            self._end_batch(False)
+            if self.cache is not None:
+                self.batch.extend((poem_id, line, text) for poem_id, segments in items for line, text in segments)
+            self.batch_settings = self._merge(voice, rate, volume)
+            self.batch_callbacks = (on_progress, on_done)
+            self.batch_done = 0
+            self.batch_total = len(self.batch)
+            if not self.batch:
+                self._end_batch(True)
+        elif command == 'cancel_prerender':
+            self._end_batch(False)
+
+    def _merge(self, voice=None, rate=None, volume=None):
+        """在当前属性上改动给出的几项，语速和音量取整"""
+        if rate is not None:
+            rate = int(round(rate / RATE_STEP)) * RATE_STEP
+        if volume is not None:
+            volume = round(round(volume / VOLUME_STEP) * VOLUME_STEP, 2)
+        return tuple(old if new is None else new
+                     for old, new in zip(self.settings, (voice, rate, volume)))
+
+    def _configure(self, voice=None, rate=None, volume=None):
+        """修改朗读的属性；已合成但尚未播放的段按新属性重新合成"""
+        settings = self._merge(voice, rate, volume)
+        if settings != self.settings:
+            self.settings = settings
+            for index in [i for i in self.rendered if i > self.position or self.playing_until is None]:
+                self._discard(index)
+
+    def _apply(self, settings):
+        for name, value in zip(PROPERTIES, settings):
+            if value is not None and self.engine.getProperty(name) != value:
+                self.engine.setProperty(name, value)
+
+    def _step(self):
+        """推进朗读：当前段读完时转到下一段，没有在播放时开始播放，否则预先合成
+        后面的段；没有朗读时合成一段批量缓存"""
+        if not self._reading():
+            if self.batch:
+                self._prerender_next()
+            return
+
+        if self.playing_until is not None and time.monotonic() >= self.playing_until:
+            self.playing_until = None
+            self._discard(self.position)
+            self.position += 1
+            if self.position >= len(self.segments):
+                self.call_soon(self.on_finished, self.current)
+                return
+
+        if self.playing_until is None:
+            self._play(self.position)
+            return
+
+        index = self._next_to_render()
+        if index is not None:
+            self._render(index)
+
+    def _next_to_render(self):
+        """播放当前段时下一个需要预先合成的段"""
+        if not PLAYS_FILES:
+            return None
+        for index in range(self.position + 1, min(self.position + 1 + PRESYNTH_AHEAD, len(self.segments))):
+            if index not in self.rendered:
+                return index
+        return None
+
+    def _synthesize(self, text, path, settings):
+        """合成到文件；被新命令打断时删除不完整的文件并返回 False"""
+        self._apply(settings)
+        self.engine.save_to_file(text, path)
+        self.engine.runAndWait()
+        if self.interrupt.is_set():
+            _remove(path)
+            return False
+        return True
+
+    def _cached(self, poem_id, line, text, settings):
+        """缓存中的音频，没有时合成后放入缓存；被打断时返回 None"""
+        key = cache_key(poem_id, line, text, *settings)
+        path = self.cache.get(key)
+        if path is None and self._synthesize(text, self.cache.temp_path(key), settings):
+            path = self.cache.put(key)
+        return path
+
+    def _render(self, index):
+        line, text = self.segments[index]
+        if self.cache is not None and self.poem_id is not None:
+            path = self._cached(self.poem_id, line, text, self.settings)
+            temporary = False
+        else:
+            path = os.path.join(self.folder, f'{self.current}_{index}.wav')
+            if not self._synthesize(text, path, self.settings):
+                path = None
+            temporary = True
+        if path is not None:
+            self.rendered[index] = (path, temporary)
+        return path
+
+    def _discard(self, index):
+        """不再需要的段；临时文件删除，缓存中的文件保留"""
+        path, temporary = self.rendered.pop(index, (None, False))
+        if temporary:
+            _remove(path)
+
+    def _play(self, index):
+        if not PLAYS_FILES:
+            # 直接朗读，读完这一段才返回；中途停止由 _check_interrupt 处理
+            self._apply(self.settings)
+            self.engine.say(self.segments[index][1])
+            self.engine.runAndWait()
+            if self.interrupt.is_set():
+                # 被暂停或停止打断，这一段稍后重读
+                return
+            self.playing_until = time.monotonic()
+            return
+        path = self.rendered[index][0] if index in self.rendered else self._render(index)
+        if path is None:
+            return
+        winsound.PlaySound(path, winsound.SND_FILENAME | winsound.SND_ASYNC)
+        self.playing_until = time.monotonic() + _duration(path)
+
+    def _stop_playing(self):
+        if PLAYS_FILES and getattr(self, 'playing_until', None) is not None:
+            winsound.PlaySound(None, 0)
+        self.playing_until = None
+
+    def _prerender_next(self):
+        poem_id, line, text = self.batch[0]
+        if self._cached(poem_id, line, text, self.batch_settings) is None:
+            # 被新命令打断，处理完命令后重新合成这一段
+            return
+        self.batch.popleft()
+        self.batch_done += 1
+        on_progress, on_done = self.batch_callbacks
+        if on_progress:
+            self.call_soon(on_progress, self.batch_done, self.batch_total)
+        if not self.batch:
+            self._end_batch(True)
+
+    def _end_batch(self, completed):
+        """结束预先合成，通知界面是否全部完成"""
+        on_progress, on_done = self.batch_callbacks
+        self.batch.clear()
+        self.batch_callbacks = (None, None)
+        if on_done:
+            self.call_soon(on_done, completed)
+
+    def _check_interrupt(self, name, location, length):
+        if self.interrupt.is_set():
+            self.engine.stop()
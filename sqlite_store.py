@@ -0,0 +1,372 @@
+"""SQLite 诗词存储（可选）
+
+诗词、逐行内容/拼音和收藏分别存放在规范化的表中，标题、作者、朝代
+建有 B 树索引，全文检索使用 FTS5 虚拟表。搜索、收藏、排序和批量删除
+都直接在 SQL 中完成，启动时不需要把整个诗词库读入内存。
+
+与 PoemStore 接口一致，同时兼作存储后端（load/commit/close）。
+"""
+import sqlite3
+
+from fulltext import tokenize, parse_query, _is_cjk
+from poem_store import SUMMARY_FIELDS, content_hash
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS poems (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    title_pinyin TEXT NOT NULL DEFAULT '',
+    author TEXT NOT NULL DEFAULT '',
+    dynasty TEXT NOT NULL DEFAULT '',
+    translation TEXT NOT NULL DEFAULT '',
+    note TEXT NOT NULL DEFAULT '',
+    appreciation TEXT NOT NULL DEFAULT '',
+    author_intro TEXT NOT NULL DEFAULT '',
+    updated_at TEXT NOT NULL DEFAULT '',
+    title_key TEXT NOT NULL DEFAULT '',
+    author_key TEXT NOT NULL DEFAULT '',
+    dynasty_key TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_poems_title ON poems(title);
+CREATE INDEX IF NOT EXISTS idx_poems_author ON poems(author);
+CREATE INDEX IF NOT EXISTS idx_poems_dynasty ON poems(dynasty);
+CREATE INDEX IF NOT EXISTS idx_poems_title_author ON poems(title, author);
+CREATE INDEX IF NOT EXISTS idx_poems_title_key ON poems(title_key);
+CREATE INDEX IF NOT EXISTS idx_poems_author_key ON poems(author_key);
+CREATE INDEX IF NOT EXISTS idx_poems_dynasty_key ON poems(dynasty_key);
+
+CREATE TABLE IF NOT EXISTS poem_lines (
+    poem_id INTEGER NOT NULL REFERENCES poems(id) ON DELETE CASCADE,
+    line_no INTEGER NOT NULL,
+    content TEXT,
+    pinyin TEXT,
+    PRIMARY KEY (poem_id, line_no)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS favorites (
+    poem_id INTEGER PRIMARY KEY REFERENCES poems(id) ON DELETE CASCADE
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS poems_fts USING fts5(
+    title, author, dynasty, body, tokenize='unicode61'
+);
+"""
+
+# poems 表中的文本字段
+TEXT_FIELDS = ('title', 'title_pinyin', 'author', 'dynasty', 'translation',
+               'note', 'appreciation', 'author_intro', 'updated_at')
+
+# 可排序的列及对应的排序键列
+SORT_COLUMNS = {'title': 'title_key', 'author': 'author_key', 'dynasty': 'dynasty_key'}
+
+
+def _fts_text(text):
+    """把文本切成二字组后以空格连接，交给 FTS5 的 unicode61 分词"""
+    return ' '.join(term for term, _ in tokenize(text))
+
+
+def _fts_phrase(text):
+    """把查询文本转成 FTS5 表达式：多字为相邻二字组短语，单字为前缀查询"""
+    terms = [term for term, _ in tokenize(text, for_query=True)]
+    if not terms:
+        return None
+    if len(terms) == 1 and len(terms[0]) == 1:
+        return f'"{terms[0]}"*'
+    return '"' + ' '.join(terms) + '"'
+
+
+def _fts_clause(text, is_phrase):
+    """把 parse_query 拆出的一个子句转成 FTS5 表达式，与 FullTextIndex.search 的规则一致
+
+    短语子句要求各二字组相邻；普通子句只要求每个二字组都出现；单个汉字按前缀查询。
+    """
+    terms = [term.replace('"', '""') for term, _ in tokenize(text, for_query=True)]
+    if not terms:
+        return None
+    if is_phrase and len(terms) > 1:
+        return '"' + ' '.join(terms) + '"'
+    return '(' + ' AND '.join(f'"{term}"*' if len(term) == 1 and _is_cjk(term) else f'"{term}"'
+                              for term in terms) + ')'
+
+
+def _like_pattern(text):
+    """子串查询的 LIKE 模式，% 和 _ 按原字符匹配（配合 ESCAPE '\\'）"""
+    text = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{text}%'
+
+
+class SQLitePoemStore:
+    """SQLite 中的诗词库"""
+
+    def __init__(self, path='poems.db', sort_key=None, read_only=False):
+        """打开数据库；read_only 时只开一个只读连接，不建表（见 reader）"""
+        self.path = path
+        self.sort_key = sort_key or (lambda text: text or '')
+        self.conn = sqlite3.connect(path)
+        if read_only:
+            self.conn.execute('PRAGMA query_only = ON')
+            return
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.executescript(SCHEMA)
+
+    def reader(self):
+        """在调用线程中另开一个只读连接，供后台任务读取；用完后调用 close()
+
+        sqlite3 的连接只能在创建它的线程中使用，后台任务不能共用界面线程的连接。
+        """
+        return SQLitePoemStore(self.path, self.sort_key, read_only=True)
+
+    # ---- 存储后端接口 ----
+
+    def load(self):
+        return self
+
+    def commit(self, puts=(), deletes=()):
+        """修改已在事务中写入，这里提交事务"""
+        self.conn.commit()
+
+    def needs_compaction(self):
+        return False
+
+    def compact(self, poems):
+        pass
+
+    def close(self):
+        if self.conn:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    # ---- PoemStore 接口 ----
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM poems').fetchone()[0]
+
+    def __iter__(self):
+        for (poem_id,) in self.conn.execute('SELECT id FROM poems ORDER BY id').fetchall():
+            yield self.get(poem_id)
+
+    def __contains__(self, poem_id):
+        return self.conn.execute('SELECT 1 FROM poems WHERE id = ?', (poem_id,)).fetchone() is not None
+
+    def ids(self):
+        return [row[0] for row in self.conn.execute('SELECT id FROM poems ORDER BY id')]
+
+    def summary(self, poem_id):
+        """只读取 id、标题、作者、朝代，用于列表显示"""
+        row = self.conn.execute(
+            'SELECT id, title, author, dynasty FROM poems WHERE id = ?', (poem_id,)).fetchone()
+        return dict(zip(SUMMARY_FIELDS, row)) if row else None
+
+    def summaries(self):
+        return (dict(zip(SUMMARY_FIELDS, row))
+                for row in self.conn.execute('SELECT id, title, author, dynasty FROM poems'))
+
+    def get(self, poem_id):
+        row = self.conn.execute(
+            f'SELECT {", ".join(TEXT_FIELDS)} FROM poems WHERE id = ?', (poem_id,)).fetchone()
+        if row is None:
+            return None
+        poem = dict(zip(TEXT_FIELDS, row))
+        poem['id'] = poem_id
+        lines = self.conn.execute(
+            'SELECT content, pinyin FROM poem_lines WHERE poem_id = ? ORDER BY line_no', (poem_id,)).fetchall()
+        poem['content'] = [content for content, _ in lines if content is not None]
+        poem['content_pinyin'] = [py for _, py in lines if py is not None]
+        return poem
+
+    def find_id(self, title, author):
+        row = self.conn.execute(
+            'SELECT id FROM poems WHERE title = ? AND author = ? ORDER BY id LIMIT 1', (title, author)).fetchone()
+        return row[0] if row else None
+
+    def content_hash(self, poem_id):
+        """诗词的内容哈希，由一次按主键的查询算出"""
+        return content_hash(self.get(poem_id))
+
+    def add(self, poem):
+        """加入一首诗词，id 缺失或已被占用时分配新 id，返回 id"""
+        poem_id = poem.get('id')
+        if not isinstance(poem_id, int) or poem_id in self:
+            poem_id = self.conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM poems').fetchone()[0]
+            poem['id'] = poem_id
+        self.conn.execute(
+            f'INSERT INTO poems (id, {", ".join(TEXT_FIELDS)}, title_key, author_key, dynasty_key) '
+            f'VALUES (?, {", ".join("?" * len(TEXT_FIELDS))}, ?, ?, ?)',
+            (poem_id, *self._text_values(poem), *self._sort_keys(poem)))
+        self._write_lines(poem_id, poem)
+        self._write_fts(poem_id, poem)
+        return poem_id
+
+    def update(self, poem_id, fields):
+        """修改诗词字段，id 保持不变，返回修改后的诗词"""
+        poem = self.get(poem_id)
+        poem.update(fields)
+        poem['id'] = poem_id
+        self.conn.execute(
+            f'UPDATE poems SET {", ".join(f + " = ?" for f in TEXT_FIELDS)}, '
+            f'title_key = ?, author_key = ?, dynasty_key = ? WHERE id = ?',
+            (*self._text_values(poem), *self._sort_keys(poem), poem_id))
+        self.conn.execute('DELETE FROM poem_lines WHERE poem_id = ?', (poem_id,))
+        self._write_lines(poem_id, poem)
+        self.conn.execute('DELETE FROM poems_fts WHERE rowid = ?', (poem_id,))
+        self._write_fts(poem_id, poem)
+        return poem
+
+    def remove(self, poem_id):
+        poem = self.get(poem_id)
+        if poem is not None:
+            self.remove_many([poem_id])
+        return poem
+
+    def _text_values(self, poem):
+        return [str(poem.get(field) or '') for field in TEXT_FIELDS]
+
+    def _sort_keys(self, poem):
+        return [self.sort_key(str(poem.get(field) or '')) for field in SORT_COLUMNS]
+
+    def _write_lines(self, poem_id, poem):
+        content = poem.get('content') or []
+        pinyin = poem.get('content_pinyin') or []
+        if isinstance(content, str):
+            content = content.split('\n')
+        if isinstance(pinyin, str):
+            pinyin = pinyin.split('\n')
+        rows = []
+        for i in range(max(len(content), len(pinyin))):
+            rows.append((poem_id, i,
+                         content[i] if i < len(content) else None,
+                         pinyin[i] if i < len(pinyin) else None))
+        self.conn.executemany(
+            'INSERT INTO poem_lines (poem_id, line_no, content, pinyin) VALUES (?, ?, ?, ?)', rows)
+
+    def _write_fts(self, poem_id, poem):
+        content = poem.get('content') or []
+        if isinstance(content, list):
+            content = '\n'.join(str(line) for line in content)
+        body = '\n'.join([content] + [str(poem.get(field) or '') for field in
+                                      ('translation', 'note', 'appreciation', 'author_intro')])
+        self.conn.execute(
+            'INSERT INTO poems_fts (rowid, title, author, dynasty, body) VALUES (?, ?, ?, ?, ?)',
+            (poem_id, _fts_text(str(poem.get('title') or '')), _fts_text(str(poem.get('author') or '')),
+             _fts_text(str(poem.get('dynasty') or '')), _fts_text(body)))
+
+    # ---- 在 SQL 中完成的查询 ----
+
+    def _with_ids(self, ids):
+        """把一批 id 放进临时表，供后续语句连接使用"""
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS selected_ids (id INTEGER PRIMARY KEY)')
+        self.conn.execute('DELETE FROM selected_ids')
+        self.conn.executemany('INSERT OR IGNORE INTO selected_ids (id) VALUES (?)', ((i,) for i in ids))
+
+    def search(self, title='', author='', dynasty='', query=''):
+        """按标题/作者/朝代子串和全文查询筛选，返回 [(id, 标题, 作者, 朝代)]
+
+        全文查询按 parse_query 拆成子句，双引号内为短语，与 JSON 模式的全文索引
+        规则相同。有全文查询时按 BM25 相关度排列，否则按 id 排列。
+        """
+        where = []
+        params = []
+        match = []
+        for column, value in (('title', title), ('author', author), ('dynasty', dynasty)):
+            value = (value or '').strip()
+            if not value:
+                continue
+            where.append(f"p.{column} LIKE ? ESCAPE '\\'")
+            params.append(_like_pattern(value))
+            # 全是汉字时二字组短语与子串等价，先用 FTS 缩小范围；字母数字按整词
+            # 分词，"0%" 不能匹配 "100%"，只由 LIKE 筛选
+            phrase = _fts_phrase(value) if all(_is_cjk(ch) for ch in value) else None
+            if phrase:
+                match.append(f'{column} : {phrase}')
+
+        for text, is_phrase in parse_query(query or ''):
+            clause = _fts_clause(text, is_phrase)
+            if clause:
+                match.append(clause)
+
+        sql = 'SELECT p.id, p.title, p.author, p.dynasty FROM poems p'
+        if match:
+            sql += ' JOIN poems_fts f ON f.rowid = p.id'
+            where.insert(0, 'poems_fts MATCH ?')
+            params.insert(0, ' AND '.join(match))
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY bm25(poems_fts)' if query and match else ' ORDER BY p.id'
+        return self.conn.execute(sql, params).fetchall()
+
+    def favorite_rows(self):
+        """收藏的诗词，按标题排列，返回 [(id, 标题, 作者, 朝代)]"""
+        return self.conn.execute(
+            'SELECT p.id, p.title, p.author, p.dynasty FROM favorites f '
+            'JOIN poems p ON p.id = f.poem_id ORDER BY p.title').fetchall()
+
+    def set_favorites(self, poem_ids):
+        """用给定的 id 替换收藏表"""
+        self.conn.execute('DELETE FROM favorites')
+        self.conn.executemany('INSERT OR IGNORE INTO favorites (poem_id) VALUES (?)',
+                              ((i,) for i in poem_ids))
+        self.conn.commit()
+
+    def sort_ids(self, ids, column, reverse=False):
+        """按排序键列对给定的 id 排序"""
+        self._with_ids(ids)
+        order = 'DESC' if reverse else 'ASC'
+        return [row[0] for row in self.conn.execute(
+            f'SELECT p.id FROM selected_ids s JOIN poems p ON p.id = s.id '
+            f'ORDER BY p.{SORT_COLUMNS[column]} {order}, p.id {order}')]
+
+    def remove_many(self, ids):
+        """一条语句删除一批诗词，逐行内容和收藏随外键级联删除"""
+        self._with_ids(ids)
+        self.conn.execute('DELETE FROM poems_fts WHERE rowid IN (SELECT id FROM selected_ids)')
+        self.conn.execute('DELETE FROM poems WHERE id IN (SELECT id FROM selected_ids)')
+
+
+class SQLiteFavorites:
+    """收藏表中的 id 集合：在内存中判断是否收藏，修改时写入收藏表
+
+    与 favorites.FavoriteFile 的用法相同。删除诗词时收藏表中的记录随外键级联删除。
+    """
+
+    def __init__(self, store):
+        self.conn = store.conn
+        self.ids = {row[0] for row in self.conn.execute('SELECT poem_id FROM favorites')}
+
+    def __contains__(self, poem_id):
+        return poem_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def add(self, poem_id):
+        if poem_id not in self.ids:
+            self.ids.add(poem_id)
+            self.conn.execute('INSERT OR IGNORE INTO favorites (poem_id) VALUES (?)', (poem_id,))
+            self.conn.commit()
+
+    def discard(self, poem_id):
+        self.discard_many([poem_id])
+
+    def discard_many(self, poem_ids):
+        removed = [poem_id for poem_id in poem_ids if poem_id in self.ids]
+        self.ids.difference_update(removed)
+        if removed:
+            self.conn.executemany('DELETE FROM favorites WHERE poem_id = ?', ((i,) for i in removed))
+            self.conn.commit()
+
+    def close(self):
+        pass
+
+
+def migrate_from_json(poems, favorite_ids, path='poems.db', sort_key=None):
+    """把诗词和收藏的 id 一次性写入新的 SQLite 数据库，诗词保留原来的 id"""
+    store = SQLitePoemStore(path, sort_key)
+    for poem in poems:
+        store.add(dict(poem))
+    store.set_favorites([poem_id for poem_id in favorite_ids if poem_id in store])
+    store.close()
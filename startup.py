@@ -0,0 +1,79 @@
+"""启动耗时统计和可选模块的延迟加载
+
+拼音（pypinyin）、语音引擎（pyttsx3）和 Excel（openpyxl）导入都很慢，
+启动时不导入：available() 只查找模块是否安装，不执行它；load() 在第一次
+使用时才导入，并记下导入耗时。
+
+启动分为几个阶段，每个阶段结束时调用 StartupTimer.mark() 记下耗时。以
+--startup-report 参数启动时，首次绘制后打印各阶段的耗时，之后在后台加载
+完成的模块各补打一行。需要细到每个模块的导入耗时时，可以再加上
+python -X importtime。
+"""
+import importlib
+import importlib.util
+import sys
+import time
+
+# 计时从导入本模块开始，main.py 最先导入它
+_START = time.perf_counter()
+
+# 打印启动耗时的命令行参数
+REPORT_FLAG = '--startup-report'
+
+# 模块名 -> 第一次导入的耗时（秒）
+load_times = {}
+
+
+def available(name):
+    """模块是否已安装，不导入它"""
+    return name in sys.modules or importlib.util.find_spec(name) is not None
+
+
+def load(name):
+    """导入模块，第一次导入时记下耗时；没有安装时抛出 ImportError"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    load_times.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+def elapsed():
+    """从启动到现在的秒数"""
+    return time.perf_counter() - _START
+
+
+class StartupTimer:
+    """记录启动各阶段的耗时"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.last = _START
+        self.phases = []  # (阶段, 秒)
+
+    def mark(self, phase):
+        """上一个阶段结束到现在记为 phase 的耗时"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        """打印各阶段的耗时和累计耗时"""
+        if not self.enabled:
+            return
+        print('启动耗时：')
+        total = 0
+        for phase, seconds in self.phases:
+            total += seconds
+            print(f'  {phase}\t{seconds * 1000:8.1f} ms\t累计 {total * 1000:8.1f} ms')
+
+    def loaded(self, name, module=None):
+        """后台加载的功能就绪时打印一行，给出模块名时附上它的导入耗时"""
+        if not self.enabled:
+            return
+        detail = ''
+        if module in load_times:
+            detail = f'，导入 {module} {load_times[module] * 1000:.1f} ms'
+        print(f'  {name}（后台）在启动后 {elapsed() * 1000:.1f} ms 就绪{detail}')
@@ -0,0 +1,307 @@
+"""诗词文件存储
+
+poems.json 作为快照，修改记录追加写入变更日志（poems.log），
+每次提交只写入改动的诗词并 fsync。启动时先读快照再重放日志，
+日志末尾因崩溃写了一半的记录会被丢弃。日志变大后合并回快照。
+
+快照每行一首诗词，同时写出摘要索引（poems.idx），记录每首诗词的
+id、标题、作者、朝代、字节位置、三列的排序键和内容哈希。启动时只读
+摘要索引，详情按需读取，排序键和内容哈希也不必重新计算。
+
+日志记录在界面线程中编码，写入和 fsync 可以放到写入线程；合并快照时
+先在界面线程记下全部诗词（只记详情位置，不读取详情），再在写入线程中
+把旧快照里的原始字节复制到新快照。
+"""
+import json
+import os
+import re
+import zlib
+
+from poem_store import PoemStore, SUMMARY_FIELDS
+
+# 日志小于该大小时不合并
+COMPACT_MIN_BYTES = 1024 * 1024
+
+
+def _fsync_dir(path):
+    """同步目录项，保证替换后的文件名落盘（Windows 不支持，忽略）"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def read_json(path):
+    """读取 {'poems': [...]} 格式的诗词文件"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if 'poems' not in data:
+        raise ValueError('无效的JSON格式')
+    return data['poems']
+
+
+def write_json(path, poems, indent=None):
+    """原子地写出 {'poems': [...]} 格式的诗词文件：先写临时文件，fsync 后再替换"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'poems': list(poems)}, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+def write_snapshot(path, entries, source_path):
+    """写出快照文件（每行一首诗词）并 fsync，返回 {id: (位置, 长度)}
+
+    entries 来自 PoemStore.snapshot_entries：详情在旧快照 source_path 中的诗词
+    直接复制原始字节，常驻内存的诗词重新编码。文件仍是合法的 {'poems': [...]} 格式。
+    """
+    locations = {}
+    source = None
+    try:
+        with open(path, 'wb') as f:
+            f.write(b'{"poems": [\n')
+            offset = f.tell()
+            first = True
+            for poem_id, _, _, _, location, poem in entries:
+                if not first:
+                    f.write(b',\n')
+                    offset += 2
+                first = False
+                if poem is None:
+                    if source is None:
+                        source = open(source_path, 'rb')
+                    source.seek(location[0])
+                    data = source.read(location[1])
+                else:
+                    data = json.dumps(poem, ensure_ascii=False).encode('utf-8')
+                f.write(data)
+                locations[poem_id] = (offset, len(data))
+                offset += len(data)
+            f.write(b'\n]}\n')
+            f.flush()
+            os.fsync(f.fileno())
+    finally:
+        if source is not None:
+            source.close()
+    return locations
+
+
+def _escape(text):
+    return str(text or '').replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+def _unescape(text):
+    if '\\' not in text:
+        return text
+    return re.sub(r'\\(.)', lambda m: {'n': '\n', 't': '\t'}.get(m.group(1), m.group(1)), text)
+
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return f'{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def write_summary_index(path, snapshot_path, entries, locations):
+    """写出摘要索引：首行是快照文件的大小和修改时间，之后每行一首诗词及其排序键、内容哈希"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(f'PIDX3\t{_file_stamp(snapshot_path)}\n')
+        for poem_id, summary, keys, digest, _, _ in entries:
+            offset, length = locations[poem_id]
+            keys = '\t'.join(_escape(key) for key in keys)
+            f.write(f"{poem_id}\t{offset}\t{length}\t{_escape(summary.get('title'))}\t"
+                    f"{_escape(summary.get('author'))}\t{_escape(summary.get('dynasty'))}\t"
+                    f"{digest}\t{keys}\n")
+    os.replace(tmp_path, path)
+
+
+def read_summary_index(path, snapshot_path):
+    """读取摘要索引，返回 [(摘要, 位置, 长度, 排序键, 内容哈希)]；索引缺失或与快照不匹配时返回 None"""
+    try:
+        f = open(path, 'r', encoding='utf-8', newline='\n')
+    except FileNotFoundError:
+        return None
+    with f:
+        if f.readline() != f'PIDX3\t{_file_stamp(snapshot_path)}\n':
+            return None
+        rows = []
+        for line in f:
+            poem_id, offset, length, title, author, dynasty, digest, *keys = line[:-1].split('\t')
+            summary = dict(zip(SUMMARY_FIELDS, (int(poem_id), _unescape(title),
+                                                _unescape(author), _unescape(dynasty))))
+            rows.append((summary, int(offset), int(length),
+                         tuple(_unescape(key) for key in keys), digest))
+        return rows
+
+
+class PoemStorage:
+    """快照 + 追加日志的诗词存储"""
+
+    def __init__(self, path='poems.json', log_path=None, sort_key=None):
+        self.path = path
+        self.sort_key = sort_key
+        self.log_path = log_path or os.path.splitext(path)[0] + '.log'
+        self.index_path = os.path.splitext(path)[0] + '.idx'
+        self.log = None
+        self.reader = None  # 读取详情用的快照文件句柄，第一次读取时打开
+        self.log_bytes = 0  # 已编码的日志长度，包括尚未写入的记录
+
+    def load(self):
+        """读取快照并重放日志，返回 PoemStore
+
+        摘要索引有效时只读摘要，详情延迟加载；否则完整读取快照，
+        并立即重写快照和摘要索引，下次启动即可延迟加载。
+        快照中缺少 id 的诗词先按固定规则分配 id，再重放日志，
+        这样日志里引用的 id 与上次运行时一致。
+        """
+        rows = read_summary_index(self.index_path, self.path)
+        if rows is None:
+            store = PoemStore(read_json(self.path), sort_key=self.sort_key)
+        else:
+            store = PoemStore(loader=self.read_poem, sort_key=self.sort_key)
+            store.load_summaries(rows)
+
+        for ops in self._replay():
+            for op in ops:
+                if op['op'] == 'put':
+                    poem = op['poem']
+                    if poem['id'] in store:
+                        store.update(poem['id'], poem)
+                    else:
+                        store.add(poem)
+                elif op['op'] == 'del':
+                    store.remove(op['id'])
+
+        self.log = open(self.log_path, 'ab')
+        self.log_bytes = self.log.tell()
+        if rows is None:
+            self.compact(store)
+        return store
+
+    def read_poem(self, offset, length):
+        """按字节位置从快照文件读取一首诗词的详情
+
+        所有读取共用一个文件句柄，由 PoemStore.get 在 store.lock 内调用，
+        定位和读取不会被其他线程打断。
+        """
+        if self.reader is None:
+            self.reader = open(self.path, 'rb')
+        self.reader.seek(offset)
+        return json.loads(self.reader.read(length).decode('utf-8'))
+
+    def _close_reader(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def _replay(self):
+        """逐条读出日志中的提交，校验失败处截断日志"""
+        try:
+            f = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            good = 0
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('记录不完整')
+                    crc, payload = line[:-1].split(b' ', 1)
+                    if int(crc, 16) != zlib.crc32(payload):
+                        raise ValueError('校验失败')
+                    ops = json.loads(payload.decode('utf-8'))
+                except ValueError as e:
+                    print(f"诗词日志在 {good} 字节处损坏，已丢弃之后的记录: {str(e)}")
+                    break
+                yield ops
+                good += len(line)
+            else:
+                return
+        with open(self.log_path, 'r+b') as f:
+            f.truncate(good)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def encode(self, puts=(), deletes=()):
+        """把一批修改编码成一条日志记录，没有修改时返回 None
+
+        在界面线程中调用，编码时诗词不会被同时修改。
+        """
+        ops = [{'op': 'put', 'poem': poem} for poem in puts]
+        ops.extend({'op': 'del', 'id': poem_id} for poem_id in deletes)
+        if not ops:
+            return None
+        payload = json.dumps(ops, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        record = b'%08x ' % zlib.crc32(payload) + payload + b'\n'
+        self.log_bytes += len(record)
+        return record
+
+    def append(self, record):
+        """把一条日志记录写入日志并 fsync，整批要么全部生效要么全部丢弃"""
+        self.log.write(record)
+        self.log.flush()
+        os.fsync(self.log.fileno())
+
+    def commit(self, puts=(), deletes=()):
+        """编码并立即写入一批修改"""
+        record = self.encode(puts, deletes)
+        if record is not None:
+            self.append(record)
+
+    def log_size(self):
+        return self.log_bytes
+
+    def needs_compaction(self):
+        try:
+            snapshot_size = os.path.getsize(self.path)
+        except OSError:
+            snapshot_size = 0
+        return self.log_size() > max(COMPACT_MIN_BYTES, snapshot_size // 2)
+
+    def prepare_compaction(self, store):
+        """在界面线程中记下合并快照所需的全部诗词，之后的日志重新计算长度"""
+        self.log_bytes = 0
+        return store.snapshot_entries()
+
+    def write_compaction(self, store, entries):
+        """把记下的诗词写成新快照和摘要索引并清空日志，可在写入线程中执行
+
+        快照替换、读取句柄的关闭和详情位置更新在 store 的锁内完成，不会按
+        旧位置读取新文件，也不会用旧文件的句柄按新位置读取。
+        快照替换成功后才清空日志；两步之间崩溃时重放日志结果不变，
+        摘要索引与快照不匹配时下次启动会完整读取快照。
+        """
+        tmp_path = self.path + '.tmp'
+        locations = write_snapshot(tmp_path, entries, self.path)
+        previous = {entry[0]: entry[4] for entry in entries if entry[4] is not None}
+        with store.lock:
+            # 先关闭读取句柄（Windows 不能替换打开着的文件），下次读取时打开新快照
+            self._close_reader()
+            os.replace(tmp_path, self.path)
+            store.relocate(locations, previous)
+        _fsync_dir(self.path)
+        write_summary_index(self.index_path, self.path, entries, locations)
+        self.log.truncate(0)
+        self.log.seek(0)
+        self.log.flush()
+        os.fsync(self.log.fileno())
+
+    def compact(self, store):
+        """把全部诗词写成新快照和摘要索引并清空日志"""
+        self.write_compaction(store, self.prepare_compaction(store))
+
+    def signature(self):
+        """快照大小、修改时间和日志长度，用于判断派生的索引文件是否过期"""
+        stat = os.stat(self.path)
+        return [stat.st_size, stat.st_mtime_ns, self.log_size()]
+
+    def close(self):
+        self._close_reader()
+        if self.log:
+            self.log.close()
+            self.log = None
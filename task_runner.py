@@ -0,0 +1,122 @@
+"""后台任务
+
+耗时的读写（导入、导出、写日志、合并快照）放到后台线程执行，界面线程
+只负责显示。后台线程不直接操作界面：结果、进度和错误都放进队列，
+由界面线程用 root.after 定时取出并调用回调。
+
+写入磁盘的任务在单独的一个线程中按提交顺序依次执行，保证日志记录和
+快照合并的先后顺序与提交顺序一致。
+"""
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+# 界面线程检查结果队列的间隔（毫秒）
+POLL_INTERVAL = 50
+
+
+class TaskCancelled(Exception):
+    """任务被取消"""
+
+
+class CancelToken:
+    """传给后台任务，用于检查取消和回报进度"""
+
+    def __init__(self, runner, on_progress=None):
+        self.runner = runner
+        self.on_progress = on_progress
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        """任务取消后抛出 TaskCancelled，后台任务在适当的位置调用"""
+        if self.cancelled:
+            raise TaskCancelled()
+
+    def progress(self, *args):
+        """在界面线程中调用 on_progress(*args)；返回任务是否应继续"""
+        if self.on_progress:
+            self.runner.call_soon(self.on_progress, *args)
+        return not self.cancelled
+
+
+class TaskRunner:
+    """后台线程池、写入线程和界面线程的结果队列"""
+
+    def __init__(self, root, workers=4):
+        self.root = root
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.writer = ThreadPoolExecutor(max_workers=1)
+        self.results = queue.Queue()
+        self.pending_writes = 0
+        self.tokens = set()  # 尚未结束的后台任务
+        self.root.after(POLL_INTERVAL, self._drain)
+
+    def submit(self, func, *args, on_done=None, on_error=None, on_progress=None):
+        """在线程池中执行 func(token, *args)，返回 CancelToken
+
+        完成后在界面线程中调用 on_done(结果)；出错时调用 on_error(异常)，
+        取消时 on_error 收到 TaskCancelled。
+        """
+        token = CancelToken(self, on_progress)
+        self.tokens.add(token)
+
+        def finished(future):
+            self.tokens.discard(token)
+            self._finished(future, on_done, on_error)
+
+        future = self.pool.submit(func, token, *args)
+        future.add_done_callback(finished)
+        return token
+
+    def submit_write(self, func, *args, on_done=None, on_error=None):
+        """在写入线程中按提交顺序执行 func(*args)"""
+        self.pending_writes += 1
+
+        def finished(result):
+            self.pending_writes -= 1
+            if on_done:
+                on_done(result)
+
+        def failed(error):
+            self.pending_writes -= 1
+            if on_error:
+                on_error(error)
+
+        future = self.writer.submit(func, *args)
+        future.add_done_callback(lambda f: self._finished(f, finished, failed))
+
+    def call_soon(self, callback, *args):
+        """从任意线程安排在界面线程中调用 callback(*args)"""
+        self.results.put((callback, args))
+
+    def _finished(self, future, on_done, on_error):
+        error = future.exception()
+        if error is not None:
+            if on_error:
+                self.call_soon(on_error, error)
+            else:
+                print(f"后台任务失败: {str(error)}")
+        elif on_done:
+            self.call_soon(on_done, future.result())
+
+    def _drain(self):
+        """取出队列中的回调在界面线程中执行"""
+        try:
+            while True:
+                callback, args = self.results.get_nowait()
+                try:
+                    callback(*args)
+                except Exception as e:
+                    print(f"处理后台任务结果时出错: {str(e)}")
+        except queue.Empty:
+            pass
+        self.root.after(POLL_INTERVAL, self._drain)
+
+    def shutdown(self):
+        """等待已提交的写入完成后关闭线程，正在执行的后台任务被取消"""
+        for token in list(self.tokens):
+            token.cancel()
+        self.writer.shutdown(wait=True)
+        self.pool.shutdown(wait=False, cancel_futures=True)
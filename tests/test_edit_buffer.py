@@ -0,0 +1,77 @@
+"""原文框的分段和只合并改动过的段"""
+from edit_buffer import apply_edits, segments
+
+POEM = {
+    'title': '静夜思', 'title_pinyin': 'jìng yè sī',
+    'content': ['床前明月光', '疑是地上霜'],
+    'content_pinyin': ['chuáng qián míng yuè guāng', 'yí shì dì shàng shuāng'],
+}
+
+
+def annotate(lines):
+    """代替 pypinyin，记下需要重新注音的文字"""
+    annotate.calls.append(list(lines))
+    return {line: f'py({line})' for line in lines}
+
+
+def edit(changes, poem=POEM):
+    annotate.calls = []
+    return apply_edits(dict(poem), changes, annotate)
+
+
+def test_segments_follow_display_order():
+    chunks = ('jìng yè sī\n', 'pinyin', '静夜思\n\n', 'title',
+              'chuáng qián\n', 'pinyin', '床前\n\n', 'hanzi', 'yí shì\n', 'pinyin', '疑是\n', 'hanzi')
+    assert segments(chunks) == [('title_pinyin', 1), ('title', 2), (('pinyin', 0), 4),
+                                (('hanzi', 0), 5), (('pinyin', 1), 7), (('hanzi', 1), 8)]
+
+
+def test_no_changes():
+    assert edit({}) == {}
+    assert annotate.calls == []
+
+
+def test_changed_hanzi_line_is_annotated_again():
+    fields = edit({('hanzi', 1): '举头望明月\n'})
+    assert fields['content'] == ['床前明月光', '举头望明月']
+    assert fields['content_pinyin'] == ['chuáng qián míng yuè guāng', 'py(举头望明月)']
+    assert annotate.calls == [['举头望明月']]
+
+
+def test_typed_pinyin_is_kept():
+    fields = edit({('hanzi', 0): '床前看月光\n', ('pinyin', 0): ' chuáng  qián kàn yuè guāng \n'})
+    assert fields['content_pinyin'][0] == 'chuáng qián kàn yuè guāng'
+    assert annotate.calls == []
+
+
+def test_blank_pinyin_line_is_annotated_again():
+    # 清空一行拼音（只剩空白）时按汉字重新注音
+    fields = edit({('pinyin', 1): '   \n'})
+    assert fields['content'] == POEM['content']
+    assert fields['content_pinyin'] == ['chuáng qián míng yuè guāng', 'py(疑是地上霜)']
+    assert annotate.calls == [['疑是地上霜']]
+
+
+def test_blank_hanzi_line_is_removed():
+    fields = edit({('hanzi', 0): '\n', ('pinyin', 0): '\n'})
+    assert fields['content'] == ['疑是地上霜']
+    assert fields['content_pinyin'] == ['yí shì dì shàng shuāng']
+
+
+def test_split_line_with_matching_pinyin_lines():
+    fields = edit({('hanzi', 0): '床前\n明月光\n', ('pinyin', 0): 'chuáng qián\nmíng yuè guāng\n'})
+    assert fields['content'] == ['床前', '明月光', '疑是地上霜']
+    assert fields['content_pinyin'][:2] == ['chuáng qián', 'míng yuè guāng']
+    assert annotate.calls == []
+
+
+def test_title_change_reannotates_title_only():
+    fields = edit({'title': '夜思\n'})
+    assert fields == {'title': '夜思', 'title_pinyin': 'py(夜思)'}
+
+
+def test_unpaired_pinyin_is_not_touched():
+    poem = dict(POEM, content_pinyin=[])
+    fields = edit({('hanzi', 0): '床前看月光\n'}, poem)
+    assert fields == {'content': ['床前看月光', '疑是地上霜']}
+    assert annotate.calls == []
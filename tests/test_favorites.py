@@ -0,0 +1,54 @@
+"""收藏日志末尾写了一半的行被丢弃并截断"""
+import os
+
+import pytest
+
+from favorites import FavoriteFile
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / 'favorites.json'), str(tmp_path / 'favorites.log')
+
+
+def test_log_is_replayed(paths):
+    favorites = FavoriteFile(*paths).load([])
+    favorites.add(1)
+    favorites.add(123)
+    favorites.discard(1)
+    favorites.close()
+
+    assert set(FavoriteFile(*paths).load([])) == {123}
+
+
+@pytest.mark.parametrize('tail', [b'+12', b'-1', b'+1x\n'])
+def test_torn_log_tail_is_ignored_and_truncated(paths, tail):
+    path, log_path = paths
+    with open(log_path, 'wb') as f:
+        f.write(b'+5\n-5\n+7\n' + tail)
+
+    reader = FavoriteFile(path, log_path)
+    # 只截断，不合并快照，检查截断后的日志
+    reader.compact = lambda: None
+    assert set(reader.load([])) == {7}
+    with open(log_path, 'rb') as f:
+        assert f.read() == b'+5\n-5\n+7\n'
+
+    assert set(FavoriteFile(path, log_path).load([])) == {7}
+    assert not os.path.exists(log_path)
+
+
+def test_appends_go_through_submit_write(paths):
+    submitted = []
+    favorites = FavoriteFile(*paths, submit_write=lambda func, *args: submitted.append((func, args)))
+    favorites.load([])
+    favorites.add(3)
+    favorites.discard_many([3])
+
+    # 交给写入线程之前不写文件
+    assert not os.path.exists(paths[1])
+    for func, args in submitted:
+        func(*args)
+    favorites.close()
+    with open(paths[1], 'rb') as f:
+        assert f.read() == b'+3\n-3\n'
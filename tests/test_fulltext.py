@@ -0,0 +1,47 @@
+"""全文索引文件与诗词数据的签名不一致时必须重建"""
+from fulltext import FullTextIndex
+from storage import PoemStorage, write_json
+
+POEMS = [
+    {'id': 1, 'title': '静夜思', 'author': '李白', 'content': ['床前明月光', '疑是地上霜']},
+    {'id': 2, 'title': '春晓', 'author': '孟浩然', 'content': ['春眠不觉晓', '处处闻啼鸟']},
+]
+
+
+def test_matching_signature_reuses_index_file(tmp_path):
+    path = str(tmp_path / 'poems.fts')
+    FullTextIndex.build([(poem['id'], poem) for poem in POEMS], path, [1, 2, 3]).close()
+
+    index = FullTextIndex.open(path, [1, 2, 3])
+    assert index is not None
+    assert [key for key, _ in index.search('明月')] == [1]
+    index.close()
+
+
+def test_signature_mismatch_forces_rebuild(tmp_path):
+    poems_path = str(tmp_path / 'poems.json')
+    index_path = str(tmp_path / 'poems.fts')
+    write_json(poems_path, POEMS)
+    poem_storage = PoemStorage(poems_path)
+    store = poem_storage.load()
+    FullTextIndex.build([(poem['id'], poem) for poem in store], index_path, poem_storage.signature()).close()
+
+    # 索引保存之后又提交了修改，日志长度变了
+    poem = store.update(2, {'content': ['夜来风雨声', '花落知多少']})
+    poem_storage.commit(puts=[poem])
+    assert FullTextIndex.open(index_path, poem_storage.signature()) is None
+
+    index = FullTextIndex.build([(poem['id'], poem) for poem in store], index_path, poem_storage.signature())
+    assert [key for key, _ in index.search('风雨')] == [2]
+    index.close()
+    index = FullTextIndex.open(index_path, poem_storage.signature())
+    assert index is not None
+    assert index.search('啼鸟') == []
+    index.close()
+    poem_storage.close()
+
+
+def test_corrupted_index_file_is_rebuilt(tmp_path):
+    path = tmp_path / 'poems.fts'
+    path.write_bytes(b'not an index')
+    assert FullTextIndex.open(str(path), [1, 2, 3]) is None
@@ -0,0 +1,110 @@
+"""导入计划：分类、文件内重复和四种冲突处理策略"""
+import pytest
+
+from import_planner import MERGE, NEWER, OVERWRITE, SKIP, ImportPlan
+from poem_files import batched
+from poem_store import PoemStore
+
+EXISTING = [
+    {'id': 1, 'title': '静夜思', 'author': '李白', 'dynasty': '唐', 'content': ['床前明月光'],
+     'translation': '原有译文', 'updated_at': '2024-01-01T00:00:00'},
+    {'id': 2, 'title': '春晓', 'author': '孟浩然', 'dynasty': '唐', 'content': ['春眠不觉晓'],
+     'updated_at': '2024-01-01T00:00:00'},
+]
+
+ROWS = [
+    # 与已有诗词不同，较新，译文为空
+    {'title': '静夜思', 'author': '李白', 'content': ['床前看月光'], 'translation': '',
+     'updated_at': '2025-01-01T00:00:00'},
+    # 与已有诗词相同
+    {'title': '春晓', 'author': '孟浩然', 'dynasty': '唐', 'content': ['春眠不觉晓']},
+    # 新增，文件中出现两次，以后出现的为准
+    {'title': '登鹳雀楼', 'author': '王之涣', 'content': ['白日依山尽']},
+    {'title': '登鹳雀楼', 'author': '王之涣', 'content': ['白日依山尽', '黄河入海流']},
+]
+
+
+def make_plan(rows=ROWS, default_time='2023-06-01T00:00:00'):
+    store = PoemStore([dict(poem) for poem in EXISTING])
+    plan = ImportPlan(store, default_time=default_time)
+    for batch in batched((dict(row) for row in rows), 3):
+        plan.classify(batch)
+    return store, plan
+
+
+def select(plan, policy, rows=ROWS):
+    items = []
+    start = 0
+    for batch in batched((dict(row) for row in rows), 3):
+        selected, stale = plan.select(batch, start, policy)
+        assert stale == 0
+        items.extend(selected)
+        start += len(batch)
+    return items
+
+
+def test_classification():
+    _, plan = make_plan()
+    assert plan.rows == 4
+    assert plan.identical == 1
+    assert plan.repeated == 1
+    assert plan.new == {('登鹳雀楼', '王之涣'): 3}
+    assert list(plan.changed) == [1]
+
+
+def test_duplicate_rows_keep_the_last_one():
+    _, plan = make_plan()
+    added = [poem for poem_id, poem in select(plan, OVERWRITE) if poem_id is None]
+    assert [poem['content'] for poem in added] == [['白日依山尽', '黄河入海流']]
+    assert added[0]['updated_at'] == '2023-06-01T00:00:00'
+
+
+def test_duplicate_existing_rows_count_once():
+    rows = [dict(ROWS[0], content=['第一次']), dict(ROWS[0], content=['第二次'])]
+    _, plan = make_plan(rows)
+    assert plan.repeated == 1
+    assert [(poem_id, poem['content']) for poem_id, poem in select(plan, OVERWRITE, rows)] == [
+        (1, ['第二次'])]
+
+
+def test_overwrite_replaces_fields():
+    _, plan = make_plan()
+    updates = dict(item for item in select(plan, OVERWRITE) if item[0] is not None)
+    poem = updates[1]
+    assert poem['content'] == ['床前看月光']
+    assert poem['translation'] == ''
+    # 没有提供新拼音时清空旧拼音，写入时重新生成
+    assert poem['content_pinyin'] == []
+    assert poem['dynasty'] == '唐'
+
+
+def test_skip_writes_only_new_poems():
+    _, plan = make_plan()
+    assert [poem_id for poem_id, _ in select(plan, SKIP)] == [None]
+
+
+def test_merge_keeps_existing_values_for_empty_fields():
+    _, plan = make_plan()
+    updates = dict(item for item in select(plan, MERGE) if item[0] is not None)
+    assert updates[1]['content'] == ['床前看月光']
+    assert updates[1]['translation'] == '原有译文'
+
+
+@pytest.mark.parametrize('updated_at, written', [
+    ('2025-01-01T00:00:00', True),
+    ('2023-01-01T00:00:00', False),
+    ('', False),  # 没有修改时间时以文件时间为准，早于已有诗词
+])
+def test_newer_compares_modification_times(updated_at, written):
+    rows = [dict(ROWS[0], updated_at=updated_at)]
+    _, plan = make_plan(rows)
+    assert [poem_id for poem_id, _ in select(plan, NEWER, rows)] == ([1] if written else [])
+
+
+def test_poems_changed_after_classification_are_skipped():
+    store, plan = make_plan()
+    store.update(1, {'translation': '导入期间的修改'})
+    store.add({'title': '登鹳雀楼', 'author': '王之涣'})
+    selected, stale = plan.select([dict(row) for row in ROWS], 0, OVERWRITE)
+    assert selected == []
+    assert stale == 2
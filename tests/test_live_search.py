@@ -0,0 +1,75 @@
+"""边输入边搜索：结果缩小的判断、防抖和分批筛选的取消"""
+import pytest
+
+from live_search import LiveSearch, narrows
+
+
+class FakeRoot:
+    """代替 Tk 根窗口，after 安排的回调由测试手动执行"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.next_id = 0
+
+    def after(self, delay, callback, *args):
+        self.next_id += 1
+        self.jobs[self.next_id] = (callback, args)
+        return self.next_id
+
+    def after_cancel(self, job):
+        self.jobs.pop(job, None)
+
+    def run(self):
+        while self.jobs:
+            job = min(self.jobs)
+            callback, args = self.jobs.pop(job)
+            callback(*args)
+
+
+@pytest.mark.parametrize('previous, terms, expected', [
+    (('静', '', ''), ('静夜', '', ''), True),
+    (('静', '', ''), ('静', '李', ''), True),  # 新加一个条件
+    (('jy', '', ''), ('jys', '', ''), True),
+    (('静夜', '', ''), ('静', '', ''), False),  # 删掉了字
+    (('夜', '', ''), ('静夜', '', ''), False),  # 在前面插入，包含但不是接着输入
+    (('jys', '', ''), ('jyz', '', ''), False),  # 改了最后一个字母
+    (('静', '李', ''), ('静', '', ''), False),  # 清空了一个条件
+])
+def test_narrows(previous, terms, expected):
+    assert narrows(previous, terms) is expected
+
+
+def test_schedule_keeps_only_the_latest_call():
+    root = FakeRoot()
+    search = LiveSearch(root)
+    calls = []
+    search.schedule(lambda: calls.append(1))
+    search.schedule(lambda: calls.append(2))
+    root.run()
+    assert calls == [2]
+
+
+def test_stream_filters_in_chunks():
+    root = FakeRoot()
+    search = LiveSearch(root, chunk_size=3)
+    chunks = []
+    done = []
+    search.stream(list(range(8)), lambda i: i % 2 == 0, chunks.append, done.append)
+    # 第一批在调用中直接处理
+    assert chunks == [[0, 2]]
+    root.run()
+    assert chunks == [[0, 2], [4], [6]]
+    assert done == [[0, 2, 4, 6]]
+    assert not search.active
+
+
+def test_new_stream_cancels_the_old_one():
+    root = FakeRoot()
+    search = LiveSearch(root, chunk_size=2)
+    old = []
+    search.stream(list(range(6)), lambda i: True, old.append, old.append)
+    new = []
+    search.stream([10, 11], lambda i: True, new.append, new.append)
+    root.run()
+    assert old == [[0, 1]]
+    assert new == [[10, 11], [10, 11]]
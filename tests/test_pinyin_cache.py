@@ -0,0 +1,41 @@
+"""拼音缓存关闭后重新打开仍能读到之前的记录"""
+from pinyin_cache import PinyinCache
+
+
+def test_round_trip_after_reopen(tmp_path):
+    path = str(tmp_path / 'pinyin.cache')
+    cache = PinyinCache(path)
+    cache.put('tone', '床前明月光', 'chuáng qián míng yuè guāng')
+    cache.put('tone3', '静夜思', 'jing4ye4si1')
+    cache.put('search', '静夜思', 'jingyesi jys')
+    cache.close()
+
+    cache = PinyinCache(path)
+    assert cache.get('tone', '床前明月光') == 'chuáng qián míng yuè guāng'
+    assert cache.get('tone3', '静夜思') == 'jing4ye4si1'
+    assert cache.get('search', '静夜思') == 'jingyesi jys'
+    assert cache.get('tone', '静夜思') is None
+
+    def compute(text):
+        raise AssertionError('缓存命中时不应重新计算')
+
+    assert cache.lookup('tone3', '静夜思', compute) == 'jing4ye4si1'
+    assert cache.stats()['hits'] == 4
+    cache.close()
+
+
+def test_reopen_merges_new_records(tmp_path):
+    path = str(tmp_path / 'pinyin.cache')
+    cache = PinyinCache(path)
+    cache.put('tone', '春晓', 'chūn xiǎo')
+    cache.close()
+
+    cache = PinyinCache(path)
+    cache.lookup('tone', '春眠不觉晓', lambda text: 'chūn mián bù jué xiǎo')
+    cache.close()
+
+    cache = PinyinCache(path)
+    assert cache.get('tone', '春晓') == 'chūn xiǎo'
+    assert cache.get('tone', '春眠不觉晓') == 'chūn mián bù jué xiǎo'
+    assert cache.stats()['entries'] == 2
+    cache.close()
@@ -0,0 +1,78 @@
+"""拼音索引："jys" 和 "jingyesi" 都能查到《静夜思》，加入和删除后仍然正确"""
+import pytest
+
+from pinyin_index import PinyinIndex, is_pinyin_query, normalize_query
+
+# 代替 pypinyin 的逐音节拼音
+SYLLABLES = {'静': 'jing', '夜': 'ye', '思': 'si', '李': 'li', '白': 'bai', '的': 'de',
+             '好': 'hao', '绿': 'lv', '春': 'chun', '晓': 'xiao', '杜': 'du', '甫': 'fu'}
+
+
+def search_keys(text):
+    syllables = [SYLLABLES[ch] for ch in text if ch in SYLLABLES]
+    return ''.join(syllables), ''.join(s[0] for s in syllables)
+
+
+def build(rows):
+    return PinyinIndex.build(rows, search_keys)
+
+
+def test_full_and_initials_prefix_lookup():
+    index = build([(1, '静夜思', '李白'), (2, '春晓', '')])
+    for query in ('jys', 'jy', 'jingyesi', 'jingye', 'JING YE'):
+        assert index.search('title', query) == {1}
+    assert index.search('author', 'lb') == {1}
+    assert index.search('title', 'ys') == set()
+    assert index.search('title', 'cx') == {2}
+
+
+def test_neutral_tone_syllable_keeps_its_initial():
+    index = build([(1, '的好', '')])
+    assert index.search('title', 'dh') == {1}
+
+
+def test_lookup_after_add_and_remove():
+    index = build([(1, '静夜思', '李白')])
+    index.add(2, '静夜', '杜甫')
+    assert index.search('title', 'jys') == {1}
+    assert index.search('title', 'jy') == {1, 2}
+    assert index.search('author', 'df') == {2}
+
+    # 修改标题：旧键不再命中
+    index.add(1, '春晓', '李白')
+    assert index.search('title', 'jingyesi') == set()
+    assert index.search('title', 'chunxiao') == {1}
+
+    index.remove(2)
+    assert index.search('title', 'jy') == set()
+    index.remove_many([1, 3])
+    assert index.search('author', 'lb') == set()
+    assert len(index) == 0
+
+
+def test_matches_without_search():
+    index = build([])
+    index.add(1, '静夜思', '李白')
+    assert index.matches(1, 'title', 'jys')
+    assert not index.matches(1, 'title', 'js')
+    index.remove(1)
+    assert not index.matches(1, 'title', 'jys')
+
+
+def test_is_pinyin_query():
+    assert is_pinyin_query('jing ye')
+    assert not is_pinyin_query('静夜')
+    assert not is_pinyin_query('jy1')
+    assert normalize_query('Lü Ye') == 'lvye'
+
+
+def test_pypinyin_search_keys(monkeypatch):
+    pytest.importorskip('pypinyin')
+    import pinyin_pipeline
+    from pinyin_cache import PinyinCache
+
+    monkeypatch.setattr(pinyin_pipeline, '_cache', PinyinCache(None))
+    assert pinyin_pipeline.pinyin_search_keys('静夜思') == ('jingyesi', 'jys')
+    # 轻声音节没有声调数字，也要单独算一个首字母
+    assert pinyin_pipeline.pinyin_search_keys('好的') == ('haode', 'hd')
+    assert pinyin_pipeline.pinyin_search_keys('绿') == ('lv', 'l')
@@ -0,0 +1,63 @@
+"""批量注音：去重、分批、缓存和只给缺少拼音的诗词注音
+
+不依赖 pypinyin：把单批注音换成假的实现，进程池换成线程池。
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import pinyin_pipeline
+from pinyin_cache import PinyinCache
+from pinyin_pipeline import annotate_lines, annotate_poems
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """记录每批交给注音的行"""
+    calls = []
+
+    def annotate_batch(lines):
+        calls.append(list(lines))
+        return [f'py({line})' for line in lines]
+
+    monkeypatch.setattr(pinyin_pipeline, '_annotate_batch', annotate_batch)
+    monkeypatch.setattr(pinyin_pipeline, '_cache', PinyinCache(None))
+    return calls
+
+
+def test_duplicate_lines_are_annotated_once(batches):
+    result = annotate_lines(['床前明月光', '疑是地上霜', '床前明月光'])
+    assert result == {'床前明月光': 'py(床前明月光)', '疑是地上霜': 'py(疑是地上霜)'}
+    assert batches == [['床前明月光', '疑是地上霜']]
+
+
+def test_lines_are_split_into_batches_with_progress(batches):
+    lines = [f'第{i}行' for i in range(7)]
+    reported = []
+    with ThreadPoolExecutor(2) as pool:
+        result = annotate_lines(lines, progress=lambda done, total: reported.append((done, total)),
+                                batch_size=3, pool=pool)
+    assert result == {line: f'py({line})' for line in lines}
+    assert sorted(len(batch) for batch in batches) == [1, 3, 3]
+    assert [total for _, total in reported] == [7, 7, 7]
+    assert reported[-1][0] == 7
+
+
+def test_cached_lines_are_not_annotated_again(batches):
+    annotate_lines(['春眠不觉晓'])
+    assert annotate_lines(['春眠不觉晓', '处处闻啼鸟']) == {
+        '春眠不觉晓': 'py(春眠不觉晓)', '处处闻啼鸟': 'py(处处闻啼鸟)'}
+    assert batches == [['春眠不觉晓'], ['处处闻啼鸟']]
+
+
+def test_only_missing_pinyin_is_filled(batches):
+    poems = [
+        {'title': '静夜思', 'content': ['床前明月光'], 'title_pinyin': 'jìng yè sī',
+         'content_pinyin': ['chuáng qián míng yuè guāng']},
+        {'title': '春晓', 'content': ['春眠不觉晓', ''], 'title_pinyin': '', 'content_pinyin': []},
+    ]
+    assert annotate_poems(poems) == 1
+    assert poems[0]['title_pinyin'] == 'jìng yè sī'
+    assert poems[1]['title_pinyin'] == 'py(春晓)'
+    assert poems[1]['content_pinyin'] == ['py(春眠不觉晓)', 'py()']
+    assert batches == [['春晓', '春眠不觉晓', '']]
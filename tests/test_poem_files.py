@@ -0,0 +1,64 @@
+"""导出取消或出错时不改动已有的目标文件"""
+import csv
+import json
+
+import pytest
+
+import poem_files
+from poem_files import write_csv_poems, write_json_poems
+
+POEMS = [{'title': f'诗{i}', 'author': '李白', 'content': ['床前明月光', '疑是地上霜']} for i in range(5)]
+
+
+@pytest.mark.parametrize('writer', [write_csv_poems, write_json_poems])
+def test_cancelled_export_keeps_existing_file(tmp_path, monkeypatch, writer):
+    monkeypatch.setattr(poem_files, 'PROGRESS_INTERVAL', 2)
+    path = tmp_path / 'out'
+    path.write_text('旧文件', encoding='utf-8')
+
+    assert writer(str(path), iter(POEMS), lambda count: False) is False
+    assert path.read_text(encoding='utf-8') == '旧文件'
+    assert [p.name for p in tmp_path.iterdir()] == ['out']
+
+
+@pytest.mark.parametrize('writer', [write_csv_poems, write_json_poems])
+def test_failed_export_keeps_existing_file(tmp_path, writer):
+    path = tmp_path / 'out'
+    path.write_text('旧文件', encoding='utf-8')
+
+    def poems():
+        yield POEMS[0]
+        raise OSError('读取失败')
+
+    with pytest.raises(OSError):
+        writer(str(path), poems())
+    assert path.read_text(encoding='utf-8') == '旧文件'
+    assert [p.name for p in tmp_path.iterdir()] == ['out']
+
+
+def test_completed_export_replaces_file(tmp_path):
+    csv_path = tmp_path / 'out.csv'
+    json_path = tmp_path / 'out.json'
+    csv_path.write_text('旧文件', encoding='utf-8')
+    assert write_csv_poems(str(csv_path), iter(POEMS)) is True
+    assert write_json_poems(str(json_path), iter(POEMS)) is True
+
+    with open(csv_path, encoding='utf-8', newline='') as f:
+        assert len(list(csv.reader(f))) == len(POEMS) + 1
+    with open(json_path, encoding='utf-8') as f:
+        assert f.read() == json.dumps({'poems': POEMS}, ensure_ascii=False, indent=4)
+
+
+def test_cancelled_excel_export_keeps_existing_file(tmp_path, monkeypatch):
+    pytest.importorskip('openpyxl')
+    from poem_files import write_excel_poems
+
+    monkeypatch.setattr(poem_files, 'PROGRESS_INTERVAL', 2)
+    path = tmp_path / 'out.xlsx'
+    path.write_text('旧文件', encoding='utf-8')
+
+    assert write_excel_poems(str(path), iter(POEMS), lambda count: False) is False
+    assert path.read_text(encoding='utf-8') == '旧文件'
+    assert write_excel_poems(str(path), iter(POEMS)) is True
+    assert path.read_bytes()[:2] == b'PK'
+    assert [p.name for p in tmp_path.iterdir()] == ['out.xlsx']
@@ -0,0 +1,64 @@
+"""逐行读取导入文件并分批处理"""
+import csv
+
+import pytest
+
+from poem_files import POEM_COLUMNS, batched, open_poem_file, write_json_poems
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=POEM_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_csv_is_read_lazily_and_skips_untitled_rows(tmp_path):
+    path = str(tmp_path / 'poems.csv')
+    write_csv(path, [
+        {'title': '静夜思', 'author': '李白', 'content': '床前明月光|疑是地上霜'},
+        {'title': '', 'author': '无名'},
+        {'title': '春晓', 'author': '孟浩然', 'content': '春眠不觉晓'},
+    ])
+
+    total, poems = open_poem_file(path)
+    assert total is None
+    first = next(poems)
+    assert first['title'] == '静夜思'
+    assert first['content'] == ['床前明月光', '疑是地上霜']
+    assert [poem['title'] for poem in poems] == ['春晓']
+
+
+def test_json_reports_total(tmp_path):
+    path = str(tmp_path / 'poems.json')
+    write_json_poems(path, [{'title': '静夜思'}, {'title': '春晓'}])
+    total, poems = open_poem_file(path)
+    assert total == 2
+    assert [poem['title'] for poem in poems] == ['静夜思', '春晓']
+
+
+def test_batched_pulls_one_batch_at_a_time():
+    pulled = []
+
+    def poems():
+        for i in range(5):
+            pulled.append(i)
+            yield i
+
+    batches = batched(poems(), 2)
+    assert next(batches) == [0, 1]
+    assert pulled == [0, 1]
+    assert list(batches) == [[2, 3], [4]]
+
+
+def test_excel_round_trip(tmp_path):
+    pytest.importorskip('openpyxl')
+    from poem_files import write_excel_poems
+
+    path = str(tmp_path / 'poems.xlsx')
+    write_excel_poems(path, [{'title': '静夜思', 'content': ['床前明月光', '疑是地上霜']}, {'title': '春晓'}])
+    total, poems = open_poem_file(path)
+    # 只写模式不记录工作表尺寸，行数未知
+    assert total in (None, 2)
+    assert [(poem['title'], poem['content']) for poem in poems] == [
+        ('静夜思', ['床前明月光', '疑是地上霜']), ('春晓', [])]
@@ -0,0 +1,54 @@
+"""SQLite 模式的搜索与 JSON 模式的全文索引规则一致"""
+import pytest
+
+from fulltext import FullTextIndex
+from sqlite_store import SQLitePoemStore
+
+POEMS = [
+    {'id': 1, 'title': '静夜思', 'author': '李白', 'dynasty': '唐', 'content': ['床前明月光', '疑是地上霜']},
+    {'id': 2, 'title': '月下独酌', 'author': '李白', 'dynasty': '唐', 'content': ['花间一壶酒', '明月光不照']},
+    {'id': 3, 'title': '100%_纯', 'author': '佚名', 'dynasty': '宋', 'content': ['地上明光月']},
+    {'id': 4, 'title': '1000纯', 'author': '佚名', 'dynasty': '宋', 'content': ['春眠不觉晓']},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLitePoemStore(str(tmp_path / 'poems.db'))
+    for poem in POEMS:
+        store.add(dict(poem))
+    store.commit()
+    yield store
+    store.close()
+
+
+def ids(rows):
+    return sorted(row[0] for row in rows)
+
+
+@pytest.mark.parametrize('query', ['明月', '"明月光"', '"明月 光"', '明 光', '地上 "明光"', '光月'])
+def test_fulltext_query_matches_json_index(store, query):
+    index = FullTextIndex.build((poem['id'], poem) for poem in POEMS)
+    assert ids(store.search(query=query)) == sorted(key for key, _ in index.search(query))
+
+
+def test_quoted_phrase_is_not_split(store):
+    # 两个词都出现但不相邻的诗词不算命中短语
+    assert ids(store.search(query='"光不"')) == [2]
+    assert ids(store.search(query='"月光不照"')) == [2]
+
+
+def test_like_wildcards_are_literal(store):
+    assert ids(store.search(title='%_')) == [3]
+    assert ids(store.search(title='0%')) == [3]
+    assert ids(store.search(title='_')) == [3]
+
+
+def test_reader_is_read_only(store):
+    reader = store.reader()
+    try:
+        assert reader.get(1)['title'] == '静夜思'
+        with pytest.raises(Exception):
+            reader.add({'title': '新诗'})
+    finally:
+        reader.close()
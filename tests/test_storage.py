@@ -0,0 +1,118 @@
+"""快照 + 追加日志：日志尾部损坏时的截断，以及合并快照中途崩溃后的重放"""
+import os
+
+import pytest
+
+import storage
+from storage import PoemStorage, write_json
+
+POEMS = [
+    {'id': 1, 'title': '静夜思', 'author': '李白', 'dynasty': '唐', 'content': ['床前明月光', '疑是地上霜']},
+    {'id': 2, 'title': '春晓', 'author': '孟浩然', 'dynasty': '唐', 'content': ['春眠不觉晓', '处处闻啼鸟']},
+]
+
+
+class Crash(Exception):
+    """模拟进程在某一步崩溃"""
+
+
+def snapshot(store):
+    return {poem['id']: dict(poem) for poem in store}
+
+
+def reload(path):
+    poem_storage = PoemStorage(path)
+    try:
+        return snapshot(poem_storage.load())
+    finally:
+        poem_storage.close()
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'poems.json')
+    write_json(path, POEMS)
+    return path
+
+
+def edit(path):
+    """打开存储，提交一次修改和一次删除，返回修改后的诗词和仍打开的存储"""
+    poem_storage = PoemStorage(path)
+    store = poem_storage.load()
+    poem = store.update(1, {'content': ['床前看月光', '疑是地上霜']})
+    poem_storage.commit(puts=[poem])
+    store.remove(2)
+    poem_storage.commit(deletes=[2])
+    return poem_storage, store
+
+
+@pytest.mark.parametrize('tail', [
+    b'0badc0de [{"op":"del","id":1}]',  # 写了一半，没有换行
+    b'0badc0de [{"op":"del","id":1}]\n',  # 校验和不符
+    b'\x00\x00\x00\x00\n',  # 垃圾数据
+])
+def test_torn_log_tail_is_truncated(path, tail):
+    poem_storage, store = edit(path)
+    expected = snapshot(store)
+    poem_storage.close()
+    good_size = os.path.getsize(poem_storage.log_path)
+    with open(poem_storage.log_path, 'ab') as f:
+        f.write(tail)
+
+    assert reload(path) == expected
+    assert os.path.getsize(poem_storage.log_path) == good_size
+    # 截断后再次启动结果不变
+    assert reload(path) == expected
+
+
+@pytest.mark.parametrize('crash_at', ['write_summary_index', 'truncate'])
+def test_replay_after_crash_mid_compaction_is_idempotent(path, monkeypatch, crash_at):
+    poem_storage, store = edit(path)
+    expected = snapshot(store)
+    log_size = os.path.getsize(poem_storage.log_path)
+
+    if crash_at == 'write_summary_index':
+        # 新快照已替换，摘要索引还没写出
+        def crash(*args):
+            raise Crash()
+        monkeypatch.setattr(storage, 'write_summary_index', crash)
+    else:
+        # 新快照和摘要索引都已写出，日志还没清空
+        class CrashingLog:
+            def __init__(self, log):
+                self.log = log
+
+            def truncate(self, size):
+                raise Crash()
+
+            def __getattr__(self, name):
+                return getattr(self.log, name)
+
+        poem_storage.log = CrashingLog(poem_storage.log)
+    with pytest.raises(Crash):
+        poem_storage.compact(store)
+    poem_storage.close()
+    monkeypatch.undo()
+
+    # 日志仍在，重放到已合并的快照上结果不变
+    assert os.path.getsize(poem_storage.log_path) == log_size
+    assert reload(path) == expected
+    assert reload(path) == expected
+
+
+def test_details_read_after_compaction_use_new_snapshot(path):
+    poem_storage = PoemStorage(path)
+    poem_storage.load()
+    poem_storage.close()
+    # 第二次打开时摘要索引有效，详情按位置从快照读取
+    poem_storage = PoemStorage(path)
+    store = poem_storage.load()
+    assert store.get(2)['title'] == '春晓'
+    poem = store.update(1, {'title': '夜思', 'content': ['床前明月光'] * 8})
+    poem_storage.commit(puts=[poem])
+    poem_storage.compact(store)
+    store.cache.clear()
+
+    assert store.get(1)['content'] == ['床前明月光'] * 8
+    assert store.get(2)['content'] == POEMS[1]['content']
+    poem_storage.close()
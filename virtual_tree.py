@@ -0,0 +1,205 @@
+"""虚拟化的诗词列表
+
+结果集只以 id 数组保存，Treeview 中只放当前窗口能显示的几行，
+滚动时按新的位置重新填充这些行。几十万条结果也能即时显示和滚动。
+"""
+from array import array
+
+# 每次滚轮滚动的行数
+WHEEL_ROWS = 3
+
+# 尚未布局时假定的可见行数
+DEFAULT_VISIBLE_ROWS = 30
+
+# 键盘事件中的修饰键掩码
+SHIFT_MASK = 0x0001
+CONTROL_MASK = 0x0004
+
+
+class VirtualTree:
+    """只显示可见行的 Treeview 列表，列表项的 iid 就是诗词 id"""
+
+    def __init__(self, tree, scrollbar, row_values):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.row_values = row_values  # id -> 各列的值
+        self.ids = array('q')
+        self.positions = None  # id -> 在结果中的位置，按需建立
+        self.top = 0
+        self.visible_rows = DEFAULT_VISIBLE_ROWS
+        self.row_height = None
+        self.first_row_y = 0
+        self.selected = {}  # 按选择顺序保存的选中 id
+        self.notified = set()  # 上次通知给后续处理的选中 id
+        self.plain_click = False
+
+        self.tree.configure(yscrollcommand='')
+        self.scrollbar.configure(command=self.yview)
+        self.tree.bind('<<TreeviewSelect>>', self._on_select, add='+')
+        self.tree.bind('<Button-1>', self._on_click, add='+')
+        self.tree.bind('<Configure>', self._on_configure, add='+')
+        self.tree.bind('<MouseWheel>', self._on_wheel, add='+')
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-WHEEL_ROWS), add='+')
+        self.tree.bind('<Button-5>', lambda e: self.scroll(WHEEL_ROWS), add='+')
+        for key, step in (('<Up>', -1), ('<Down>', 1)):
+            self.tree.bind(key, lambda e, step=step: self._on_key(step, e), add='+')
+        for key, pages in (('<Prior>', -1), ('<Next>', 1)):
+            self.tree.bind(key, lambda e, pages=pages: self._on_key(pages * self.visible_rows, e), add='+')
+        self.tree.bind('<Home>', lambda e: self._on_key(-len(self.ids), e), add='+')
+        self.tree.bind('<End>', lambda e: self._on_key(len(self.ids), e), add='+')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def set_ids(self, ids):
+        """显示新的结果集，清空选择并回到顶部"""
+        self.ids = ids if isinstance(ids, array) else array('q', ids)
+        self.positions = None
+        self.selected = {}
+        self.top = 0
+        self.render()
+
+    def reorder(self, ids):
+        """按新顺序显示同一结果集，保留选择并回到顶部"""
+        self.ids = ids if isinstance(ids, array) else array('q', ids)
+        self.positions = None
+        self.top = 0
+        self.render()
+
+    def extend(self, ids):
+        """在结果集末尾追加一批 id，分批显示搜索结果时使用"""
+        self.ids.extend(ids)
+        self.positions = None
+        self.render()
+
+    def remove_ids(self, ids):
+        """从结果集中移除一批 id，只重新填充可见行"""
+        ids = set(ids)
+        self.ids = array('q', (i for i in self.ids if i not in ids))
+        self.positions = None
+        for poem_id in ids:
+            self.selected.pop(poem_id, None)
+        self.render()
+
+    def index(self, poem_id):
+        if self.positions is None:
+            self.positions = {poem_id: i for i, poem_id in enumerate(self.ids)}
+        return self.positions.get(poem_id)
+
+    def selection_ids(self):
+        """按列表顺序返回全部选中的 id，包括滚出窗口的行"""
+        return sorted(self.selected, key=lambda poem_id: self.index(poem_id) or 0)
+
+    def clear_selection(self):
+        self.selected = {}
+        self.render()
+
+    def see(self, poem_id):
+        i = self.index(poem_id)
+        if i is None:
+            return
+        if i < self.top:
+            self.top = i
+        elif i >= self.top + self.visible_rows:
+            self.top = i - self.visible_rows + 1
+
+    def refresh(self):
+        """重新读取可见行的值，数据修改后调用"""
+        for iid in self.tree.get_children():
+            self.tree.item(iid, values=self.row_values(int(iid)))
+
+    def render(self):
+        """按当前位置填充可见行"""
+        total = len(self.ids)
+        self.top = max(0, min(self.top, total - self.visible_rows))
+        window = self.ids[self.top:self.top + self.visible_rows]
+        children = self.tree.get_children()
+        if [int(iid) for iid in children] != window.tolist():
+            if children:
+                self.tree.delete(*children)
+            for poem_id in window:
+                self.tree.insert('', 'end', iid=poem_id, values=self.row_values(poem_id))
+
+        visible = [str(poem_id) for poem_id in window if poem_id in self.selected]
+        if set(visible) != set(self.tree.selection()):
+            self.tree.selection_set(visible)
+
+        if self.row_height is None and window:
+            self.tree.after_idle(self._measure)
+
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.visible_rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll(self, rows):
+        self.top += rows
+        self.render()
+        return 'break'
+
+    def yview(self, *args):
+        """滚动条回调"""
+        if not args:
+            return
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * len(self.ids))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.visible_rows
+            self.top += amount
+        self.render()
+
+    def _on_wheel(self, event):
+        return self.scroll(-WHEEL_ROWS if event.delta > 0 else WHEEL_ROWS)
+
+    def _on_click(self, event):
+        self.plain_click = not event.state & (SHIFT_MASK | CONTROL_MASK)
+
+    def _on_key(self, step, event):
+        """键盘移动选中行，越过窗口边缘时滚动"""
+        if not self.ids:
+            return 'break'
+        focus = self.tree.focus()
+        i = self.index(int(focus)) if focus else None
+        i = 0 if i is None else max(0, min(len(self.ids) - 1, i + step))
+        poem_id = self.ids[i]
+        if event.state & SHIFT_MASK:
+            self.selected[poem_id] = True
+        else:
+            self.selected = {poem_id: True}
+        self.see(poem_id)
+        self.render()
+        self.tree.focus(poem_id)
+        return 'break'
+
+    def _on_select(self, event):
+        """同步选中状态；选中的 id 没有变化（只是滚动重新填充了行）时阻止后续的选择处理"""
+        visible = {int(iid) for iid in self.tree.get_children()}
+        current = [int(iid) for iid in self.tree.selection()]
+        if self.plain_click:
+            selected = dict.fromkeys(current, True)
+            self.plain_click = False
+        else:
+            selected = {poem_id: True for poem_id in self.selected if poem_id not in visible}
+            selected.update(dict.fromkeys(current, True))
+        self.selected = selected
+        if selected.keys() == self.notified:
+            return 'break'
+        self.notified = set(selected)
+
+    def _on_configure(self, event):
+        self._measure()
+
+    def _measure(self):
+        """按 Treeview 的实际高度计算可见行数，行高取第一行的显示区域"""
+        if self.row_height is None:
+            children = self.tree.get_children()
+            bbox = self.tree.bbox(children[0]) if children else None
+            if not bbox:
+                return
+            self.first_row_y, self.row_height = bbox[1], bbox[3]
+        rows = max(1, (self.tree.winfo_height() - self.first_row_y) // self.row_height)
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            self.render()